@@ -3,17 +3,436 @@ TJEDNI PLAN PREHRANE - PROFESIONALNI GENERATOR (Python)
 Koristi postojeće modele, kalkulatore, jela i namirnice.
 """
 
+import contextlib
+import contextvars
+import hashlib
+import itertools
 import json
+import logging
 import math
-from typing import Dict, List, Optional, Tuple, Any
-from dataclasses import dataclass
+import os
+import random
+import re
+import sys
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple, Any, Iterator, Set, Union
+from dataclasses import asdict, dataclass
+
+try:
+    import numpy as np
+except ImportError:  # NumPy je opcionalan - bez njega ostaje skalarni put
+    np = None
+
+
+# ============================================
+# LOGGING
+# ============================================
+
+logger = logging.getLogger("distributions")
+
+
+def configure_logging(quiet: bool = False, stream=None) -> None:
+    """
+    Postavi logging generatora.
+
+    quiet=False: dnevni/tjedni sažeci (INFO) na stdout, kao prije.
+    quiet=True (produkcija, batch): samo upozorenja; nedostajuće namirnice
+    se samo broje (vidi MISSING_FOODS.summary()).
+    Pri importu se poziva s DISTRIBUTIONS_QUIET=1 iz okoline.
+    """
+    if not any(getattr(h, "_distributions_handler", False) for h in logger.handlers):
+        handler = logging.StreamHandler(stream or sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        handler._distributions_handler = True
+        logger.addHandler(handler)
+        logger.propagate = False
+    elif stream is not None:
+        for h in logger.handlers:
+            if getattr(h, "_distributions_handler", False):
+                h.setStream(stream)
+    logger.setLevel(logging.WARNING if quiet else logging.INFO)
+    MISSING_FOODS.quiet = quiet
+
+
+class MissingFoodTracker:
+    """
+    Brojač namirnica koje nisu u foods_db (dobiju 5/15/5 default).
+
+    Svaka namirnica se logira samo prvi put, a ukupno najviše
+    max_warnings upozorenja po interval sekundi; ostalo se samo broji.
+    Broj je broj komponenti koje koriste namirnicu (matrica ih zapiše
+    sve odjednom kad gradi tablicu za novu verziju baze).
+    """
+
+    def __init__(self, max_warnings: int = 10, interval: float = 60.0):
+        self.max_warnings = max_warnings
+        self.interval = interval
+        self.quiet = False
+        self.counts: Dict[str, int] = {}
+        self._window_start = 0.0
+        self._window_warnings = 0
+        self._lock = threading.Lock()
+
+    def record(self, food_id: str, occurrences: int = 1) -> None:
+        with self._lock:
+            previous = self.counts.get(food_id, 0)
+            self.counts[food_id] = previous + occurrences
+            if previous or self.quiet:
+                return
+            now = time.monotonic()
+            if now - self._window_start > self.interval:
+                self._window_start = now
+                self._window_warnings = 0
+            if self._window_warnings >= self.max_warnings:
+                return
+            self._window_warnings += 1
+        logger.warning("⚠️ Food not found in database: %s", food_id)
+
+    def merge(self, counts: Dict[str, int]) -> None:
+        """Dodaj brojeve kataloga iz drugih procesa; isti katalog se ne broji dvaput."""
+        with self._lock:
+            for food_id, count in counts.items():
+                self.counts[food_id] = max(self.counts.get(food_id, 0), count)
+
+    def summary(self) -> Dict[str, int]:
+        """Nedostajuće namirnice i broj pojavljivanja, najčešće prve."""
+        with self._lock:
+            return dict(sorted(self.counts.items(), key=lambda item: (-item[1], item[0])))
+
+    def log_summary(self) -> None:
+        summary = self.summary()
+        if summary:
+            logger.warning(
+                "⚠️ Missing foods (%d): %s",
+                len(summary),
+                ", ".join(f"{food_id}×{count}" for food_id, count in summary.items()),
+            )
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counts.clear()
+            self._window_warnings = 0
+
+
+MISSING_FOODS = MissingFoodTracker()
+
+
+# ============================================
+# METRIKE (TRAJANJE I BROJAČI PO FAZAMA)
+# ============================================
+
+class PlanMetrics:
+    """
+    Trajanja i brojači po fazama generiranja plana.
+
+    stages: faza -> [broj poziva, ukupno sekundi]
+    counters: događaj -> broj (npr. meals_scored, tweak_iterations)
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, List[float]] = {}
+        self.counters: Dict[str, int] = {}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        entry = self.stages.get(stage)
+        if entry is None:
+            self.stages[stage] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+    def count(self, event: str, amount: int = 1) -> None:
+        self.counters[event] = self.counters.get(event, 0) + amount
+
+    def merge(self, other: "PlanMetrics") -> None:
+        for stage, (calls, seconds) in other.stages.items():
+            entry = self.stages.setdefault(stage, [0, 0.0])
+            entry[0] += calls
+            entry[1] += seconds
+        for event, amount in other.counters.items():
+            self.count(event, amount)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "stages": {
+                stage: {"calls": int(calls), "seconds": round(seconds, 6)}
+                for stage, (calls, seconds) in sorted(self.stages.items())
+            },
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def to_prometheus(self, prefix: str = "distributions") -> str:
+        """Prometheus text exposition format (0.0.4)."""
+        lines = [
+            f"# HELP {prefix}_stage_seconds_total Time spent per plan generation stage.",
+            f"# TYPE {prefix}_stage_seconds_total counter",
+        ]
+        for stage, (_, seconds) in sorted(self.stages.items()):
+            lines.append(f'{prefix}_stage_seconds_total{{stage="{stage}"}} {seconds:.9f}')
+        lines += [
+            f"# HELP {prefix}_stage_calls_total Calls per plan generation stage.",
+            f"# TYPE {prefix}_stage_calls_total counter",
+        ]
+        for stage, (calls, _) in sorted(self.stages.items()):
+            lines.append(f'{prefix}_stage_calls_total{{stage="{stage}"}} {int(calls)}')
+        lines += [
+            f"# HELP {prefix}_events_total Plan generation event counters.",
+            f"# TYPE {prefix}_events_total counter",
+        ]
+        for event, amount in sorted(self.counters.items()):
+            lines.append(f'{prefix}_events_total{{event="{event}"}} {amount}')
+        return "\n".join(lines) + "\n"
+
+
+def export_prometheus(metrics: PlanMetrics, destination: str, prefix: str = "distributions") -> None:
+    """
+    Zapiši metrike u Prometheus text formatu.
+
+    destination:
+    - "unix:/put/do/socketa" - pošalji na Unix socket
+    - "tcp:host:port" - pošalji na TCP socket
+    - inače putanja fajla (atomski zapis, npr. za node_exporter textfile collector)
+    """
+    import socket
+
+    payload = metrics.to_prometheus(prefix).encode("utf-8")
+    if destination.startswith("unix:"):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(destination[len("unix:"):])
+            sock.sendall(payload)
+    elif destination.startswith("tcp:"):
+        host, port = destination[len("tcp:"):].rsplit(":", 1)
+        with socket.create_connection((host, int(port))) as sock:
+            sock.sendall(payload)
+    else:
+        directory = os.path.dirname(os.path.abspath(destination))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{destination}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, destination)
+
+
+# Aktivne metrike za trenutni kontekst (None = mjerenje isključeno)
+_ACTIVE_METRICS: contextvars.ContextVar = contextvars.ContextVar("distributions_metrics", default=None)
+
+
+class _StageTimer:
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics: PlanMetrics, stage: str):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def _stage(name: str):
+    """Mjeri trajanje bloka ako su metrike uključene; inače dijeljeni no-op."""
+    metrics = _ACTIVE_METRICS.get()
+    if metrics is None:
+        return _NULL_STAGE
+    return _StageTimer(metrics, name)
+
+
+def _count(event: str, amount: int = 1) -> None:
+    metrics = _ACTIVE_METRICS.get()
+    if metrics is not None:
+        metrics.count(event, amount)
+
+
+class collect_metrics:
+    """
+    Uključi mjerenje za blok koda:
+
+        with collect_metrics() as metrics:
+            plan = generate_weekly_plan(...)
+        export_prometheus(metrics, "/var/lib/node_exporter/distributions.prom")
+    """
+
+    def __init__(self, metrics: PlanMetrics = None):
+        self.metrics = metrics or PlanMetrics()
+        self._token = None
+
+    def __enter__(self) -> PlanMetrics:
+        self._token = _ACTIVE_METRICS.set(self.metrics)
+        return self.metrics
+
+    def __exit__(self, *exc):
+        _ACTIVE_METRICS.reset(self._token)
+        return False
+
+
+# ============================================
+# PROFILIRANJE POJEDINIH ZAHTJEVA
+# ============================================
+
+class CollapsedStackProfiler:
+    """
+    Deterministički profiler (sys.setprofile) koji vrijeme između događaja
+    pripisuje trenutnom stacku. Izlaz je "collapsed stack" format
+    (okvir;okvir;okvir mikrosekunde) koji čitaju flamegraph.pl, speedscope
+    i inferno. Radi samo za dretvu u kojoj je pokrenut.
+    """
+
+    def __init__(self):
+        self.stacks: Dict[Tuple[str, ...], int] = {}
+        self._stack: List[str] = []
+        self._last = 0
+
+    @staticmethod
+    def _frame_name(frame) -> str:
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+    def _callback(self, frame, event, arg) -> None:
+        now = time.perf_counter_ns()
+        if self._stack:
+            key = tuple(self._stack)
+            self.stacks[key] = self.stacks.get(key, 0) + (now - self._last)
+        if event == "call":
+            self._stack.append(self._frame_name(frame))
+        elif event == "c_call":
+            self._stack.append(f"<builtin>:{getattr(arg, '__qualname__', getattr(arg, '__name__', '?'))}")
+        elif self._stack:  # return, c_return, c_exception
+            self._stack.pop()
+        self._last = time.perf_counter_ns()
+
+    def start(self) -> None:
+        # Okviri iznad početka profiliranja su korijen svih stackova
+        frame = sys._getframe(2)
+        roots = []
+        while frame is not None:
+            roots.append(self._frame_name(frame))
+            frame = frame.f_back
+        self._stack = roots[::-1]
+        self._last = time.perf_counter_ns()
+        sys.setprofile(self._callback)
+
+    def stop(self) -> None:
+        sys.setprofile(None)
+
+    def collapsed(self) -> str:
+        lines = []
+        for stack, ns in sorted(self.stacks.items()):
+            micros = ns // 1000
+            if micros > 0:
+                lines.append(f"{';'.join(stack)} {micros}")
+        return "\n".join(lines) + "\n"
+
+
+class ProfilingConfig:
+    """
+    Kada profilirati: sample_rate (0.0 - 1.0) nasumičnih zahtjeva ili
+    zahtjevi s eksplicitnim profile=True. Uzorkovani profil se sprema samo
+    ako je poziv trajao barem min_duration sekundi (forsirani uvijek).
+    """
+
+    def __init__(self, sample_rate: float = 0.0, output_dir: str = None, min_duration: float = 0.0):
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir or os.path.join(os.getcwd(), "profiles")
+        self.min_duration = min_duration
+
+
+PROFILING = ProfilingConfig(
+    sample_rate=float(os.environ.get("DISTRIBUTIONS_PROFILE_RATE", "0") or 0),
+    output_dir=os.environ.get("DISTRIBUTIONS_PROFILE_DIR"),
+    min_duration=float(os.environ.get("DISTRIBUTIONS_PROFILE_MIN_SECONDS", "0") or 0),
+)
+
+
+def configure_profiling(sample_rate: float = None, output_dir: str = None, min_duration: float = None) -> None:
+    if sample_rate is not None:
+        PROFILING.sample_rate = sample_rate
+    if output_dir is not None:
+        PROFILING.output_dir = output_dir
+    if min_duration is not None:
+        PROFILING.min_duration = min_duration
+
+
+# None = izvan request_profile bloka, False = u bloku bez profiliranja, inače profiler
+_ACTIVE_PROFILE: contextvars.ContextVar = contextvars.ContextVar("distributions_profile", default=None)
+_PROFILE_COUNTER = iter(range(1, 1 << 62))
+
+
+class request_profile:
+    """
+    Profiliraj blok ako je forsiran ili izvučen po PROFILING.sample_rate.
+    Ugniježđeni blokovi ne profiliraju ponovno. Nakon bloka `path` je
+    putanja .collapsed fajla (ili None).
+
+        with request_profile(force=request.profile, label="weekly_plan-42") as prof:
+            plan = generate_weekly_plan(...)
+    """
+
+    def __init__(self, force: bool = False, label: str = "weekly_plan"):
+        self.force = force
+        self.label = label
+        self.path: Optional[str] = None
+        self._profiler: Optional[CollapsedStackProfiler] = None
+        self._token = None
+        self._start = 0.0
+
+    def __enter__(self) -> "request_profile":
+        if _ACTIVE_PROFILE.get() is not None:
+            return self
+        selected = self.force or (PROFILING.sample_rate > 0 and random.random() < PROFILING.sample_rate)
+        if selected:
+            self._profiler = CollapsedStackProfiler()
+        self._token = _ACTIVE_PROFILE.set(self._profiler or False)
+        self._start = time.perf_counter()
+        if self._profiler is not None:
+            self._profiler.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._token is None:
+            return False
+        if self._profiler is not None:
+            self._profiler.stop()
+        _ACTIVE_PROFILE.reset(self._token)
+        duration = time.perf_counter() - self._start
+        if self._profiler is not None and (self.force or duration >= PROFILING.min_duration):
+            os.makedirs(PROFILING.output_dir, exist_ok=True)
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            safe_label = re.sub(r"[^\w.-]", "_", self.label)
+            self.path = os.path.join(
+                PROFILING.output_dir,
+                f"{safe_label}-{stamp}-{os.getpid()}-{next(_PROFILE_COUNTER)}.collapsed",
+            )
+            with open(self.path, "w", encoding="utf-8") as f:
+                f.write(self._profiler.collapsed())
+            logger.info("🔥 Profile (%.1f ms) written to %s", duration * 1000, self.path)
+        return False
 
 
 # ============================================
 # TIPOVI I STRUKTURE PODATAKA
 # ============================================
 
-@dataclass
+@dataclass(slots=True)
 class MealComponent:
     """Komponenta obroka (namirnica s gramažom)"""
     food: str
@@ -21,7 +440,7 @@ class MealComponent:
     displayName: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Meal:
     """Jelo iz baze"""
     id: str
@@ -84,7 +503,19 @@ class DailyTargets:
     fat: float
 
 
-@dataclass
+@dataclass(slots=True)
+class ScaledComponent:
+    """Komponenta generiranog obroka (skalirana gramaža i makroi); u JSON-u isti ključevi kao polja"""
+    name: str
+    food: str
+    grams: float
+    calories: float = 0
+    protein: float = 0
+    carbs: float = 0
+    fat: float = 0
+
+
+@dataclass(slots=True)
 class GeneratedMeal:
     """Generirani obrok s izračunatim makroima"""
     id: str
@@ -92,7 +523,7 @@ class GeneratedMeal:
     description: str
     image: Optional[str]
     preparationTip: Optional[str]
-    components: List[Dict[str, Any]]
+    components: List[ScaledComponent]
     totals: Dict[str, float]
 
 
@@ -105,62 +536,1875 @@ class DailyPlan:
     dailyTotals: Dict[str, float]
 
 
+class FoodsDatabase(dict):
+    """
+    foods_db (ime namirnice -> Food) s verzijom izvora.
+    version je SHA-256 foods-database.ts; koristi se kao ključ za cacheve
+    izvedene iz baze (npr. matrica makroa).
+
+    Imena koja nisu ključ razrješava resolver (isto kao findNamirnica u
+    TS-u: lower-case id, lower-case nameEn, djelomično podudaranje) i
+    rezultat se pamti, pa `in`, [] i get() vide ista imena kao TS.
+    """
+
+    def __init__(self, *args, version: str = "", resolver: "FoodResolver" = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = version
+        self.resolver = resolver
+        self._unresolved: set = set()
+
+    def _resolve(self, key: Any) -> Optional["Food"]:
+        if self.resolver is None or not isinstance(key, str) or key in self._unresolved:
+            return None
+        food = self.resolver.find(key)
+        if food is None:
+            self._unresolved.add(key)
+        else:
+            dict.__setitem__(self, key, food)
+        return food
+
+    def __missing__(self, key: Any) -> "Food":
+        food = self._resolve(key)
+        if food is None:
+            raise KeyError(key)
+        return food
+
+    def __contains__(self, key: Any) -> bool:
+        return dict.__contains__(self, key) or self._resolve(key) is not None
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        if dict.__contains__(self, key):
+            return dict.__getitem__(self, key)
+        food = self._resolve(key)
+        return default if food is None else food
+
+
 # ============================================
 # UČITAVANJE PODATAKA
 # ============================================
 
-def load_foods_database() -> Dict[str, Food]:
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+FOODS_DATABASE_FILE = os.path.join(DATA_DIR, 'foods-database.ts')
+MEAL_COMPONENTS_FILE = os.path.join(DATA_DIR, 'meal_components.json')
+
+# Kompilirani snapshotovi baze namirnica (ključ = hash izvornog .ts fajla)
+CACHE_DIR = os.environ.get('DISTRIBUTIONS_CACHE_DIR', os.path.join(DATA_DIR, '.cache'))
+
+# Verzija formata snapshota - povećaj ako se promijeni parser ili struktura
+FOODS_SNAPSHOT_VERSION = 1
+
+# Verzija razrješavanja imena (FoodResolver) - dio verzije baze, jer mijenja makroe
+FOODS_LOOKUP_VERSION = 2
+
+_FOODS_FIELDS = (
+    "id", "name", "nameEn",
+    "caloriesPer100g", "proteinPer100g", "carbsPer100g", "fatsPer100g",
+    "category",
+)
+_TS_FIELD_RE = re.compile(
+    r"(\w+)\s*:\s*(?:'((?:[^'\\]|\\.)*)'|calcKcal\(([^)]*)\)|(-?\d+(?:\.\d+)?))"
+)
+_TS_ALIAS_RE = re.compile(r"'((?:[^'\\]|\\.)*)'\s*:\s*'((?:[^'\\]|\\.)*)'")
+
+# Memorija procesa: hash -> lookup dict (drugi poziv ne čita ni snapshot)
+_FOODS_MEMO: Dict[str, FoodsDatabase] = {}
+
+
+def _strip_ts_comments(source: str) -> str:
+    """Ukloni // komentare (izvan stringova) iz TypeScript izvora."""
+    lines = []
+    for line in source.split("\n"):
+        quote = None
+        for i, ch in enumerate(line):
+            if quote:
+                if ch == quote and line[i - 1] != "\\":
+                    quote = None
+            elif ch in ("'", '"'):
+                quote = ch
+            elif ch == "/" and line[i + 1:i + 2] == "/":
+                line = line[:i]
+                break
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _ts_block(source: str, marker: str, open_ch: str, close_ch: str) -> str:
+    """Vrati sadržaj bloka (niz ili objekt) koji počinje nakon markera."""
+    start = source.index(marker)
+    start = source.index(open_ch, start + len(marker))
+    end = source.index("\n" + close_ch + ";", start)
+    return source[start + 1:end]
+
+
+def _js_round(value: float) -> int:
+    """Math.round iz JS-a (half-up), za calcKcal() paritet."""
+    return int(math.floor(value + 0.5))
+
+
+def parse_foods_database_ts(source: str) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    """
+    Izvuci NAMIRNICE i FOOD_ALIASES iz foods-database.ts.
+
+    Returns:
+        (lista namirnica kao dictova, mapa alias -> id namirnice)
+    """
+    source = _strip_ts_comments(source)
+
+    foods = []
+    body = _ts_block(source, "export const NAMIRNICE", "[", "]")
+    for raw in re.findall(r"\{([^{}]*)\}", body):
+        item: Dict[str, Any] = {}
+        for key, text, kcal_args, number in _TS_FIELD_RE.findall(raw):
+            if kcal_args:
+                p, c, f = (float(x) for x in kcal_args.split(","))
+                item[key] = _js_round(p * 4 + c * 4 + f * 9)
+            elif number:
+                item[key] = float(number)
+            else:
+                item[key] = text.replace("\\'", "'")
+        missing = [k for k in _FOODS_FIELDS if k not in item]
+        if missing:
+            raise ValueError(f"Namirnica {item.get('id', '?')} nema polja: {', '.join(missing)}")
+        foods.append({k: item[k] for k in _FOODS_FIELDS})
+
+    aliases = {}
+    alias_body = _ts_block(source, "export const FOOD_ALIASES", "{", "}")
+    for key, food_id in _TS_ALIAS_RE.findall(alias_body):
+        aliases[key.replace("\\'", "'")] = food_id.replace("\\'", "'")
+
+    return foods, aliases
+
+
+class FoodResolver:
+    """
+    findNamirnica() iz foods-database.ts, korak po korak:
+    1. alias (alias na nepostojeći id -> nema namirnice, kao u TS-u)
+    2. id = ime lower-case, razmaci -> _
+    3. nameEn lower-case
+    4. djelomično podudaranje: nameEn sadrži ime ili obrnuto, ili name sadrži ime
+    """
+
+    def __init__(self, foods: List[Food], aliases: Dict[str, str]):
+        self.foods = foods
+        self.aliases = aliases
+        # Kao Map u TS-u: kod duplikata vrijedi zadnji
+        self.by_id = {food.id: food for food in foods}
+        self.by_name_en = {food.nameEn.lower(): food for food in foods}
+
+    def find(self, key: str) -> Optional[Food]:
+        alias_id = self.aliases.get(key)
+        if alias_id:
+            return self.by_id.get(alias_id)
+        food = self.by_id.get(re.sub(r"\s+", "_", key.lower()))
+        if food is not None:
+            return food
+        lower_key = key.lower()
+        food = self.by_name_en.get(lower_key)
+        if food is not None:
+            return food
+        for food in self.foods:
+            name_en = food.nameEn.lower()
+            if lower_key in name_en or name_en in lower_key or lower_key in food.name.lower():
+                return food
+        return None
+
+
+def _build_foods_lookup(foods: List[Dict[str, Any]], aliases: Dict[str, str], version: str = "") -> FoodsDatabase:
+    """
+    Složi foods_db ključan po imenima koja koristi meal_components.json.
+    Aliasi, id-evi i nameEn su unaprijed razriješeni kroz FoodResolver
+    (redoslijed findNamirnica() u TS-u); ostala imena se razrješavaju
+    na zahtjev.
+    """
+    resolver = FoodResolver([Food(**f) for f in foods], aliases)
+    lookup = FoodsDatabase(version=version, resolver=resolver)
+    for key in [*aliases, *(f["id"] for f in foods), *(f["nameEn"] for f in foods)]:
+        lookup.get(key)
+    return lookup
+
+
+def _file_hash(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _write_json_atomic(path: str, data: Any, indent: int = None) -> None:
+    """Zapiši JSON preko privremenog fajla + os.replace (bez polovičnih snapshotova)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        if indent is None:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        else:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+    os.replace(tmp_path, path)
+
+
+def load_foods_database(
+    path: str = FOODS_DATABASE_FILE,
+    cache_dir: Optional[str] = None,
+) -> FoodsDatabase:
     """
-    Učitaj bazu namirnica iz TypeScript fajla.
-    Ovo je placeholder - u produkciji bi se ovo učitavalo iz baze ili JSON fajla.
+    Učitaj bazu namirnica iz foods-database.ts.
+
+    TS fajl se parsira samo jednom po sadržaju: rezultat se sprema kao JSON
+    snapshot u cache_dir pod imenom iz SHA-256 hasha izvora, a idući startovi
+    (i drugi workeri) čitaju snapshot. Unutar procesa rezultat se pamti pa je
+    svaki idući poziv besplatan.
+
+    Returns:
+        foods_db ključan po aliasu, engleskom nazivu i id-u namirnice
     """
-    # Ovo će biti zamijenjeno stvarnim učitavanjem iz foods-database.ts
-    # Za sada vraćamo prazan dict - treba implementirati parser ili JSON export
-    return {}
+    with _stage("foods_load"):
+        return _load_foods_database(path, cache_dir)
+
+
+def _load_foods_database(path: str, cache_dir: Optional[str]) -> FoodsDatabase:
+    try:
+        source_hash = _file_hash(path)
+    except FileNotFoundError:
+        logger.warning("⚠️ foods database not found: %s", path)
+        return FoodsDatabase()
+
+    if source_hash in _FOODS_MEMO:
+        return _FOODS_MEMO[source_hash]
+
+    cache_dir = cache_dir or CACHE_DIR
+    snapshot_path = os.path.join(cache_dir, f"foods-v{FOODS_SNAPSHOT_VERSION}-{source_hash[:16]}.json")
+
+    snapshot = None
+    try:
+        with open(snapshot_path, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+        if snapshot.get("sourceHash") != source_hash:
+            snapshot = None
+    except (FileNotFoundError, ValueError):
+        snapshot = None
+
+    if snapshot is None:
+        with open(path, 'r', encoding='utf-8') as f:
+            foods, aliases = parse_foods_database_ts(f.read())
+        snapshot = {
+            "version": FOODS_SNAPSHOT_VERSION,
+            "sourceHash": source_hash,
+            "foods": foods,
+            "aliases": aliases,
+        }
+        try:
+            _write_json_atomic(snapshot_path, snapshot)
+        except OSError as e:
+            # Read-only deploy - radi i bez snapshota
+            logger.warning("⚠️ Could not write foods snapshot: %s", e)
+
+    foods_db = _build_foods_lookup(
+        snapshot["foods"], snapshot["aliases"], version=f"{source_hash}-l{FOODS_LOOKUP_VERSION}"
+    )
+    _FOODS_MEMO[source_hash] = foods_db
+    return foods_db
 
 
-def load_meal_components() -> Dict[str, List[Dict]]:
+def load_meal_components(path: str = None) -> Dict[str, List[Dict]]:
     """
     Učitaj jela iz meal_components.json.
     """
     try:
-        with open('lib/data/meal_components.json', 'r', encoding='utf-8') as f:
+        with open(path or MEAL_COMPONENTS_FILE, 'r', encoding='utf-8') as f:
             data = json.load(f)
         return data
     except FileNotFoundError:
-        print("⚠️ meal_components.json not found")
+        logger.warning("⚠️ meal_components.json not found")
         return {}
 
 
 # ============================================
-# RASPODJELA KALORIJA PO OBROCIMA
+# KATALOG JELA
 # ============================================
 
-def get_meal_distribution(num_meals: int, goal_type: str) -> Dict[str, float]:
+# Kategorije u meal_components.json (= Meal.mealType)
+MEAL_TYPES = ("breakfast", "lunch", "dinner", "snack")
+
+
+def slot_meal_type(slot: str) -> str:
+    """Slot iz distribucije (snack1, snack2...) -> mealType iz kataloga (snack)."""
+    return "snack" if slot.startswith("snack") else slot
+
+
+def meal_from_dict(data: Dict[str, Any], meal_type: str) -> Meal:
+    """Složi tipizirani Meal iz zapisa u meal_components.json."""
+    return Meal(
+        id=data["id"],
+        name=data["name"],
+        description=data.get("description", ""),
+        image=data.get("image"),
+        preparationTip=data.get("preparationTip"),
+        components=[
+            MealComponent(
+                # Ista imena namirnica se ponavljaju kroz katalog - jedan string po imenu
+                food=sys.intern(c["food"]),
+                grams=c["grams"],
+                displayName=sys.intern(c.get("displayName", c["food"])),
+            )
+            for c in data.get("components", [])
+        ],
+        tags=list(data.get("tags", [])),
+        suitableFor=list(data.get("suitableFor", [])),
+        mealType=meal_type,
+    )
+
+
+# Bitovi po bajtu (0-255) -> pozicije postavljenih bitova, za dekodiranje bitseta
+_BYTE_BITS = tuple(tuple(i for i in range(8) if byte >> i & 1) for byte in range(256))
+
+
+def _bitset_indices(mask: int) -> List[int]:
+    """Pozicije postavljenih bitova u int bitsetu, uzlazno."""
+    if not mask:
+        return []
+    data = mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+    if np is not None:
+        bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8), bitorder='little')
+        return np.flatnonzero(bits).tolist()
+    indices = []
+    for offset, byte in enumerate(data):
+        if byte:
+            base = offset * 8
+            indices.extend(base + i for i in _BYTE_BITS[byte])
+    return indices
+
+
+class MealFilterIndex:
     """
-    Vraća distribuciju kalorija po obrocima (3, 5 ili 6 obroka).
-    Distribucija je ista za sve makroe.
+    Invertirani indeks namirnica za filter_meals.
+
+    Svaka namirnica (food.lower()) mapira se na bitset jela (Python int,
+    bit i = i-to jelo) koja je sadrže. Ograničenje korisnika (alergija ili
+    dislike) razrješava se jednom prema poznatim namirnicama uz istu
+    dvosmjernu substring semantiku kao filter_meals, pa je isključenje
+    nekoliko OR-ova bitseta i jedan AND-NOT.
     """
-    if num_meals == 3:
+
+    # Koliko razriješenih ograničenja pamtimo prije pražnjenja
+    MAX_CACHED_TERMS = 4096
+
+    def __init__(self, meals: List[Meal], components: "MealComponentMatrix" = None):
+        self.meals = list(meals)
+        self.all_mask = (1 << len(self.meals)) - 1
+        self.food_masks: Dict[str, int] = {}
+        self.type_masks: Dict[str, int] = {}
+        if components is not None:
+            # Namirnice iz CSR matrice (redak i = meals[i]) - bez čitanja meal.components
+            names_lower = [name.lower() for name in components.registry.names]
+            indptr, food_ids = components.indptr, components.food_ids
+        for i, meal in enumerate(self.meals):
+            bit = 1 << i
+            self.type_masks[meal.mealType] = self.type_masks.get(meal.mealType, 0) | bit
+            if components is not None:
+                foods_lower = [names_lower[food_ids[k]] for k in range(indptr[i], indptr[i + 1])]
+            else:
+                foods_lower = [component.food.lower() for component in meal.components]
+            for food_lower in foods_lower:
+                self.food_masks[food_lower] = self.food_masks.get(food_lower, 0) | bit
+        self._term_masks: Dict[str, int] = {}
+
+    def term_mask(self, term: str) -> int:
+        """Bitset jela isključenih jednim ograničenjem."""
+        term = term.lower()
+        mask = self._term_masks.get(term)
+        if mask is None:
+            mask = 0
+            for food_lower, food_mask in self.food_masks.items():
+                if term in food_lower or food_lower in term:
+                    mask |= food_mask
+            if len(self._term_masks) >= self.MAX_CACHED_TERMS:
+                self._term_masks.clear()
+            self._term_masks[term] = mask
+        return mask
+
+    def exclusion_mask(self, user: UserPreferences) -> int:
+        """Bitset jela koja sadrže alergen ili nepoželjnu namirnicu."""
+        mask = 0
+        for term in user.allergies:
+            mask |= self.term_mask(term)
+        for term in user.dislikes:
+            mask |= self.term_mask(term)
+        return mask
+
+    def meals_for_mask(self, mask: int) -> List[Meal]:
+        meals = self.meals
+        return [meals[i] for i in _bitset_indices(mask)]
+
+    def filter_type(self, meal_type: str, user: UserPreferences) -> List[Meal]:
+        """Jela tipa meal_type bez alergena i dislikes, u redoslijedu kataloga."""
+        type_mask = self.type_masks.get(meal_type, 0)
+        if not user.allergies and not user.dislikes:
+            return self.meals_for_mask(type_mask)
+        return self.meals_for_mask(type_mask & ~self.exclusion_mask(user))
+
+
+def restriction_signature(user: UserPreferences) -> Tuple[str, ...]:
+    """
+    Normalizirani potpis ograničenja: sortirani, lower-case, bez duplikata.
+    Alergije i dislikes filtriraju identično pa dijele isti skup.
+    """
+    return tuple(sorted({t.lower() for t in user.allergies} | {t.lower() for t in user.dislikes}))
+
+
+class CandidatePoolCache:
+    """
+    LRU cache filtriranih kandidata po (verzija kataloga, potpis ograničenja).
+
+    Unos pamti bitset isključenih jela i lijeno složene liste po mealType.
+    Kad potpis nije u cacheu, a jest potpis s jednim ograničenjem manje
+    (korisnik je dodao alergiju/dislike), novi bitset je roditeljev OR
+    maska tog jednog ograničenja. Inače se maska slaže iz memoiziranih
+    maski pojedinih ograničenja - bez ponovnog prolaza kroz katalog.
+
+    Osim brojem unosa cache je ograničen veličinom (max_words): zbroj
+    duljina lista kandidata i 64-bitnih riječi bitsetova. Na katalozima
+    s milijun jela nekoliko stotina unosa bi inače zauzelo gigabajte.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_words: int = 4_000_000):
+        self.max_entries = max_entries
+        self.max_words = max_words
+        self._entries: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.words = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.derived = 0
+
+    def _exclusion(self, catalog: "MealCatalog", signature: Tuple[str, ...]) -> int:
+        """Bitset isključenih jela; koristi roditelja iz cachea ako postoji."""
+        index = catalog.filter_index
+        for i, term in enumerate(signature):
+            parent = self._entries.get((catalog.version, signature[:i] + signature[i + 1:]))
+            if parent is not None:
+                self.derived += 1
+                return parent["exclusion"] | index.term_mask(term)
+        mask = 0
+        for term in signature:
+            mask |= index.term_mask(term)
+        return mask
+
+    def _evict(self) -> None:
+        # Najnoviji unos (upravo korišten) ostaje i kad sam prelazi max_words
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self.words > self.max_words
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self.words -= entry["words"]
+            self.evictions += 1
+
+    def pool(self, catalog: "MealCatalog", meal_type: str, user: UserPreferences) -> List[Meal]:
+        """Filtrirani kandidati za mealType (isto što i filter_meals na tom tipu)."""
+        key = (catalog.version, restriction_signature(user))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            else:
+                self.misses += 1
+                exclusion = self._exclusion(catalog, key[1])
+                entry = {"exclusion": exclusion, "pools": {}, "words": exclusion.bit_length() // 64 + 1}
+                self._entries[key] = entry
+                self.words += entry["words"]
+                self._evict()
+
+            pools = entry["pools"]
+            if meal_type not in pools:
+                index = catalog.filter_index
+                type_mask = index.type_masks.get(meal_type, 0)
+                pools[meal_type] = index.meals_for_mask(type_mask & ~entry["exclusion"])
+                entry["words"] += len(pools[meal_type])
+                self.words += len(pools[meal_type])
+                self._evict()
+            return pools[meal_type]
+
+    def stats(self) -> Dict[str, int]:
         return {
-            "breakfast": 0.35,
-            "lunch": 0.40,
-            "dinner": 0.25,
+            "size": len(self._entries),
+            "words": self.words,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "derived": self.derived,
         }
-    elif num_meals == 5:
-        if goal_type == "lose":
-            return {
-                "breakfast": 0.30,
-                "snack1": 0.10,
-                "lunch": 0.30,
-                "snack2": 0.10,
-                "dinner": 0.20,
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.words = 0
+            self.hits = self.misses = self.evictions = self.derived = 0
+
+
+# Zajednički cache kandidata za sve pozive generate_meal u procesu
+CANDIDATE_POOL_CACHE = CandidatePoolCache()
+
+
+class FoodRegistry:
+    """Imena namirnica (MealComponent.food) internirana u guste int id-eve 0..n-1."""
+
+    def __init__(self, names: List[str] = ()):
+        self.names: List[str] = []
+        self.ids: Dict[str, int] = {}
+        for name in names:
+            self.intern(name)
+
+    def intern(self, name: str) -> int:
+        food_id = self.ids.get(name)
+        if food_id is None:
+            food_id = len(self.names)
+            self.ids[name] = food_id
+            self.names.append(name)
+        return food_id
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.ids
+
+    def nutrient_table(self, foods_db: Dict[str, Food]) -> Tuple[array, List[str]]:
+        """
+        (P, C, F) na 100 g po food id-u, spljošteno u array('d') duljine 3n,
+        i imena koja nisu u foods_db (dobiju 5/15/5 kao u calculate_meal_macros).
+        """
+        table = array("d")
+        missing = []
+        for name in self.names:
+            food = foods_db.get(name)
+            if food is None:
+                missing.append(name)
+                table.extend((5, 15, 5))
+            else:
+                table.extend((food.proteinPer100g, food.carbsPer100g, food.fatsPer100g))
+        return table, missing
+
+
+class MealComponentMatrix:
+    """
+    Komponente kataloga kao CSR matrica jela × namirnica: redak i ima
+    komponente indptr[i]:indptr[i+1] u food_ids (FoodRegistry id) i grams.
+    Sve je u array.array (bez objekata po komponenti).
+
+    macro_sums je umnožak te matrice s tablicom nutrijenata; zbraja se po
+    redoslijedu komponenti pa je rezultat bit-identičan _meal_macro_sums.
+    """
+
+    def __init__(self, meals: List[Meal], registry: FoodRegistry):
+        self.registry = registry
+        self.row_of: Dict[str, int] = {}
+        self.indptr = array("q", [0])
+        self.food_ids = array("i")
+        self.grams = array("d")
+        for meal in meals:
+            self.row_of.setdefault(meal.id, len(self.indptr) - 1)
+            for component in meal.components:
+                self.food_ids.append(registry.intern(component.food))
+                self.grams.append(component.grams)
+            self.indptr.append(len(self.food_ids))
+        self._tables: Dict[str, array] = {}
+        self._missing: Dict[str, Dict[str, int]] = {}
+        # Unaprijed izračunati zbrojevi po verziji baze namirnica (3 double po retku)
+        self.base_sums: Dict[str, Any] = {}
+
+    @classmethod
+    def from_buffers(
+        cls, registry: FoodRegistry, meal_ids: List[str], indptr, food_ids, grams
+    ) -> "MealComponentMatrix":
+        """Matrica nad gotovim bufferima (npr. memoryview iz kompiliranog kataloga), bez kopiranja."""
+        matrix = cls([], registry)
+        matrix.row_of = {meal_id: i for i, meal_id in enumerate(meal_ids)}
+        matrix.indptr, matrix.food_ids, matrix.grams = indptr, food_ids, grams
+        return matrix
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    def rows_for(self, meals: List[Meal]) -> List[int]:
+        return [self.row_of[m.id] for m in meals]
+
+    def missing_foods(self, foods_db: Dict[str, Food]) -> Dict[str, int]:
+        """
+        Namirnice kojih nema u foods_db i broj komponenti koje ih koriste.
+        Ovisi samo o katalogu i verziji baze (ne o tome koliko je procesa
+        gradilo tablicu), pa ga batch ne zbraja po workerima.
+        """
+        key = foods_db_version(foods_db)
+        missing = self._missing.get(key)
+        if missing is None:
+            missing = {}
+            unresolved = {
+                food_id for food_id, name in enumerate(self.registry.names) if foods_db.get(name) is None
             }
-        elif goal_type == "gain":
-            return {
-                "breakfast": 0.25,
-                "snack1": 0.12,
-                "lunch": 0.35,
+            if unresolved:
+                if np is not None:
+                    occurrences = np.bincount(np.frombuffer(self.food_ids, dtype=np.int32), minlength=len(self.registry))
+                else:
+                    occurrences = Counter(self.food_ids)
+                for food_id in sorted(unresolved):
+                    if occurrences[food_id]:
+                        missing[self.registry.names[food_id]] = int(occurrences[food_id])
+            self._missing[key] = missing
+        return missing
+
+    def _table(self, foods_db: Dict[str, Food]) -> array:
+        key = foods_db_version(foods_db)
+        table = self._tables.get(key)
+        if table is None:
+            table, _ = self.registry.nutrient_table(foods_db)
+            for name, count in self.missing_foods(foods_db).items():
+                MISSING_FOODS.record(name, count)
+            self._tables[key] = table
+        return table
+
+    def macro_sums(self, foods_db: Dict[str, Food], rows: List[int] = None) -> List[Tuple[float, float, float]]:
+        """Nezaokruženi (protein, carbs, fat) pri scale 1.0 za retke (default svi)."""
+        if rows is None:
+            rows = range(len(self))
+        precomputed = self.base_sums.get(foods_db_version(foods_db))
+        if precomputed is not None:
+            return [(precomputed[3 * r], precomputed[3 * r + 1], precomputed[3 * r + 2]) for r in rows]
+        table = self._table(foods_db)
+        if np is not None:
+            return [tuple(r) for r in self._macro_sums_numpy(table, np.asarray(rows, dtype=np.int64)).tolist()]
+
+        indptr, food_ids, grams = self.indptr, self.food_ids, self.grams
+        sums = []
+        for row in rows:
+            total_protein = total_carbs = total_fat = 0.0
+            for k in range(indptr[row], indptr[row + 1]):
+                base = food_ids[k] * 3
+                ratio = grams[k] / 100.0
+                total_protein += table[base] * ratio
+                total_carbs += table[base + 1] * ratio
+                total_fat += table[base + 2] * ratio
+            sums.append((total_protein, total_carbs, total_fat))
+        return sums
+
+    def _macro_sums_numpy(self, table: array, rows: "np.ndarray") -> "np.ndarray":
+        nutrients = np.frombuffer(table, dtype=np.float64).reshape(-1, 3)
+        indptr = np.frombuffer(self.indptr, dtype=np.int64)
+        food_ids = np.frombuffer(self.food_ids, dtype=np.int32)
+        grams = np.frombuffer(self.grams, dtype=np.float64)
+        starts = indptr[rows]
+        lengths = indptr[rows + 1] - starts
+        sums = np.zeros((len(rows), 3), dtype=np.float64)
+        # j-ta komponenta svih jela odjednom - isti redoslijed zbrajanja kao petlja po jelu
+        for j in range(int(lengths.max(initial=0))):
+            active = np.flatnonzero(lengths > j)
+            k = starts[active] + j
+            ratio = grams[k] / 100.0
+            sums[active] += nutrients[food_ids[k]] * ratio[:, None]
+        return sums
+
+    def flat_sums(self, foods_db: Dict[str, Food]):
+        """
+        (protein, carbs, fat) svih redaka spljošteno (3 double po retku).
+        Kompilirani katalog ih ima u mapiranom fajlu (dijeljene stranice);
+        inače se izračunaju jednom i spreme u base_sums.
+        """
+        key = foods_db_version(foods_db)
+        sums = self.base_sums.get(key)
+        if sums is None:
+            sums = array("d", itertools.chain.from_iterable(self.macro_sums(foods_db)))
+            self.base_sums[key] = sums
+        return sums
+
+    def macros(self, foods_db: Dict[str, Food], rows: List[int] = None) -> List[Dict[str, float]]:
+        """calculate_meal_macros(meal, foods_db) za retke (default svi), jednim prolazom."""
+        return [_rounded_macros(*sums) for sums in self.macro_sums(foods_db, rows)]
+
+
+def preference_signature(user: UserPreferences) -> Tuple[str, ...]:
+    """Normalizirane preferirane namirnice: sortirane, lower-case, bez duplikata."""
+    return tuple(sorted({t.lower() for t in user.preferredIngredients or []}))
+
+
+class MealPreferenceIndex:
+    """
+    preference_bonus za sva jela kataloga iz CSR matrice komponenti.
+
+    Preferencija se razrješava jednom u masku namirnica (ista dvosmjerna
+    substring semantika kao preference_bonus), a broj odgovarajućih
+    komponenti po jelu je zbroj maske nad food_ids po retku - meal.components
+    (i dekodiranje CompiledMeal komponenti) se ne čita. Bonus po skupu
+    preferencija je vektor po retku (redoslijed filter_index.meals), LRU
+    ograničen ukupnim brojem vrijednosti.
+    """
+
+    MAX_CACHED_TERMS = 4096
+    MAX_CACHED_VALUES = 4_000_000
+
+    def __init__(self, components: MealComponentMatrix):
+        self.registry = components.registry
+        self.indptr = np.frombuffer(components.indptr, dtype=np.int64)
+        self.food_ids = np.frombuffer(components.food_ids, dtype=np.int32)
+        self._term_foods: Dict[str, "np.ndarray"] = {}
+        self._bonuses: "OrderedDict[Tuple[str, ...], np.ndarray]" = OrderedDict()
+
+    def term_foods(self, term: str) -> "np.ndarray":
+        """Bool maska namirnica (po food id-u) koje odgovaraju preferenciji."""
+        mask = self._term_foods.get(term)
+        if mask is None:
+            names = self.registry.names
+            mask = np.fromiter(
+                (term in name.lower() or name.lower() in term for name in names), dtype=bool, count=len(names)
+            )
+            if len(self._term_foods) >= self.MAX_CACHED_TERMS:
+                self._term_foods.clear()
+            self._term_foods[term] = mask
+        return mask
+
+    def bonus(self, signature: Tuple[str, ...]) -> "np.ndarray":
+        """preference_bonus po retku za preference_signature korisnika."""
+        bonus = self._bonuses.get(signature)
+        if bonus is not None:
+            self._bonuses.move_to_end(signature)
+            return bonus
+        foods = np.zeros(len(self.registry), dtype=bool)
+        for term in signature:
+            foods |= self.term_foods(term)
+        # Komponenta se broji jednom čak i kad odgovara s više preferencija
+        matched = np.concatenate(([0], np.cumsum(foods[self.food_ids], dtype=np.int64)))
+        counts = matched[self.indptr[1:]] - matched[self.indptr[:-1]]
+        # Bonus se u preference_bonus zbraja korak po korak - ista tablica daje iste bitove
+        steps = [0.0]
+        for _ in range(int(counts.max(initial=0))):
+            steps.append(steps[-1] - 0.05)
+        bonus = np.array(steps, dtype=np.float64)[counts]
+        self._bonuses[signature] = bonus
+        while len(self._bonuses) > 1 and len(self._bonuses) * len(bonus) > self.MAX_CACHED_VALUES:
+            self._bonuses.popitem(last=False)
+        return bonus
+
+
+# Tokeni za kataloge bez verzije (jedinstveni u procesu, za razliku od id())
+_CATALOG_TOKENS = itertools.count(1)
+
+
+class MealCatalog:
+    """
+    Tipizirani katalog jela, indeksiran jednom pri učitavanju.
+
+    - by_id: O(1) pristup jelu po id-u
+    - by_type: jela po mealType (breakfast, lunch, dinner, snack)
+    - by_goal: jela po cilju iz suitableFor (lose, maintain, gain)
+
+    Liste u indeksima su u redoslijedu iz meal_components.json pa odabir
+    jela ostaje isti kao kod liste.
+    """
+
+    def __init__(
+        self,
+        meals: List[Meal],
+        goal_notes: Dict[str, str] = None,
+        version: str = "",
+        components: MealComponentMatrix = None,
+    ):
+        self.meals = list(meals)
+        self.goal_notes = goal_notes or {}
+        # Bez verzije iz sadržaja katalog dobije jedinstveni token - cacheovi
+        # po verziji (kandidati, makroi) se inače dijele među katalozima
+        self.version = version or f"id:{next(_CATALOG_TOKENS)}"
+
+        self.by_id: Dict[str, Meal] = {}
+        self.by_type: Dict[str, List[Meal]] = {t: [] for t in MEAL_TYPES}
+        self.by_goal: Dict[str, List[Meal]] = {}
+        self._by_type_goal: Dict[Tuple[str, str], List[Meal]] = {}
+        self._macro_matrices: Dict[str, "MealMacroMatrix"] = {}
+        self._macro_caches: Dict[str, MealMacroCache] = {}
+        self._preference_index: Optional[MealPreferenceIndex] = None
+
+        for meal in self.meals:
+            if meal.id in self.by_id:
+                logger.warning("⚠️ Duplicate meal id in catalog: %s", meal.id)
+                continue
+            self.by_id[meal.id] = meal
+            self.by_type.setdefault(meal.mealType, []).append(meal)
+            for goal in meal.suitableFor:
+                self.by_goal.setdefault(goal, []).append(meal)
+                self._by_type_goal.setdefault((meal.mealType, goal), []).append(meal)
+
+        # Redci CSR matrice su u redoslijedu filter_index.meals, kao i matrica makroa;
+        # gotova matrica (kompilirani katalog) mora imati iste retke
+        if components is None:
+            self.filter_index = MealFilterIndex(list(self.by_id.values()))
+            self.food_registry = FoodRegistry()
+            self.components = MealComponentMatrix(self.filter_index.meals, self.food_registry)
+        else:
+            self.filter_index = MealFilterIndex(list(self.by_id.values()), components)
+            self.food_registry = components.registry
+            self.components = components
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], version: str = "") -> "MealCatalog":
+        """Katalog iz sirovog meal_components.json dicta."""
+        meals = [
+            meal_from_dict(item, meal_type)
+            for meal_type in MEAL_TYPES
+            for item in data.get(meal_type, [])
+        ]
+        return cls(meals, goal_notes=data.get("goalNotes"), version=version)
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def __iter__(self) -> Iterator[Meal]:
+        return iter(self.by_id.values())
+
+    def __contains__(self, meal_id: str) -> bool:
+        return meal_id in self.by_id
+
+    def get(self, meal_id: str) -> Optional[Meal]:
+        return self.by_id.get(meal_id)
+
+    def meals_for_type(self, meal_type: str, goal: str = None) -> List[Meal]:
+        """
+        Jela za slot (snack1/snack2/snack3 -> snack), opcionalno samo ona
+        kojima je goal u suitableFor.
+        """
+        meal_type = slot_meal_type(meal_type)
+        if goal is None:
+            return self.by_type.get(meal_type, [])
+        return self._by_type_goal.get((meal_type, goal), [])
+
+    def meals_for_goal(self, goal: str) -> List[Meal]:
+        return self.by_goal.get(goal, [])
+
+    def filter_meals(self, meal_type: str, user: UserPreferences) -> List[Meal]:
+        """
+        filter_meals(meals_for_type(meal_type), user) preko invertiranog indeksa,
+        s rezultatom iz CANDIDATE_POOL_CACHE.
+        """
+        meal_type = slot_meal_type(meal_type)
+        if not user.allergies and not user.dislikes:
+            return self.by_type.get(meal_type, [])
+        return CANDIDATE_POOL_CACHE.pool(self, meal_type, user)
+
+    def macro_cache(self, foods_db: Dict[str, Food]) -> "MealMacroCache":
+        """Cache baznih makroa po jelu, jedan po verziji baze namirnica."""
+        key = foods_db_version(foods_db)
+        if key not in self._macro_caches:
+            # Prvi susret s ovom bazom namirnica - validacija jednom po verziji
+            validate_catalog(self, foods_db)
+            self._macro_caches[key] = MealMacroCache(self, foods_db)
+        return self._macro_caches[key]
+
+    def preference_index(self) -> Optional[MealPreferenceIndex]:
+        """Bonus preferiranih namirnica po retku (kao macro_matrix); bez NumPy-ja None."""
+        if np is None:
+            return None
+        if self._preference_index is None:
+            self._preference_index = MealPreferenceIndex(self.components)
+        return self._preference_index
+
+    def macro_matrix(self, foods_db: Dict[str, Food]) -> Optional["MealMacroMatrix"]:
+        """
+        Matrica makroa za cijeli katalog, gradi se jednom po verziji baze
+        namirnica. Bez NumPy-ja vraća None.
+        """
+        if np is None:
+            return None
+        key = foods_db_version(foods_db)
+        if key not in self._macro_matrices:
+            # Redci su u redoslijedu filter_index.meals (redak i = bit i)
+            self._macro_matrices[key] = MealMacroMatrix(
+                self.filter_index.meals, foods_db, self.macro_cache(foods_db)
+            )
+        return self._macro_matrices[key]
+
+
+# Memorija procesa: hash meal_components.json -> katalog
+_CATALOG_MEMO: Dict[str, MealCatalog] = {}
+
+
+def load_meal_catalog(path: str = None) -> MealCatalog:
+    """
+    Učitaj meal_components.json kao MealCatalog.
+    Katalog se gradi jednom po sadržaju fajla; version je SHA-256 sadržaja.
+    Putanja na .mealbin učitava kompilirani katalog (load_compiled_catalog),
+    a na .sqlite spremište kataloga (load_catalog_store).
+    """
+    path = path or MEAL_COMPONENTS_FILE
+    if path.endswith(COMPILED_CATALOG_SUFFIX):
+        return load_compiled_catalog(path)
+    if path.endswith(CATALOG_STORE_SUFFIX):
+        return load_catalog_store(path)
+    with _stage("catalog_load"):
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            logger.warning("⚠️ meal_components.json not found")
+            return MealCatalog([])
+
+        version = hashlib.sha256(raw).hexdigest()
+        if version not in _CATALOG_MEMO:
+            _CATALOG_MEMO[version] = MealCatalog.from_dict(json.loads(raw.decode('utf-8')), version=version)
+        return _CATALOG_MEMO[version]
+
+
+# ============================================
+# KOMPILIRANI KATALOG (MEMORY-MAPPED)
+# ============================================
+#
+# Format .mealbin (native byte order, zapisan u headeru):
+#   MAGIC (8 B) | duljina headera (u64) | header JSON | sekcije poravnate na 8 B
+# Header JSON sadrži verzije (catalogVersion = SHA-256 izvornog JSON-a,
+# foodsVersion baze iz koje su izračunati makroi), goalNotes i za svaku
+# sekciju [offset, bajtova, typecode]. Sekcije su array.array bufferi:
+#   meal_strings  i  6 po jelu: id, name, description, image, preparationTip, mealType
+#   tag_indptr/tag_ids, goal_indptr/goal_ids   q/i  CSR string id-eva (tags, suitableFor)
+#   indptr/food_ids/grams/display_ids          q/i/d/i  CSR komponenti (MealComponentMatrix)
+#   food_names    i  string id po FoodRegistry id-u
+#   base_sums     d  3 po jelu: nezaokruženi P, C, F pri scale 1.0
+#   string_offsets/string_blob   q/B  tablica UTF-8 stringova (-1 = None)
+
+COMPILED_CATALOG_MAGIC = b"MEALCAT\0"
+COMPILED_CATALOG_FORMAT = 1
+COMPILED_CATALOG_SUFFIX = ".mealbin"
+COMPILED_CATALOG_FILE = os.path.join(CACHE_DIR, "meal_components" + COMPILED_CATALOG_SUFFIX)
+
+_MEAL_STRING_FIELDS = ("id", "name", "description", "image", "preparationTip", "mealType")
+
+
+def compile_meal_catalog(
+    catalog_path: str = None,
+    foods_path: str = None,
+    output_path: str = None
+) -> str:
+    """
+    Izgradi .mealbin iz meal_components.json i baze namirnica (atomski
+    zapis). Vraća putanju izlaznog fajla.
+    """
+    catalog_path = catalog_path or MEAL_COMPONENTS_FILE
+    output_path = output_path or COMPILED_CATALOG_FILE
+    with open(catalog_path, "rb") as f:
+        raw = f.read()
+    version = hashlib.sha256(raw).hexdigest()
+    data = json.loads(raw.decode("utf-8"))
+    catalog = MealCatalog.from_dict(data, version=version)
+    foods_db = load_foods_database(foods_path or FOODS_DATABASE_FILE)
+    meals = catalog.filter_index.meals
+    components = catalog.components
+
+    string_ids: Dict[str, int] = {}
+    string_offsets = array("q", [0])
+    blob = bytearray()
+
+    def intern(value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        string_id = string_ids.get(value)
+        if string_id is None:
+            string_id = len(string_offsets) - 1
+            string_ids[value] = string_id
+            blob.extend(value.encode("utf-8"))
+            string_offsets.append(len(blob))
+        return string_id
+
+    meal_strings = array("i")
+    tag_indptr, tag_ids = array("q", [0]), array("i")
+    goal_indptr, goal_ids = array("q", [0]), array("i")
+    display_ids = array("i")
+    for meal in meals:
+        meal_strings.extend(intern(getattr(meal, field)) for field in _MEAL_STRING_FIELDS)
+        tag_ids.extend(intern(tag) for tag in meal.tags)
+        tag_indptr.append(len(tag_ids))
+        goal_ids.extend(intern(goal) for goal in meal.suitableFor)
+        goal_indptr.append(len(goal_ids))
+        display_ids.extend(intern(c.displayName) for c in meal.components)
+    food_names = array("i", [intern(name) for name in components.registry.names])
+    base_sums = array("d")
+    for sums in components.macro_sums(foods_db):
+        base_sums.extend(sums)
+
+    sections = {
+        "meal_strings": meal_strings,
+        "tag_indptr": tag_indptr,
+        "tag_ids": tag_ids,
+        "goal_indptr": goal_indptr,
+        "goal_ids": goal_ids,
+        "indptr": components.indptr,
+        "food_ids": components.food_ids,
+        "grams": components.grams,
+        "display_ids": display_ids,
+        "food_names": food_names,
+        "base_sums": base_sums,
+        "string_offsets": string_offsets,
+        "string_blob": array("B", bytes(blob)),
+    }
+    header = {
+        "format": COMPILED_CATALOG_FORMAT,
+        "byteorder": sys.byteorder,
+        "catalogVersion": version,
+        "foodsVersion": foods_db_version(foods_db),
+        "meals": len(meals),
+        "goalNotes": catalog.goal_notes,
+        "sections": {},
+    }
+    # Offseti ovise o duljini headera (koja ovisi o offsetima) - ponavljaj dok se ne ustali
+    data_start = -1
+    while True:
+        header_bytes = json.dumps(header, ensure_ascii=False, sort_keys=True).encode("utf-8")
+        start = _align8(len(COMPILED_CATALOG_MAGIC) + 8 + len(header_bytes))
+        if start == data_start:
+            break
+        data_start = offset = start
+        for name, values in sections.items():
+            length = len(values) * values.itemsize
+            header["sections"][name] = [offset, length, values.typecode]
+            offset = _align8(offset + length)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(COMPILED_CATALOG_MAGIC)
+        f.write(len(header_bytes).to_bytes(8, "little"))
+        f.write(header_bytes)
+        for name, values in sections.items():
+            f.write(b"\0" * (header["sections"][name][0] - f.tell()))
+            values.tofile(f)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def _align8(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+class CompiledMeal:
+    """
+    Jelo iz kompiliranog kataloga (isti atributi kao Meal). id, mealType i
+    suitableFor su odmah dostupni; ostali stringovi i komponente se
+    dekodiraju iz mmap-a tek pri prvom pristupu.
+    """
+
+    __slots__ = ("_source", "_row", "id", "mealType", "suitableFor", "_components")
+
+    def __init__(self, source: "CompiledCatalog", row: int, meal_id: str, meal_type: str, suitable_for: List[str]):
+        self._source = source
+        self._row = row
+        self.id = meal_id
+        self.mealType = meal_type
+        self.suitableFor = suitable_for
+        self._components = None
+
+    @property
+    def name(self) -> str:
+        return self._source.meal_string(self._row, 1)
+
+    @property
+    def name_id(self) -> int:
+        """Id imena u tablici stringova (jednaka imena = isti id), bez dekodiranja."""
+        return self._source.sections["meal_strings"][self._row * len(_MEAL_STRING_FIELDS) + 1]
+
+    @property
+    def description(self) -> str:
+        return self._source.meal_string(self._row, 2)
+
+    @property
+    def image(self) -> Optional[str]:
+        return self._source.meal_string(self._row, 3)
+
+    @property
+    def preparationTip(self) -> Optional[str]:
+        return self._source.meal_string(self._row, 4)
+
+    @property
+    def tags(self) -> List[str]:
+        return self._source.string_list("tag", self._row)
+
+    @property
+    def components(self) -> List[MealComponent]:
+        if self._components is None:
+            self._components = self._source.meal_components(self._row)
+        return self._components
+
+    def to_meal(self) -> Meal:
+        return Meal(
+            id=self.id,
+            name=self.name,
+            description=self.description,
+            image=self.image,
+            preparationTip=self.preparationTip,
+            components=list(self.components),
+            tags=self.tags,
+            suitableFor=list(self.suitableFor),
+            mealType=self.mealType,
+        )
+
+    def __repr__(self) -> str:
+        return f"CompiledMeal(id={self.id!r}, mealType={self.mealType!r})"
+
+
+class CompiledCatalog:
+    """
+    Memory-mapped .mealbin: sekcije su memoryview-i nad mmap-om (bez
+    kopiranja), stringovi se dekodiraju na zahtjev i pamte.
+    """
+
+    def __init__(self, path: str):
+        import mmap
+
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        if bytes(view[:len(COMPILED_CATALOG_MAGIC)]) != COMPILED_CATALOG_MAGIC:
+            raise ValueError(f"Not a compiled meal catalog: {path}")
+        header_start = len(COMPILED_CATALOG_MAGIC) + 8
+        header_length = int.from_bytes(view[len(COMPILED_CATALOG_MAGIC):header_start], "little")
+        self.header = json.loads(bytes(view[header_start:header_start + header_length]).decode("utf-8"))
+        if self.header["format"] != COMPILED_CATALOG_FORMAT or self.header["byteorder"] != sys.byteorder:
+            raise ValueError(f"Incompatible compiled catalog (rebuild it): {path}")
+        self.version = self.header["catalogVersion"]
+        self.foods_version = self.header["foodsVersion"]
+        self.sections = {
+            name: view[offset:offset + length].cast(typecode)
+            for name, (offset, length, typecode) in self.header["sections"].items()
+        }
+        self._strings: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return self.header["meals"]
+
+    def string(self, string_id: int) -> Optional[str]:
+        if string_id < 0:
+            return None
+        value = self._strings.get(string_id)
+        if value is None:
+            offsets = self.sections["string_offsets"]
+            value = bytes(self.sections["string_blob"][offsets[string_id]:offsets[string_id + 1]]).decode("utf-8")
+            self._strings[string_id] = value
+        return value
+
+    def meal_string(self, row: int, field: int) -> Optional[str]:
+        return self.string(self.sections["meal_strings"][row * len(_MEAL_STRING_FIELDS) + field])
+
+    def string_list(self, kind: str, row: int) -> List[str]:
+        indptr, ids = self.sections[f"{kind}_indptr"], self.sections[f"{kind}_ids"]
+        return [self.string(ids[k]) for k in range(indptr[row], indptr[row + 1])]
+
+    def meal_components(self, row: int) -> List[MealComponent]:
+        s = self.sections
+        components = []
+        for k in range(s["indptr"][row], s["indptr"][row + 1]):
+            grams = s["grams"][k]
+            components.append(MealComponent(
+                food=self.string(s["food_names"][s["food_ids"][k]]),
+                grams=int(grams) if grams.is_integer() else grams,
+                displayName=self.string(s["display_ids"][k]),
+            ))
+        return components
+
+    def meals(self) -> List[CompiledMeal]:
+        return [
+            CompiledMeal(self, row, self.meal_string(row, 0), self.meal_string(row, 5), self.string_list("goal", row))
+            for row in range(len(self))
+        ]
+
+    def component_matrix(self, meal_ids: List[str]) -> MealComponentMatrix:
+        s = self.sections
+        registry = FoodRegistry(self.string(string_id) for string_id in s["food_names"])
+        matrix = MealComponentMatrix.from_buffers(registry, meal_ids, s["indptr"], s["food_ids"], s["grams"])
+        matrix.base_sums[self.foods_version] = s["base_sums"]
+        return matrix
+
+    def to_catalog(self) -> MealCatalog:
+        meals = self.meals()
+        components = self.component_matrix([m.id for m in meals])
+        return MealCatalog(meals, goal_notes=self.header.get("goalNotes"), version=self.version, components=components)
+
+
+def load_compiled_catalog(path: str = None) -> MealCatalog:
+    """
+    MealCatalog iz .mealbin fajla (mmap, lijeno dekodiranje stringova).
+    Bazni makroi iz fajla se koriste samo uz istu verziju baze namirnica.
+    """
+    path = path or COMPILED_CATALOG_FILE
+    with _stage("catalog_load"):
+        compiled = CompiledCatalog(path)
+        key = f"mealbin:{compiled.version}"
+        if key not in _CATALOG_MEMO:
+            _CATALOG_MEMO[key] = compiled.to_catalog()
+        return _CATALOG_MEMO[key]
+
+
+# Dijeljeni katalog za workere: tmpfs gdje postoji (stranice u RAM-u, dijele ih svi procesi)
+SHARED_CATALOG_DIR = os.environ.get("DISTRIBUTIONS_SHARED_DIR") or (
+    "/dev/shm" if os.path.isdir("/dev/shm") else None
+)
+SHARED_CATALOG_PREFIX = "distributions-"
+# .mealbin fajlovi koje je stvorio ovaj proces (jedini koje smije obrisati)
+_PUBLISHED_SHARED_CATALOGS: Set[str] = set()
+
+
+def publish_shared_catalog(catalog_path: str = None, foods_path: str = None, directory: str = None) -> str:
+    """
+    Objavi katalog kao .mealbin u dijeljenom direktoriju i vrati putanju.
+    Ime je iz hasheva kataloga i baze namirnica pa se postojeći fajl
+    ponovno koristi (i između više roditeljskih procesa). Fajlove koje je
+    ovaj proces stvorio, a kasnije zamijenio, briše remove_stale_shared_catalogs.
+    """
+    import tempfile
+
+    catalog_path = catalog_path or MEAL_COMPONENTS_FILE
+    foods_path = foods_path or FOODS_DATABASE_FILE
+    directory = directory or SHARED_CATALOG_DIR or tempfile.gettempdir()
+    name = (
+        f"{SHARED_CATALOG_PREFIX}{_file_hash(catalog_path)[:16]}-{_file_hash(foods_path)[:16]}"
+        f"-v{COMPILED_CATALOG_FORMAT}{COMPILED_CATALOG_SUFFIX}"
+    )
+    path = os.path.abspath(os.path.join(directory, name))
+    if not os.path.exists(path):
+        compile_meal_catalog(catalog_path, foods_path, path)
+        _PUBLISHED_SHARED_CATALOGS.add(path)
+    return path
+
+
+def remove_stale_shared_catalogs(current_path: str) -> int:
+    """
+    Obriši .mealbin fajlove koje je ovaj proces objavio, a current_path ih
+    je zamijenio; zove se tek kad je novi pool zagrijan. Fajlovi drugih
+    procesa (drugi plan_worker/plan_server, batch na drugoj verziji) se ne
+    diraju - trebaju ih po putanji za nove workere. Procesi koji su stari
+    fajl već mapirali zadržavaju stranice do izlaska.
+    Vraća broj obrisanih fajlova.
+    """
+    current = os.path.abspath(current_path)
+    removed = 0
+    for path in sorted(_PUBLISHED_SHARED_CATALOGS - {current}):
+        _PUBLISHED_SHARED_CATALOGS.discard(path)
+        try:
+            os.unlink(path)
+            removed += 1
+        except OSError:
+            pass
+    if removed:
+        logger.info("🧹 Removed %d stale shared catalog file(s)", removed)
+    return removed
+
+
+def prepare_shared_catalog(catalog_path: str = None, foods_path: str = None) -> str:
+    """
+    Objavi katalog (publish_shared_catalog) i učitaj ga u roditelju prije
+    pokretanja workera; workerima se prosljeđuje vraćena .mealbin putanja.
+    Uz fork workeri nasljeđuju već učitan katalog (memo pogodak, O(1)
+    start), inače ga mapiraju read-only. CSR nizovi, stringovi i bazni
+    zbrojevi makroa (MealMacroCache ih čita izravno) su u dijeljenim
+    stranicama; po workeru ostaju indeksi po id-u/tipu i matrica makroa
+    (NumPy, 4 double po jelu).
+    """
+    if catalog_path is not None and catalog_path.endswith(COMPILED_CATALOG_SUFFIX):
+        path = catalog_path
+    else:
+        path = publish_shared_catalog(catalog_path, foods_path)
+    load_compiled_catalog(path)
+    load_foods_database(foods_path or FOODS_DATABASE_FILE)
+    return path
+
+
+# ============================================
+# SPREMIŠTE KATALOGA (SQLITE)
+# ============================================
+#
+# Jela se dodaju kontinuirano pa umjesto prepisivanja cijelog
+# meal_components.json svaka promjena je jedna SQLite transakcija (WAL,
+# synchronous=FULL - prekid usred zapisa ne ostavlja pola kataloga).
+#   meals: seq (redoslijed unutar tipa), id (UNIQUE), name (indeks),
+#          meal_type, rev, deleted (tombstone), data (JSON zapis jela)
+#   meta:  storeId, revision (brojač promjena), compactedRevision, goalNotes
+# Svaka transakcija dobije novi rev pa čitač (load_catalog_store) dohvaća
+# samo retke promijenjene od zadnjeg učitavanja. compact() briše tombstoneove
+# i po potrebi izvozi meal_components.json za TS stranu.
+
+CATALOG_STORE_SUFFIX = ".sqlite"
+CATALOG_STORE_FILE = os.environ.get(
+    "DISTRIBUTIONS_CATALOG_STORE", os.path.join(DATA_DIR, "meal_catalog" + CATALOG_STORE_SUFFIX)
+)
+
+# Polja koja se spremaju u data (id i mealType su stupci)
+_STORE_RECORD_FIELDS = ("id", "name", "description", "image", "preparationTip", "components", "tags", "suitableFor")
+
+
+class MealStore:
+    """
+    Append-only spremište jela u SQLite-u s indeksima po id-u i imenu.
+
+    Zapisi su dictovi u obliku meal_components.json. Sve izmjene idu kroz
+    jednu transakciju po pozivu (add_meals dodaje cijeli batch ili ništa).
+    Svaki proces (i svaki proces nakon forka) otvara svoju konekciju.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or CATALOG_STORE_FILE
+        self._lock = threading.Lock()
+        self._db = None
+        self._pid = None
+
+    def _connection(self):
+        if self._db is None or self._pid != os.getpid():
+            import sqlite3
+
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=FULL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS meals ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL UNIQUE, name TEXT NOT NULL, "
+                "meal_type TEXT NOT NULL, rev INTEGER NOT NULL, deleted INTEGER NOT NULL DEFAULT 0, "
+                "data TEXT NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS meals_name ON meals(name)")
+            db.execute("CREATE INDEX IF NOT EXISTS meals_rev ON meals(rev)")
+            db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            db.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('storeId', ?), ('revision', '0'), "
+                "('compactedRevision', '0'), ('goalNotes', '{}')",
+                (os.urandom(8).hex(),),
+            )
+            self._db, self._pid = db, os.getpid()
+        return self._db
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT; vraća (db, rev) s novim brojem revizije."""
+        with self._lock:
+            db = self._connection()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                rev = int(self._meta(db, "revision")) + 1
+                yield db, rev
+                db.execute("UPDATE meta SET value = ? WHERE key = 'revision'", (str(rev),))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _meta(db, key: str) -> str:
+        return db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0]
+
+    @staticmethod
+    def _record(meal_type: str, record: Dict[str, Any]) -> Tuple[str, str, str]:
+        if meal_type not in MEAL_TYPES:
+            raise ValueError(f"Unknown meal type: {meal_type}")
+        if not record.get("id") or not record.get("name"):
+            raise ValueError(f"Meal record needs id and name: {record.get('id')!r}")
+        data = {k: record[k] for k in _STORE_RECORD_FIELDS if k in record}
+        return record["id"], record["name"], json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+    # ---- čitanje ----
+
+    @property
+    def revision(self) -> int:
+        with self._lock:
+            return int(self._meta(self._connection(), "revision"))
+
+    @property
+    def store_id(self) -> str:
+        with self._lock:
+            return self._meta(self._connection(), "storeId")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM meals WHERE deleted = 0").fetchone()[0]
+
+    def __contains__(self, meal_id: str) -> bool:
+        return self.get(meal_id) is not None
+
+    def get(self, meal_id: str) -> Optional[Dict[str, Any]]:
+        """Zapis jela po id-u (s mealType) ili None."""
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT meal_type, data FROM meals WHERE id = ? AND deleted = 0", (meal_id,)
+            ).fetchone()
+        return None if row is None else dict(json.loads(row[1]), mealType=row[0])
+
+    def find_by_name(self, name: str) -> List[Dict[str, Any]]:
+        """Svi zapisi s tim imenom (ime nije jedinstveno među tipovima obroka)."""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT meal_type, data FROM meals WHERE name = ? AND deleted = 0 ORDER BY seq", (name,)
+            ).fetchall()
+        return [dict(json.loads(data), mealType=meal_type) for meal_type, data in rows]
+
+    def goal_notes(self) -> Dict[str, str]:
+        with self._lock:
+            return json.loads(self._meta(self._connection(), "goalNotes"))
+
+    def changes(self, since: int = 0, batch_size: int = 1000) -> Iterator[Tuple[int, str, int, bool, Dict[str, Any]]]:
+        """
+        (seq, meal_type, rev, deleted, zapis) za retke promijenjene nakon
+        revizije since, po batch_size redaka (bez učitavanja svega u memoriju).
+        """
+        for seq, meal_type, rev, deleted, data in self._rows(since, batch_size):
+            yield seq, meal_type, rev, deleted, json.loads(data)
+
+    def _rows(self, since: int, batch_size: int = 1000) -> Iterator[Tuple[int, str, int, bool, str]]:
+        """Kao changes(), ali sa zapisom kao spremljenim JSON stringom."""
+        with self._lock:
+            cursor = self._connection().execute(
+                "SELECT seq, meal_type, rev, deleted, data FROM meals WHERE rev > ? ORDER BY seq", (since,)
+            )
+            rows = cursor.fetchmany(batch_size)
+        while rows:
+            for seq, meal_type, rev, deleted, data in rows:
+                yield seq, meal_type, rev, bool(deleted), data
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Cijeli katalog u obliku meal_components.json."""
+        data: Dict[str, Any] = {"goalNotes": self.goal_notes()}
+        data.update({meal_type: [] for meal_type in MEAL_TYPES})
+        for _, meal_type, _, deleted, record in self.changes(0):
+            if not deleted:
+                data[meal_type].append(record)
+        return data
+
+    # ---- pisanje ----
+
+    def add_meals(self, meal_type: str, records: List[Dict[str, Any]], skip_existing: bool = False) -> int:
+        """
+        Dodaj jela jednog tipa u jednoj transakciji; vraća broj dodanih.
+        Postojeći id je greška (ValueError, ništa se ne zapiše) osim uz
+        skip_existing. Ranije obrisan id se oživljava na starom mjestu.
+        """
+        prepared = [self._record(meal_type, record) for record in records]
+        added = 0
+        with self._transaction() as (db, rev):
+            for meal_id, name, data in prepared:
+                row = db.execute("SELECT deleted FROM meals WHERE id = ?", (meal_id,)).fetchone()
+                if row is not None and not row[0]:
+                    if skip_existing:
+                        continue
+                    raise ValueError(f"Meal id already exists: {meal_id}")
+                db.execute(
+                    "INSERT INTO meals (id, name, meal_type, rev, deleted, data) VALUES (?, ?, ?, ?, 0, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET name = excluded.name, meal_type = excluded.meal_type, "
+                    "rev = excluded.rev, deleted = 0, data = excluded.data",
+                    (meal_id, name, meal_type, rev, data),
+                )
+                added += 1
+        return added
+
+    def update_meal(self, meal_id: str, changes: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Promijeni polja jela (i id, npr. kod popravka duplikata) i vrati novi
+        zapis. Jelo zadržava mjesto u katalogu. KeyError ako jelo ne postoji.
+        """
+        with self._transaction() as (db, rev):
+            row = db.execute(
+                "SELECT meal_type, data FROM meals WHERE id = ? AND deleted = 0", (meal_id,)
+            ).fetchone()
+            if row is None:
+                raise KeyError(meal_id)
+            meal_type = changes.get("mealType", row[0])
+            record = dict(json.loads(row[1]), **{k: v for k, v in changes.items() if k != "mealType"})
+            new_id, name, data = self._record(meal_type, record)
+            if new_id != meal_id:
+                # Tombstone istog id-a bi blokirao UNIQUE - novi id ne smije postojati ni obrisan
+                if db.execute("SELECT 1 FROM meals WHERE id = ?", (new_id,)).fetchone() is not None:
+                    raise ValueError(f"Meal id already exists: {new_id}")
+            db.execute(
+                "UPDATE meals SET id = ?, name = ?, meal_type = ?, rev = ?, data = ? WHERE id = ?",
+                (new_id, name, meal_type, rev, data, meal_id),
+            )
+        return dict(json.loads(data), mealType=meal_type)
+
+    def delete_meal(self, meal_id: str) -> bool:
+        """Označi jelo obrisanim (tombstone); False ako ne postoji."""
+        with self._transaction() as (db, rev):
+            cursor = db.execute(
+                "UPDATE meals SET deleted = 1, rev = ? WHERE id = ? AND deleted = 0", (rev, meal_id)
+            )
+            return cursor.rowcount > 0
+
+    def set_goal_notes(self, notes: Dict[str, str]) -> None:
+        with self._transaction() as (db, rev):
+            db.execute(
+                "UPDATE meta SET value = ? WHERE key = 'goalNotes'",
+                (json.dumps(notes, ensure_ascii=False, separators=(",", ":")),),
+            )
+
+    def import_json(self, path: str = None) -> int:
+        """
+        Uvezi meal_components.json (jednokratna migracija) u jednoj
+        transakciji. Postojeći id-evi se preskaču; vraća broj dodanih jela.
+        """
+        with open(path or MEAL_COMPONENTS_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return self.import_dict(data)
+
+    def import_dict(self, data: Dict[str, Any]) -> int:
+        added = 0
+        with self._transaction() as (db, rev):
+            for meal_type in MEAL_TYPES:
+                for record in data.get(meal_type, []):
+                    meal_id, name, payload = self._record(meal_type, record)
+                    cursor = db.execute(
+                        "INSERT OR IGNORE INTO meals (id, name, meal_type, rev, deleted, data) VALUES (?, ?, ?, ?, 0, ?)",
+                        (meal_id, name, meal_type, rev, payload),
+                    )
+                    if cursor.rowcount:
+                        added += 1
+                    else:
+                        logger.warning("⚠️ Duplicate meal id in catalog: %s", meal_id)
+            if data.get("goalNotes"):
+                db.execute(
+                    "UPDATE meta SET value = ? WHERE key = 'goalNotes'",
+                    (json.dumps(data["goalNotes"], ensure_ascii=False, separators=(",", ":")),),
+                )
+        return added
+
+    def compact(self, json_path: str = None) -> int:
+        """
+        Obriši tombstoneove i sažmi bazu (VACUUM); vraća broj obrisanih
+        redaka. Uz json_path izvozi i meal_components.json (indent=2, kao
+        ručno održavan fajl). Čitači starije revizije ponovno učitaju sve.
+        """
+        with self._transaction() as (db, rev):
+            removed = db.execute("DELETE FROM meals WHERE deleted = 1").rowcount
+            db.execute("UPDATE meta SET value = ? WHERE key = 'compactedRevision'", (str(rev),))
+        with self._lock:
+            self._connection().execute("VACUUM")
+        if json_path:
+            self.export_json(json_path)
+        return removed
+
+    def export_json(self, path: str = None) -> None:
+        """Izvezi katalog u meal_components.json (indent=2, kao ručno održavan fajl), atomski."""
+        _write_json_atomic(path or MEAL_COMPONENTS_FILE, self.to_dict(), indent=2)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None and self._pid == os.getpid():
+                self._db.close()
+            self._db = None
+
+
+@dataclass
+class _StoreSnapshot:
+    """Stanje inkrementalnog čitača: jela po seq i katalog zadnje učitane revizije."""
+    store: MealStore
+    store_id: str
+    revision: int
+    meals: Dict[int, Tuple[int, Meal, bytes]]
+    catalog: MealCatalog
+
+
+# Memorija procesa: putanja spremišta -> zadnje učitano stanje
+_STORE_SNAPSHOTS: Dict[str, _StoreSnapshot] = {}
+
+
+def load_catalog_store(path: str = None) -> MealCatalog:
+    """
+    MealCatalog iz MealStore spremišta, inkrementalno: parsiraju se samo
+    retci promijenjeni od zadnjeg poziva, ostali Meal objekti se ponovno
+    koriste. Bez promjena vraća isti katalog.
+
+    version je hash sadržaja (digesti redaka po redoslijedu + goalNotes), ne
+    revizija: compact() i izmjene koje ne mijenjaju sadržaj zadržavaju isti
+    katalog i sve cacheve. Svaka stvarna izmjena jela ipak daje novu verziju
+    pa se cache kandidata, makroa i planova za katalog gradi ispočetka
+    (odabir jela ovisi o cijelom skupu kandidata) - izmjene treba grupirati
+    u batch (add_meals), a ne raditi red po red.
+    """
+    path = os.path.abspath(path or CATALOG_STORE_FILE)
+    with _stage("catalog_load"):
+        snapshot = _STORE_SNAPSHOTS.get(path)
+        store = snapshot.store if snapshot is not None else MealStore(path)
+        with store._lock:
+            db = store._connection()
+            store_id = store._meta(db, "storeId")
+            revision = int(store._meta(db, "revision"))
+            compacted = int(store._meta(db, "compactedRevision"))
+            goal_notes = store._meta(db, "goalNotes")
+        if snapshot is not None and snapshot.store_id == store_id and snapshot.revision == revision:
+            return snapshot.catalog
+
+        # Nakon compact() tombstoneovi više ne postoje - stariji snapshot se gradi ispočetka
+        if snapshot is None or snapshot.store_id != store_id or snapshot.revision < compacted:
+            meals: Dict[int, Tuple[int, Meal, bytes]] = {}
+            since = 0
+        else:
+            meals = dict(snapshot.meals)
+            since = snapshot.revision
+        type_order = {meal_type: i for i, meal_type in enumerate(MEAL_TYPES)}
+        changed = 0
+        for seq, meal_type, rev, deleted, data in store._rows(since):
+            if rev > revision:
+                # Zapisano nakon čitanja revizije - ulazi u iduće učitavanje
+                continue
+            changed += 1
+            if deleted:
+                meals.pop(seq, None)
+                continue
+            digest = hashlib.sha256(f"{meal_type}\0{data}".encode("utf-8")).digest()
+            previous = meals.get(seq)
+            if previous is not None and previous[2] == digest:
+                continue
+            meals[seq] = (type_order[meal_type], meal_from_dict(json.loads(data), meal_type), digest)
+
+        ordered = sorted((t, seq, meal, digest) for seq, (t, meal, digest) in meals.items())
+        content = hashlib.sha256(goal_notes.encode("utf-8"))
+        for _, _, _, digest in ordered:
+            content.update(digest)
+        version = content.hexdigest()
+        if snapshot is not None and snapshot.catalog.version == version:
+            catalog = snapshot.catalog
+        else:
+            catalog = MealCatalog([meal for _, _, meal, _ in ordered], goal_notes=json.loads(goal_notes), version=version)
+        _STORE_SNAPSHOTS[path] = _StoreSnapshot(store, store_id, revision, meals, catalog)
+        logger.info("📚 Catalog store r%d: %d meals (%d changed rows)", revision, len(catalog), changed)
+        return catalog
+
+
+# ============================================
+# VALIDACIJA KATALOGA
+# ============================================
+
+# Ciljevi koje generator poznaje (UserPreferences.goalType, suitableFor)
+CATALOG_GOALS = ("lose", "maintain", "gain")
+
+# Verzija pravila validacije - povećaj kad se promijene provjere (ključ disk cachea)
+CATALOG_VALIDATION_VERSION = 1
+
+
+@dataclass
+class CatalogIssue:
+    """Jedan nalaz validacije; severity je "error" ili "warning"."""
+    code: str
+    severity: str
+    meal_id: str
+    meal_type: str
+    message: str
+
+
+@dataclass
+class CatalogValidation:
+    """Rezultat validate_catalog za jedan (katalog, baza namirnica) par."""
+    catalog_version: str
+    foods_version: str
+    meals: int
+    issues: List[CatalogIssue]
+    unresolved_foods: List[str]
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    @property
+    def errors(self) -> List[CatalogIssue]:
+        return [issue for issue in self.issues if issue.severity == "error"]
+
+    def counts(self) -> Dict[str, int]:
+        """Broj nalaza po kodu."""
+        counts: Dict[str, int] = {}
+        for issue in self.issues:
+            counts[issue.code] = counts.get(issue.code, 0) + 1
+        return counts
+
+
+def _flagged_components(matrix: MealComponentMatrix, missing: set) -> Iterator[Tuple[int, int]]:
+    """(redak, pozicija) komponenti s nepoznatom namirnicom ili gramažom <= 0."""
+    if np is not None and len(matrix.grams):
+        indptr = np.asarray(matrix.indptr)
+        food_ids = np.asarray(matrix.food_ids)
+        bad = ~(np.asarray(matrix.grams) > 0)
+        if missing:
+            bad |= np.isin(food_ids, np.fromiter(missing, dtype=food_ids.dtype))
+        positions = np.flatnonzero(bad)
+        rows = np.searchsorted(indptr, positions, side="right") - 1
+        yield from zip(rows.tolist(), positions.tolist())
+        return
+    indptr, food_ids, grams = matrix.indptr, matrix.food_ids, matrix.grams
+    for row in range(len(indptr) - 1):
+        for j in range(indptr[row], indptr[row + 1]):
+            if food_ids[j] in missing or not grams[j] > 0:
+                yield row, j
+
+
+def _check_catalog(catalog: "MealCatalog", foods_db: Dict[str, Food]) -> Tuple[List[CatalogIssue], List[str]]:
+    """
+    Jedan prolaz kroz jela i CSR komponenti (O(jela + komponenti)):
+    - duplicate_id (error), duplicate_name unutar tipa obroka (warning)
+    - unresolved_food (error) - namirnica nije u foods_db pa bi dobila 5/15/5
+    - bad_grams (error) - gramaža <= 0; no_components (error)
+    - unknown_meal_type (error); category_mismatch (prefiks id-a != mealType),
+      missing_suitable_for, unknown_goal, goal_mismatch (cilj iz id-a nije
+      u suitableFor) - warning
+    Komponente se čitaju iz catalog.components pa kompilirani katalog ne
+    dekodira MealComponent objekte.
+    """
+    issues: List[CatalogIssue] = []
+    seen_ids: Dict[str, Meal] = {}
+    seen_names: Dict[Tuple[str, Any], str] = {}
+
+    def add(code: str, severity: str, meal: Meal, message: str) -> None:
+        issues.append(CatalogIssue(code, severity, meal.id, meal.mealType, message))
+
+    for meal in catalog.meals:
+        # Kompilirana jela se uspoređuju po id-u stringa - imena se dekodiraju samo za nalaze
+        name_key = (meal.mealType, meal.name_id if isinstance(meal, CompiledMeal) else meal.name)
+        first = seen_ids.get(meal.id)
+        if first is not None:
+            add("duplicate_id", "error", meal, f"id already used by '{first.name}'")
+        else:
+            seen_ids[meal.id] = meal
+        if name_key in seen_names:
+            add("duplicate_name", "warning", meal, f"name '{meal.name}' already used by {seen_names[name_key]}")
+        else:
+            seen_names[name_key] = meal.id
+
+        if meal.mealType not in MEAL_TYPES:
+            add("unknown_meal_type", "error", meal, f"unknown meal type '{meal.mealType}'")
+        parts = meal.id.split("_")
+        if parts[0] in MEAL_TYPES and parts[0] != meal.mealType:
+            add("category_mismatch", "warning", meal, f"id prefix '{parts[0]}' but listed under '{meal.mealType}'")
+        if not meal.suitableFor:
+            add("missing_suitable_for", "warning", meal, "suitableFor is empty")
+        for goal in meal.suitableFor:
+            if goal not in CATALOG_GOALS:
+                add("unknown_goal", "warning", meal, f"unknown goal '{goal}' in suitableFor")
+        if len(parts) > 2 and parts[1] in CATALOG_GOALS and parts[1] not in meal.suitableFor:
+            add("goal_mismatch", "warning", meal, f"id goal '{parts[1]}' missing from suitableFor")
+
+    # Duplikati id-a nisu u matrici (prvi pobjeđuje, kao u by_id) - već su prijavljeni
+    matrix = catalog.components
+    rows = catalog.filter_index.meals
+    names = matrix.registry.names
+    missing = {food_id for food_id, food in enumerate(names) if food not in foods_db}
+    indptr = matrix.indptr
+    for row in range(len(rows)):
+        if indptr[row] == indptr[row + 1]:
+            add("no_components", "error", rows[row], "meal has no components")
+    for row, j in _flagged_components(matrix, missing):
+        meal, food, grams = rows[row], names[matrix.food_ids[j]], matrix.grams[j]
+        if matrix.food_ids[j] in missing:
+            add("unresolved_food", "error", meal, f"food '{food}' not in foods database")
+        if not grams > 0:
+            add("bad_grams", "error", meal, f"'{food}' has grams {grams!r}")
+
+    return issues, sorted(names[food_id] for food_id in missing)
+
+
+# Koliko rezultata validacije čuvamo na disku (svaka verzija kataloga dodaje jedan)
+MAX_VALIDATION_FILES = 16
+
+
+def _prune_validation_cache(directory: str) -> None:
+    """Ostavi samo MAX_VALIDATION_FILES najnovijih validation-*.json."""
+    import glob
+
+    paths = sorted(glob.glob(os.path.join(directory, "validation-*.json")), key=os.path.getmtime, reverse=True)
+    for old_path in paths[MAX_VALIDATION_FILES:]:
+        try:
+            os.remove(old_path)
+        except OSError:
+            pass
+
+
+# Memorija procesa: (verzija kataloga, verzija baze namirnica) -> rezultat
+_VALIDATION_MEMO: Dict[Tuple[str, str], CatalogValidation] = {}
+
+
+def validate_catalog(catalog: "MealCatalog", foods_db: Dict[str, Food]) -> CatalogValidation:
+    """
+    Validiraj katalog protiv baze namirnica. Rezultat se pamti po verziji
+    kataloga (hash sadržaja) i baze namirnica - u procesu i kao JSON u
+    CACHE_DIR - pa se provjera radi jednom po verziji, ne po zahtjevu.
+    Katalozi i baze bez verzije iz sadržaja se validiraju svaki put.
+    """
+    foods_version = foods_db_version(foods_db)
+    key = (catalog.version, foods_version)
+    # Pamti se samo uz verzije iz sadržaja (id() dicta se može ponovno iskoristiti)
+    cacheable = is_content_version(catalog.version) and is_content_version(foods_version)
+    cached = _VALIDATION_MEMO.get(key) if cacheable else None
+    if cached is not None:
+        return cached
+
+    cache_path = None
+    if cacheable:
+        name = hashlib.sha256(f"{catalog.version}:{foods_version}".encode("utf-8")).hexdigest()[:32]
+        cache_path = os.path.join(CACHE_DIR, f"validation-{name}-v{CATALOG_VALIDATION_VERSION}.json")
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            result = CatalogValidation(
+                catalog_version=data["catalog_version"],
+                foods_version=data["foods_version"],
+                meals=data["meals"],
+                issues=[CatalogIssue(**issue) for issue in data["issues"]],
+                unresolved_foods=data["unresolved_foods"],
+            )
+            _VALIDATION_MEMO[key] = result
+            return result
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    with _stage("catalog_validate"):
+        issues, unresolved = _check_catalog(catalog, foods_db)
+    result = CatalogValidation(catalog.version, foods_version, len(catalog.meals), issues, unresolved)
+    if cacheable:
+        _VALIDATION_MEMO[key] = result
+    if cache_path is not None:
+        try:
+            _write_json_atomic(cache_path, asdict(result))
+            _prune_validation_cache(os.path.dirname(cache_path))
+        except OSError as e:
+            logger.warning("⚠️ Could not write validation cache: %s", e)
+
+    if result.errors:
+        logger.warning(
+            "⚠️ Catalog validation: %d errors, %d warnings %s",
+            len(result.errors), len(issues) - len(result.errors), result.counts(),
+        )
+        if unresolved:
+            logger.warning("⚠️ Unresolved foods (5/15/5 defaults): %s", ", ".join(unresolved[:20]))
+    else:
+        logger.info("✅ Catalog validation: %d meals, %d warnings %s", result.meals, len(issues), result.counts())
+    return result
+
+
+# ============================================
+# RASPODJELA KALORIJA PO OBROCIMA
+# ============================================
+
+def get_meal_distribution(num_meals: int, goal_type: str) -> Dict[str, float]:
+    """
+    Vraća distribuciju kalorija po obrocima (3, 5 ili 6 obroka).
+    Distribucija je ista za sve makroe.
+    """
+    if num_meals == 3:
+        return {
+            "breakfast": 0.35,
+            "lunch": 0.40,
+            "dinner": 0.25,
+        }
+    elif num_meals == 5:
+        if goal_type == "lose":
+            return {
+                "breakfast": 0.30,
+                "snack1": 0.10,
+                "lunch": 0.30,
+                "snack2": 0.10,
+                "dinner": 0.20,
+            }
+        elif goal_type == "gain":
+            return {
+                "breakfast": 0.25,
+                "snack1": 0.12,
+                "lunch": 0.35,
                 "snack2": 0.12,
                 "dinner": 0.16,
             }
@@ -288,11 +2532,8 @@ def filter_meals(all_meals: List[Meal], user: UserPreferences) -> List[Meal]:
 # IZRAČUNAVANJE MAKROA ZA JELO
 # ============================================
 
-def calculate_meal_macros(meal: Meal, foods_db: Dict[str, Food], scale_factor: float = 1.0) -> Dict[str, float]:
-    """
-    Izračunaj makroe za jelo (kalorije, protein, carbs, fat).
-    Koristi foods_db za nutritivne vrijednosti.
-    """
+def _meal_macro_sums(meal: Meal, foods_db: Dict[str, Food], scale_factor: float) -> Tuple[float, float, float]:
+    """Nezaokruženi zbroj (protein, carbs, fat) po komponentama."""
     total_protein = 0.0
     total_carbs = 0.0
     total_fat = 0.0
@@ -310,19 +2551,32 @@ def calculate_meal_macros(meal: Meal, foods_db: Dict[str, Food], scale_factor: f
             total_fat += food.fatsPer100g * ratio
         else:
             # Default vrijednosti ako namirnica nije pronađena
-            print(f"⚠️ Food not found in database: {food_id}")
+            MISSING_FOODS.record(food_id)
             total_protein += 5 * (grams / 100.0)
             total_carbs += 15 * (grams / 100.0)
             total_fat += 5 * (grams / 100.0)
     
-    # Zaokruži na 1 decimalu
-    total_protein = round(total_protein, 1)
+    return total_protein, total_carbs, total_fat
+
+
+def _rounded_macro_values(total_protein: float, total_carbs: float, total_fat: float) -> Tuple[int, float, float, float]:
+    """(kalorije, protein, carbs, fat) zaokruženo kao u _rounded_macros, bez dicta."""
+    total_protein = round(total_protein, 1)
     total_carbs = round(total_carbs, 1)
     total_fat = round(total_fat, 1)
     
     # UVIJEK računaj kalorije iz makroa (P×4 + UH×4 + M×9)
     total_calories = round(total_protein * 4 + total_carbs * 4 + total_fat * 9)
     
+    return total_calories, total_protein, total_carbs, total_fat
+
+
+def _rounded_macros(total_protein: float, total_carbs: float, total_fat: float) -> Dict[str, float]:
+    """Zaokruži makroe na 1 decimalu i izračunaj kalorije iz zaokruženih makroa."""
+    total_calories, total_protein, total_carbs, total_fat = _rounded_macro_values(
+        total_protein, total_carbs, total_fat
+    )
+    
     return {
         "calories": total_calories,
         "protein": total_protein,
@@ -331,15 +2585,289 @@ def calculate_meal_macros(meal: Meal, foods_db: Dict[str, Food], scale_factor: f
     }
 
 
+def calculate_meal_macros(meal: Meal, foods_db: Dict[str, Food], scale_factor: float = 1.0) -> Dict[str, float]:
+    """
+    Izračunaj makroe za jelo (kalorije, protein, carbs, fat).
+    Koristi foods_db za nutritivne vrijednosti.
+    """
+    return _rounded_macros(*_meal_macro_sums(meal, foods_db, scale_factor))
+
+
+class MealMacroCache:
+    """
+    Memoizacija makroa po jelu za jedan (katalog, baza namirnica) par.
+
+    Makroi su linearni u scale_factor pa se za svako jelo jednom pamti
+    nezaokružena baza (P, C, F pri 1.0), a skalirane vrijednosti su baza × scale.
+    Množenje se može razlikovati od zbroja po komponentama u zadnjem bitu;
+    kad je rezultat toliko blizu granice zaokruživanja da bi to promijenilo
+    round(x, 1), računa se točno kao calculate_meal_macros. Izlaz je zato
+    uvijek identičan calculate_meal_macros.
+    """
+
+    # Margina oko granice zaokruživanja (u desetinkama grama) za točan izračun
+    ROUNDING_GUARD = 1e-6
+
+    def __init__(self, catalog: "MealCatalog", foods_db: Dict[str, Food]):
+        self.version = (catalog.version, foods_db_version(foods_db))
+        self._meals = catalog.by_id
+        self._foods_db = foods_db
+        # Baze za cijeli katalog jednim CSR umnoškom (isti bitovi kao _meal_macro_sums),
+        # spljoštene po retku - bez Python objekta po jelu
+        components = catalog.components
+        self._rows = components.row_of
+        self._sums = components.flat_sums(foods_db)
+        self._base: Dict[str, Tuple[float, float, float]] = {}
+        self._base_macros: Dict[str, Dict[str, float]] = {}
+
+    def base(self, meal: Meal) -> Tuple[float, float, float]:
+        """Nezaokruženi (protein, carbs, fat) pri scale_factor=1.0."""
+        row = self._rows.get(meal.id)
+        if row is not None:
+            sums = self._sums
+            return sums[3 * row], sums[3 * row + 1], sums[3 * row + 2]
+        sums = self._base.get(meal.id)
+        if sums is None:
+            sums = _meal_macro_sums(meal, self._foods_db, 1.0)
+            self._base[meal.id] = sums
+        return sums
+
+    def macros(self, meal: Meal, scale_factor: float = 1.0) -> Dict[str, float]:
+        """Isto što i calculate_meal_macros(meal, foods_db, scale_factor)."""
+        if self._meals.get(meal.id) is not meal:
+            # Jelo nije iz ovog kataloga - nema što keširati
+            return calculate_meal_macros(meal, self._foods_db, scale_factor)
+
+        if scale_factor == 1.0:
+            cached = self._base_macros.get(meal.id)
+            if cached is None:
+                cached = _rounded_macros(*self.base(meal))
+                self._base_macros[meal.id] = cached
+            return dict(cached)
+
+        scaled = tuple(value * scale_factor for value in self.base(meal))
+        for value in scaled:
+            tenths = abs(value) * 10
+            if abs(tenths - math.floor(tenths) - 0.5) < self.ROUNDING_GUARD:
+                return calculate_meal_macros(meal, self._foods_db, scale_factor)
+        return _rounded_macros(*scaled)
+
+
+# ============================================
+# MATRICA MAKROA (VEKTORIZIRANI SCORING)
+# ============================================
+
+def foods_db_version(foods_db: Dict[str, Food]) -> str:
+    """Verzija baze namirnica; za obični dict to je identitet objekta."""
+    return getattr(foods_db, "version", "") or f"id:{id(foods_db)}"
+
+
+def is_content_version(version: str) -> bool:
+    """True za verzije iz sadržaja (hash); "id:..." tokeni vrijede samo u jednom procesu."""
+    return bool(version) and not version.startswith("id:")
+
+
+class MealMacroMatrix:
+    """
+    Matrica jela × {kcal, P, C, F} pri scale_factor=1.0.
+
+    Vrijednosti su točno ono što vraća calculate_meal_macros (zaokruženo),
+    pa vektorizirani score daje isti argmin kao score_meal petlja.
+    """
+
+    COLUMNS = ("calories", "protein", "carbs", "fat")
+
+    def __init__(self, meals: List[Meal], foods_db: Dict[str, Food], macro_cache: "MealMacroCache" = None):
+        self.meal_ids = [m.id for m in meals]
+        self.row_of = {meal_id: i for i, meal_id in enumerate(self.meal_ids)}
+        rows = []
+        for meal in meals:
+            if macro_cache is not None:
+                # Izravno iz baznih zbrojeva - bez dicta po jelu u macro_cache
+                rows.append(_rounded_macro_values(*macro_cache.base(meal)))
+            else:
+                macros = calculate_meal_macros(meal, foods_db, scale_factor=1.0)
+                rows.append([macros[c] for c in self.COLUMNS])
+        self.values = np.array(rows, dtype=np.float64).reshape(len(rows), len(self.COLUMNS))
+
+    def rows_for(self, meals: List[Meal]) -> Optional["np.ndarray"]:
+        """Indeksi redaka za listu jela; None ako neko jelo nije u matrici."""
+        row_of = self.row_of
+        try:
+            return np.fromiter((row_of[m.id] for m in meals), dtype=np.intp, count=len(meals))
+        except KeyError:
+            return None
+
+
+def score_meals_vectorized(macros: "np.ndarray", meal_targets: MealTargets) -> "np.ndarray":
+    """
+    score_meal formula (bez preference bonusa) za sve retke odjednom.
+    Redoslijed operacija je isti kao u score_meal da rezultati budu bit-identični.
+    """
+    w1, w2, w3, w4 = SCORE_WEIGHTS
+    targets = (meal_targets.calories, meal_targets.protein, meal_targets.carbs, meal_targets.fat)
+    norms = []
+    for col, target in enumerate(targets):
+        if target > 0:
+            norms.append((np.abs(macros[:, col] - target) / target) ** 2)
+        else:
+            norms.append(0)
+    kcal_norm, protein_norm, carbs_norm, fat_norm = norms
+    scores = w1 * kcal_norm + w2 * protein_norm + w3 * carbs_norm + w4 * fat_norm
+    # Svi targeti <= 0 -> skalar 0.0, proširi na vektor
+    return np.broadcast_to(scores, (len(macros),)).astype(np.float64)
+
+
+def score_cohort(
+    targets: "np.ndarray",
+    macros: "np.ndarray",
+    exclusion_mask: Optional["np.ndarray"] = None,
+    repeat_mask: Optional["np.ndarray"] = None,
+    bonus: Optional["np.ndarray"] = None,
+) -> "np.ndarray":
+    """
+    Score matrica korisnici × jela u jednoj operaciji.
+
+    Args:
+        targets: korisnici × 4 (kcal, P, C, F) - MealTargets po korisniku
+        macros: jela × 4, npr. MealMacroMatrix.values
+        exclusion_mask: korisnici × jela (bool), True = jelo isključeno (score = inf)
+        repeat_mask: korisnici × jela (bool), True = već korišteno (+REPEAT_PENALTY)
+        bonus: korisnici × jela, preference_bonus po paru (MealPreferenceIndex)
+
+    Vrijednosti su bit-identične score_meal (+ penal) za svaki par.
+    """
+    targets = np.asarray(targets, dtype=np.float64).reshape(-1, 4)
+    macros = np.asarray(macros, dtype=np.float64).reshape(-1, 4)
+    w1, w2, w3, w4 = SCORE_WEIGHTS
+    
+    norms = []
+    for col in range(4):
+        target = targets[:, col:col + 1]
+        positive = target > 0
+        safe_target = np.where(positive, target, 1.0)
+        norm = (np.abs(macros[:, col] - safe_target) / safe_target) ** 2
+        norms.append(np.where(positive, norm, 0.0))
+    kcal_norm, protein_norm, carbs_norm, fat_norm = norms
+    scores = w1 * kcal_norm + w2 * protein_norm + w3 * carbs_norm + w4 * fat_norm
+    
+    if bonus is not None:
+        scores = scores + bonus
+    if repeat_mask is not None:
+        scores = scores + np.where(repeat_mask, REPEAT_PENALTY, 0.0)
+    if exclusion_mask is not None:
+        scores = np.where(exclusion_mask, np.inf, scores)
+    return scores
+
+
+def argmin_cohort(scores: "np.ndarray") -> "np.ndarray":
+    """Indeks najboljeg jela po korisniku; -1 ako su sva jela isključena."""
+    best = np.argmin(scores, axis=1)
+    best[~np.isfinite(scores[np.arange(len(scores)), best])] = -1
+    return best
+
+
+def choose_best_meals_cohort(
+    catalog: "MealCatalog",
+    foods_db: Dict[str, Food],
+    meal_type: str,
+    meal_targets: List[MealTargets],
+    users: List[UserPreferences],
+    used_meal_ids: List[set] = None,
+    chunk_size: int = 256,
+) -> List[Optional[Meal]]:
+    """
+    choose_best_meal za više korisnika odjednom (isti slot, različiti targeti).
+
+    Kandidati su sva jela tipa; alergije/dislikes su maska isključenja, a
+    već korištena jela maska penala. Korisnici se obrađuju u chunkovima
+    od chunk_size da matrica korisnici × jela ostane ograničena.
+    Vraća isto jelo kao choose_best_meal(catalog.filter_meals(...)) po korisniku.
+    """
+    if np is None:
+        raise RuntimeError("choose_best_meals_cohort requires NumPy")
+    if used_meal_ids is None:
+        used_meal_ids = [set() for _ in users]
+    
+    meal_type = slot_meal_type(meal_type)
+    index = catalog.filter_index
+    rows = np.array(_bitset_indices(index.type_masks.get(meal_type, 0)), dtype=np.intp)
+    if len(rows) == 0:
+        return [None] * len(users)
+    type_meals = [index.meals[i] for i in rows]
+    macros = catalog.macro_matrix(foods_db).values[rows]
+    # Pozicija retka u bitsetu kataloga -> stupac u matrici ovog tipa
+    column_of = np.full(len(index.meals), -1, dtype=np.intp)
+    column_of[rows] = np.arange(len(rows))
+    column_of_id = {meal.id: i for i, meal in enumerate(type_meals)}
+    preferences = catalog.preference_index()
+    
+    chosen: List[Optional[Meal]] = []
+    for start in range(0, len(users), chunk_size):
+        chunk_users = users[start:start + chunk_size]
+        chunk_used = used_meal_ids[start:start + chunk_size]
+        targets = np.array(
+            [[t.calories, t.protein, t.carbs, t.fat] for t in meal_targets[start:start + chunk_size]],
+            dtype=np.float64,
+        )
+        shape = (len(chunk_users), len(rows))
+        exclusion = np.zeros(shape, dtype=bool)
+        repeat = np.zeros(shape, dtype=bool)
+        for u, user in enumerate(chunk_users):
+            if user.allergies or user.dislikes:
+                columns = column_of[_bitset_indices(index.exclusion_mask(user))]
+                exclusion[u, columns[columns >= 0]] = True
+            for meal_id in chunk_used[u]:
+                if meal_id in column_of_id:
+                    repeat[u, column_of_id[meal_id]] = True
+        
+        # Bonus: jedan redak po različitom skupu preferencija, korisnicima jednim indeksiranjem
+        signatures = [preference_signature(user) for user in chunk_users]
+        bonus = None
+        if any(signatures):
+            unique = sorted(set(signatures))
+            table = np.stack([
+                preferences.bonus(signature)[rows] if signature else np.zeros(len(rows))
+                for signature in unique
+            ])
+            position = {signature: i for i, signature in enumerate(unique)}
+            bonus = table[[position[signature] for signature in signatures]]
+        
+        best = argmin_cohort(score_cohort(targets, macros, exclusion, repeat, bonus))
+        chosen.extend(type_meals[i] if i >= 0 else None for i in best)
+    return chosen
+
+
 # ============================================
 # SCORING FUNKCIJA
 # ============================================
 
+# Težine (weights) - kalorije su najvažnije, zatim protein
+SCORE_WEIGHTS = (0.4, 0.3, 0.2, 0.1)  # kalorije, protein, carbs, fat
+
+# Penal za jelo koje je već korišteno u planu
+REPEAT_PENALTY = 0.5
+
+
+def preference_bonus(meal: Meal, user: UserPreferences) -> float:
+    """Bonus (negativan) za svaku komponentu koja odgovara preferiranoj namirnici."""
+    bonus = 0.0
+    if user.preferredIngredients:
+        for component in meal.components:
+            food_lower = component.food.lower()
+            for pref in user.preferredIngredients:
+                if pref.lower() in food_lower or food_lower in pref.lower():
+                    bonus -= 0.05  # Smanji score (bolje)
+                    break
+    return bonus
+
+
 def score_meal(
     meal: Meal,
     meal_targets: MealTargets,
     foods_db: Dict[str, Food],
-    user: UserPreferences
+    user: UserPreferences,
+    macro_cache: Optional[MealMacroCache] = None
 ) -> float:
     """
     Scoring funkcija za jela na temelju kcal, protein, carbs, fat weight.
@@ -353,8 +2881,13 @@ def score_meal(
     
     gdje su w1, w2, w3, w4 težine (weights).
     """
+    _count("score_meal_calls")
+    
     # Izračunaj makroe za jelo (bez skaliranja)
-    meal_macros = calculate_meal_macros(meal, foods_db, scale_factor=1.0)
+    if macro_cache is not None:
+        meal_macros = macro_cache.macros(meal, 1.0)
+    else:
+        meal_macros = calculate_meal_macros(meal, foods_db, scale_factor=1.0)
     
     # Izračunaj razlike
     kcal_diff = abs(meal_macros["calories"] - meal_targets.calories)
@@ -368,23 +2901,12 @@ def score_meal(
     carbs_norm = (carbs_diff / meal_targets.carbs) ** 2 if meal_targets.carbs > 0 else 0
     fat_norm = (fat_diff / meal_targets.fat) ** 2 if meal_targets.fat > 0 else 0
     
-    # Težine (weights) - kalorije su najvažnije, zatim protein
-    w1 = 0.4  # kalorije
-    w2 = 0.3  # protein
-    w3 = 0.2  # carbs
-    w4 = 0.1  # fat
+    w1, w2, w3, w4 = SCORE_WEIGHTS
     
     # Bonus za preferirane namirnice
-    preference_bonus = 0.0
-    if user.preferredIngredients:
-        for component in meal.components:
-            food_lower = component.food.lower()
-            for pref in user.preferredIngredients:
-                if pref.lower() in food_lower or food_lower in pref.lower():
-                    preference_bonus -= 0.05  # Smanji score (bolje)
-                    break
+    bonus = preference_bonus(meal, user)
     
-    score = w1 * kcal_norm + w2 * protein_norm + w3 * carbs_norm + w4 * fat_norm + preference_bonus
+    score = w1 * kcal_norm + w2 * protein_norm + w3 * carbs_norm + w4 * fat_norm + bonus
     
     return score
 
@@ -394,11 +2916,19 @@ def choose_best_meal(
     meal_targets: MealTargets,
     foods_db: Dict[str, Food],
     user: UserPreferences,
-    used_meal_ids: set = None
+    used_meal_ids: set = None,
+    macro_matrix: Optional[MealMacroMatrix] = None,
+    macro_cache: Optional[MealMacroCache] = None,
+    preference_index: Optional[MealPreferenceIndex] = None
 ) -> Optional[Meal]:
     """
     Vraća jelo s najmanjim score iz scoring funkcije.
     Ako je meal_id već korišten, penaliziraj ga.
+
+    S macro_matrix (vidi MealCatalog.macro_matrix) svi kandidati se boduju
+    jednim vektoriziranim izrazom; rezultat je isti kao kod petlje.
+    preference_index (istih redaka) daje bonus preferencija bez čitanja
+    komponenti jela.
     """
     if not available_meals:
         return None
@@ -406,14 +2936,31 @@ def choose_best_meal(
     if used_meal_ids is None:
         used_meal_ids = set()
     
+    _count("meals_scored", len(available_meals))
+    
+    if macro_matrix is not None:
+        rows = macro_matrix.rows_for(available_meals)
+        if rows is not None:
+            scores = score_meals_vectorized(macro_matrix.values[rows], meal_targets)
+            if user.preferredIngredients:
+                if preference_index is not None:
+                    scores = scores + preference_index.bonus(preference_signature(user))[rows]
+                else:
+                    scores = scores + np.array([preference_bonus(m, user) for m in available_meals])
+            if used_meal_ids:
+                scores = scores + np.array(
+                    [REPEAT_PENALTY if m.id in used_meal_ids else 0.0 for m in available_meals]
+                )
+            return available_meals[int(np.argmin(scores))]
+    
     best_meal = None
     best_score = float('inf')
     
     for meal in available_meals:
         # Penaliziraj već korištena jela
-        penalty = 0.5 if meal.id in used_meal_ids else 0.0
+        penalty = REPEAT_PENALTY if meal.id in used_meal_ids else 0.0
         
-        score = score_meal(meal, meal_targets, foods_db, user) + penalty
+        score = score_meal(meal, meal_targets, foods_db, user, macro_cache) + penalty
         
         if score < best_score:
             best_score = score
@@ -428,37 +2975,81 @@ def choose_best_meal(
 
 def generate_meal(
     meal_type: str,
-    available_meals: List[Meal],
+    available_meals: Union[List[Meal], MealCatalog],
     meal_targets: MealTargets,
     foods_db: Dict[str, Food],
     user: UserPreferences,
-    used_meal_ids: set = None
+    used_meal_ids: set = None,
+    exclude_meal_ids: set = None
 ) -> Optional[GeneratedMeal]:
     """
     Generira jedan obrok koristeći scoring, filtriranje i per-meal targets.
+    used_meal_ids dobivaju penalizaciju ponavljanja, exclude_meal_ids se
+    uopće ne razmatraju (npr. jelo koje je korisnik odbio).
     """
-    # Filtriraj jela po tipu obroka
-    type_meals = [m for m in available_meals if m.mealType == meal_type]
+    # Filtriraj jela po tipu obroka (katalog ima gotov indeks)
+    if isinstance(available_meals, MealCatalog):
+        type_meals = available_meals.meals_for_type(meal_type)
+    else:
+        catalog_type = slot_meal_type(meal_type)
+        type_meals = [m for m in available_meals if m.mealType == catalog_type]
     
     if not type_meals:
-        print(f"⚠️ No meals available for type: {meal_type}")
+        logger.warning("⚠️ No meals available for type: %s", meal_type)
         return None
     
     # Filtriraj jela (alergije, dislikes)
-    filtered_meals = filter_meals(type_meals, user)
+    with _stage("filter_meals"):
+        if isinstance(available_meals, MealCatalog):
+            filtered_meals = available_meals.filter_meals(meal_type, user)
+        else:
+            filtered_meals = filter_meals(type_meals, user)
+        if exclude_meal_ids:
+            filtered_meals = [m for m in filtered_meals if m.id not in exclude_meal_ids]
     
     if not filtered_meals:
-        print(f"⚠️ No meals available after filtering for type: {meal_type}")
+        logger.warning("⚠️ No meals available after filtering for type: %s", meal_type)
         return None
     
-    # Odaberi najbolje jelo
-    best_meal = choose_best_meal(filtered_meals, meal_targets, foods_db, user, used_meal_ids)
+    # Odaberi najbolje jelo (vektorizirano ako imamo katalog i NumPy)
+    if isinstance(available_meals, MealCatalog):
+        macro_cache = available_meals.macro_cache(foods_db)
+        macro_matrix = available_meals.macro_matrix(foods_db)
+        preference_index = available_meals.preference_index()
+    else:
+        macro_cache = None
+        macro_matrix = None
+        preference_index = None
+    with _stage("choose_best_meal"):
+        best_meal = choose_best_meal(
+            filtered_meals, meal_targets, foods_db, user, used_meal_ids, macro_matrix, macro_cache,
+            preference_index
+        )
     
     if not best_meal:
         return None
     
+    with _stage("scale_meal"):
+        return scale_meal(best_meal, meal_targets, foods_db, macro_cache)
+
+
+def scale_meal(
+    best_meal: Meal,
+    meal_targets: MealTargets,
+    foods_db: Dict[str, Food],
+    macro_cache: Optional[MealMacroCache] = None
+) -> GeneratedMeal:
+    """
+    Skaliraj odabrano jelo prema kcal targetu obroka (0.7x - 1.5x)
+    i složi GeneratedMeal s gramažama zaokruženim na 5 g.
+    """
+    def meal_macros_at(scale: float) -> Dict[str, float]:
+        if macro_cache is not None:
+            return macro_cache.macros(best_meal, scale)
+        return calculate_meal_macros(best_meal, foods_db, scale_factor=scale)
+    
     # Skaliraj jelo prema targetu
-    meal_macros = calculate_meal_macros(best_meal, foods_db, scale_factor=1.0)
+    meal_macros = meal_macros_at(1.0)
     
     # Izračunaj faktor skaliranja
     if meal_macros["calories"] > 0:
@@ -469,32 +3060,24 @@ def generate_meal(
         scale_factor = 1.0
     
     # Izračunaj finalne makroe
-    final_macros = calculate_meal_macros(best_meal, foods_db, scale_factor=scale_factor)
+    final_macros = meal_macros_at(scale_factor)
     
-    # Kreiraj komponente s novim gramažama
+    # Kreiraj komponente s novim gramažama (makroi 0 ako namirnica nije u bazi)
     scaled_components = []
     for component in best_meal.components:
-        scaled_components.append({
-            "name": component.displayName,
-            "food": component.food,
-            "grams": round(component.grams * scale_factor / 5) * 5,  # Zaokruži na 5g
-            "calories": 0,  # Bit će izračunato kasnije
-            "protein": 0,
-            "carbs": 0,
-            "fat": 0,
-        })
-    
-    # Izračunaj makroe za svaku komponentu
-    for comp in scaled_components:
-        food_id = comp["food"]
-        grams = comp["grams"]
-        if food_id in foods_db:
-            food = foods_db[food_id]
-            ratio = grams / 100.0
-            comp["protein"] = round(food.proteinPer100g * ratio, 1)
-            comp["carbs"] = round(food.carbsPer100g * ratio, 1)
-            comp["fat"] = round(food.fatsPer100g * ratio, 1)
-            comp["calories"] = round(comp["protein"] * 4 + comp["carbs"] * 4 + comp["fat"] * 9)
+        comp = ScaledComponent(
+            name=component.displayName,
+            food=component.food,
+            grams=round(component.grams * scale_factor / 5) * 5,  # Zaokruži na 5g
+        )
+        food = foods_db.get(comp.food)
+        if food is not None:
+            ratio = comp.grams / 100.0
+            comp.protein = round(food.proteinPer100g * ratio, 1)
+            comp.carbs = round(food.carbsPer100g * ratio, 1)
+            comp.fat = round(food.fatsPer100g * ratio, 1)
+            comp.calories = round(comp.protein * 4 + comp.carbs * 4 + comp.fat * 9)
+        scaled_components.append(comp)
     
     return GeneratedMeal(
         id=best_meal.id,
@@ -516,10 +3099,11 @@ def generate_day_plan(
     day_name: str,
     daily_targets: DailyTargets,
     meal_distribution: Dict[str, float],
-    available_meals: List[Meal],
+    available_meals: Union[List[Meal], MealCatalog],
     foods_db: Dict[str, Food],
     user: UserPreferences,
-    used_meal_ids: set = None
+    used_meal_ids: set = None,
+    exclude_meal_ids: set = None
 ) -> DailyPlan:
     """
     Generira dnevni plan s X obroka i vraća totale.
@@ -541,14 +3125,15 @@ def generate_day_plan(
             meal_targets,
             foods_db,
             user,
-            used_meal_ids
+            used_meal_ids,
+            exclude_meal_ids
         )
         
         if generated_meal:
             meals[meal_type] = generated_meal
             used_meal_ids.add(generated_meal.id)
         else:
-            print(f"⚠️ Failed to generate meal for {meal_type}")
+            logger.warning("⚠️ Failed to generate meal for %s", meal_type)
     
     # Izračunaj dnevne totale
     daily_totals = {
@@ -570,13 +3155,16 @@ def generate_day_plan(
     daily_totals["carbs"] = round(daily_totals["carbs"], 1)
     daily_totals["fat"] = round(daily_totals["fat"], 1)
     
-    # LOGGING za debug
-    print(f"\n📅 {day_name} ({date}):")
-    print(f"   🎯 Target: {daily_targets.calories:.0f} kcal, P: {daily_targets.protein:.1f}g, C: {daily_targets.carbs:.1f}g, F: {daily_targets.fat:.1f}g")
-    print(f"   ✅ Actual: {daily_totals['calories']:.0f} kcal, P: {daily_totals['protein']:.1f}g, C: {daily_totals['carbs']:.1f}g, F: {daily_totals['fat']:.1f}g")
-    diff_cal = daily_totals["calories"] - daily_targets.calories
-    diff_pct = (diff_cal / daily_targets.calories * 100) if daily_targets.calories > 0 else 0
-    print(f"   📊 Difference: {diff_cal:+.0f} kcal ({diff_pct:+.1f}%)")
+    # LOGGING za debug (formatira se samo ako je INFO uključen)
+    if logger.isEnabledFor(logging.INFO):
+        diff_cal = daily_totals["calories"] - daily_targets.calories
+        diff_pct = (diff_cal / daily_targets.calories * 100) if daily_targets.calories > 0 else 0
+        logger.info(
+            f"\n📅 {day_name} ({date}):\n"
+            f"   🎯 Target: {daily_targets.calories:.0f} kcal, P: {daily_targets.protein:.1f}g, C: {daily_targets.carbs:.1f}g, F: {daily_targets.fat:.1f}g\n"
+            f"   ✅ Actual: {daily_totals['calories']:.0f} kcal, P: {daily_totals['protein']:.1f}g, C: {daily_totals['carbs']:.1f}g, F: {daily_totals['fat']:.1f}g\n"
+            f"   📊 Difference: {diff_cal:+.0f} kcal ({diff_pct:+.1f}%)"
+        )
     
     return DailyPlan(
         date=date,
@@ -585,176 +3173,693 @@ def generate_day_plan(
         dailyTotals=daily_totals,
     )
 
+# Tolerancije u postocima, NE fiksnih 10 kcal
+CAL_TOL = 0.03  # ±3% kalorija
+MACRO_TOL = 0.08  # ±8% makroa
+
+# Granice faktora skaliranja u solver modu (relativno na trenutnu gramažu)
+SOLVER_SCALE_BOUNDS = (0.5, 2.0)
+
+# Regularizacija prema scale=1.0 (bez velikih skokova kad je sustav poddeterminiran)
+SOLVER_REGULARIZATION = 1e-3
+
+
+@dataclass
+class TweakReport:
+    """Rezultat prilagodbe dnevnog plana"""
+    mode: str  # iterative, solver
+    iterations: int
+    converged: bool
+    deviation: Dict[str, float]  # relativno odstupanje od targeta (+/-)
+
+
+def _sum_meal_totals(meals: List[GeneratedMeal]) -> Dict[str, float]:
+    totals = {
+        "calories": 0.0,
+        "protein": 0.0,
+        "carbs": 0.0,
+        "fat": 0.0,
+    }
+    for meal in meals:
+        totals["calories"] += meal.totals["calories"]
+        totals["protein"] += meal.totals["protein"]
+        totals["carbs"] += meal.totals["carbs"]
+        totals["fat"] += meal.totals["fat"]
+    return totals
+
+
+def _day_deviation(totals: Dict[str, float], daily_targets: DailyTargets) -> Dict[str, float]:
+    """Relativno odstupanje dnevnih totala od targeta (0 ako target nije zadan)."""
+    deviation = {}
+    for key in ("calories", "protein", "carbs", "fat"):
+        target = getattr(daily_targets, key)
+        deviation[key] = (totals[key] - target) / target if target > 0 else 0.0
+    return deviation
+
+
+def _within_tolerance(deviation: Dict[str, float]) -> bool:
+    return (
+        abs(deviation["calories"]) <= CAL_TOL
+        and max(abs(deviation["protein"]), abs(deviation["carbs"]), abs(deviation["fat"])) <= MACRO_TOL
+    )
+
+
+def _scale_component(comp: ScaledComponent, scale_factor: float, foods_db: Dict[str, Food]) -> None:
+    """Skaliraj gramažu komponente (zaokruženo na 5 g) i ponovno izračunaj makroe."""
+    comp.grams = round(comp.grams * scale_factor / 5) * 5
+
+    food = foods_db.get(comp.food)
+    if food is not None:
+        ratio = comp.grams / 100.0
+        comp.protein = round(food.proteinPer100g * ratio, 1)
+        comp.carbs = round(food.carbsPer100g * ratio, 1)
+        comp.fat = round(food.fatsPer100g * ratio, 1)
+        comp.calories = round(
+            comp.protein * 4 + comp.carbs * 4 + comp.fat * 9
+        )
+
+
+def _update_meal_totals(meal: GeneratedMeal) -> None:
+    meal.totals = {
+        "calories": sum(c.calories for c in meal.components),
+        "protein": sum(c.protein for c in meal.components),
+        "carbs": sum(c.carbs for c in meal.components),
+        "fat": sum(c.fat for c in meal.components),
+    }
+
+
+def _tweak_iterative(
+    day_plan: DailyPlan,
+    daily_targets: DailyTargets,
+    foods_db: Dict[str, Food],
+    max_iterations: int,
+) -> int:
+    """Iterativna prilagodba (max ±10% po iteraciji). Vraća broj iteracija skaliranja."""
+    for iteration in range(max_iterations):
+        # 1) Uvijek izračunaj trenutne totale iz obroka (da nema nakupljene greške)
+        current_totals = _sum_meal_totals(day_plan.meals.values())
+
+        # 2) Izračunaj odstupanja
+        if daily_targets.calories <= 0:
+            return iteration
+
+        cal_diff_pct = abs(current_totals["calories"] - daily_targets.calories) / daily_targets.calories
+        protein_dev = (
+            abs(current_totals["protein"] - daily_targets.protein) / daily_targets.protein
+            if daily_targets.protein > 0 else 0
+        )
+        carbs_dev = (
+            abs(current_totals["carbs"] - daily_targets.carbs) / daily_targets.carbs
+            if daily_targets.carbs > 0 else 0
+        )
+        fat_dev = (
+            abs(current_totals["fat"] - daily_targets.fat) / daily_targets.fat
+            if daily_targets.fat > 0 else 0
+        )
+        max_macro_dev = max(protein_dev, carbs_dev, fat_dev)
+
+        # 3) Ako smo dovoljno blizu – gotovo
+        if cal_diff_pct <= CAL_TOL and max_macro_dev <= MACRO_TOL:
+            if iteration > 0:
+                logger.debug(" ✅ Plan adjusted after %d iterations", iteration)
+            return iteration
+
+        # 4) Izračunaj scale faktor:
+        # kalorije su baza, protein blago utječe (da ne pobjegne previsoko ili prenisko)
+        cal_factor = (
+            daily_targets.calories / current_totals["calories"]
+            if current_totals["calories"] > 0 else 1.0
+        )
+        protein_factor = (
+            daily_targets.protein / current_totals["protein"]
+            if current_totals["protein"] > 0 else 1.0
+        )
+
+        # kombinirani faktor – fokus na kcal, ali 30% “korigira” protein
+        scale_factor = 0.7 * cal_factor + 0.3 * protein_factor
+
+        # 5) Ograniči scale faktor da nema ludih skokova
+        # (svaka iteracija max ±10%)
+        scale_factor = max(0.9, min(1.1, scale_factor))
+
+        # 6) Skaliraj sve obroke i ponovno izračunaj makroe
+        for meal in day_plan.meals.values():
+            for comp in meal.components:
+                _scale_component(comp, scale_factor, foods_db)
+
+            # ažuriraj totals za obrok
+            _update_meal_totals(meal)
+
+        # nakon skaliranja će se u idućoj iteraciji ponovno izračunati current_totals
+
+    return max_iterations
+
+
+def _solve_linear_system(a: List[List[float]], b: List[float]) -> List[float]:
+    """Gaussova eliminacija s djelomičnim pivotiranjem (mali, simetrični sustavi)."""
+    n = len(b)
+    m = [row[:] + [b[i]] for i, row in enumerate(a)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(m[r][col]))
+        if abs(m[pivot][col]) < 1e-12:
+            raise ValueError("singular system")
+        m[col], m[pivot] = m[pivot], m[col]
+        for r in range(col + 1, n):
+            f = m[r][col] / m[col][col]
+            if f:
+                for c in range(col, n + 1):
+                    m[r][c] -= f * m[col][c]
+    x = [0.0] * n
+    for r in range(n - 1, -1, -1):
+        x[r] = (m[r][n] - sum(m[r][c] * x[c] for c in range(r + 1, n))) / m[r][r]
+    return x
+
+
+def solve_portion_scales(
+    contributions: List[Tuple[float, float, float, float]],
+    daily_targets: DailyTargets,
+    bounds: Tuple[float, float] = SOLVER_SCALE_BOUNDS,
+    regularization: float = SOLVER_REGULARIZATION,
+) -> Tuple[List[float], int]:
+    """
+    Ograničeni least-squares za faktore skaliranja.
+
+    contributions[j] = (kcal, P, C, F) grupe j (obrok ili komponenta).
+    Minimizira  Σ_k w_k (Σ_j s_j a_jk / T_k - 1)^2 + λ Σ_j (s_j - 1)^2
+    uz bounds[0] <= s_j <= bounds[1]. Težine su 1/tolerancija^2 (kcal ±3%,
+    makroi ±8%) normalizirane na kcal. Granice se rješavaju active-setom:
+    varijable izvan granica se fiksiraju i sustav se rješava ponovno.
+
+    Returns:
+        (faktori po grupi, broj rješavanja sustava)
+    """
+    targets = (daily_targets.calories, daily_targets.protein, daily_targets.carbs, daily_targets.fat)
+    tol_weights = (1.0, (CAL_TOL / MACRO_TOL) ** 2, (CAL_TOL / MACRO_TOL) ** 2, (CAL_TOL / MACRO_TOL) ** 2)
+    rows = [(k, tol_weights[k], targets[k]) for k in range(4) if targets[k] > 0]
+
+    n = len(contributions)
+    low, high = bounds
+    scales = [1.0] * n
+    fixed: Dict[int, float] = {}
+    solves = 0
+
+    while len(fixed) < n:
+        free = [j for j in range(n) if j not in fixed]
+        # Normalne jednadžbe za slobodne varijable: (RᵀWR + λI) s = RᵀW(1 - R_fix s_fix) + λ1
+        ata = [[regularization if i == j else 0.0 for j in range(len(free))] for i in range(len(free))]
+        atb = [regularization] * len(free)
+        for k, weight, target in rows:
+            r = [contributions[j][k] / target for j in range(n)]
+            residual = 1.0 - sum(r[j] * s for j, s in fixed.items())
+            for i, ji in enumerate(free):
+                atb[i] += weight * r[ji] * residual
+                for jj, jf in enumerate(free):
+                    ata[i][jj] += weight * r[ji] * r[jf]
+        solves += 1
+        try:
+            solution = _solve_linear_system(ata, atb)
+        except ValueError:
+            solution = [1.0] * len(free)
+
+        violated = False
+        for i, j in enumerate(free):
+            if solution[i] < low or solution[i] > high:
+                fixed[j] = min(high, max(low, solution[i]))
+                violated = True
+            else:
+                scales[j] = solution[i]
+        if not violated:
+            break
+
+    for j, s in fixed.items():
+        scales[j] = s
+    return scales, solves
+
+
+def _tweak_solver(
+    day_plan: DailyPlan,
+    daily_targets: DailyTargets,
+    foods_db: Dict[str, Food],
+    granularity: str,
+) -> int:
+    """Skaliraj obroke (ili komponente) faktorima iz solve_portion_scales, 5 g zaokruživanje jednom."""
+    if daily_targets.calories <= 0:
+        return 0
+
+    groups: List[Tuple[GeneratedMeal, List[ScaledComponent]]] = []
+    contributions = []
+    for meal in day_plan.meals.values():
+        if granularity == "component":
+            for comp in meal.components:
+                groups.append((meal, [comp]))
+                contributions.append((comp.calories, comp.protein, comp.carbs, comp.fat))
+        else:
+            groups.append((meal, meal.components))
+            contributions.append(
+                (meal.totals["calories"], meal.totals["protein"], meal.totals["carbs"], meal.totals["fat"])
+            )
+
+    if not groups or _within_tolerance(_day_deviation(_sum_meal_totals(day_plan.meals.values()), daily_targets)):
+        return 0
+
+    scales, solves = solve_portion_scales(contributions, daily_targets)
+    for (meal, components), scale_factor in zip(groups, scales):
+        for comp in components:
+            _scale_component(comp, scale_factor, foods_db)
+    for meal in day_plan.meals.values():
+        _update_meal_totals(meal)
+    return solves
+
+
+def tweak_day_plan_with_report(
+    day_plan: DailyPlan,
+    daily_targets: DailyTargets,
+    foods_db: Dict[str, Food],
+    max_iterations: int = 40,
+    mode: str = "iterative",
+    granularity: str = "meal",
+) -> Tuple[DailyPlan, TweakReport]:
+    """
+    Kao tweak_day_plan, uz izvještaj (broj iteracija, konvergencija, odstupanje).
+
+    mode:
+    - "iterative": postojeća petlja, svaka iteracija max ±10% i 5 g zaokruživanje
+    - "solver": faktori skaliranja direktno iz ograničenog least-squares
+      problema prema dnevnim kcal/P/C/F, 5 g zaokruživanje samo jednom;
+      granularity "meal" (faktor po obroku) ili "component" (po namirnici)
+    """
+    with _stage("tweak_day_plan"):
+        if mode == "solver":
+            iterations = _tweak_solver(day_plan, daily_targets, foods_db, granularity)
+        elif mode == "iterative":
+            iterations = _tweak_iterative(day_plan, daily_targets, foods_db, max_iterations)
+        else:
+            raise ValueError(f"Unknown tweak mode: {mode}")
+    _count("tweak_iterations", iterations)
+
+    # Na kraju upiši finalne dnevne totale u day_plan
+    final_totals = _sum_meal_totals(day_plan.meals.values())
+
+    day_plan.dailyTotals = {
+        "calories": round(final_totals["calories"]),
+        "protein": round(final_totals["protein"], 1),
+        "carbs": round(final_totals["carbs"], 1),
+        "fat": round(final_totals["fat"], 1),
+    }
+
+    deviation = _day_deviation(final_totals, daily_targets)
+    report = TweakReport(
+        mode=mode,
+        iterations=iterations,
+        converged=_within_tolerance(deviation),
+        deviation={k: round(v, 4) for k, v in deviation.items()},
+    )
+    return day_plan, report
+
+
 def tweak_day_plan(
-day_plan: DailyPlan,
-daily_targets: DailyTargets,
-foods_db: Dict[str, Food],
-max_iterations: int = 40,
+    day_plan: DailyPlan,
+    daily_targets: DailyTargets,
+    foods_db: Dict[str, Food],
+    max_iterations: int = 40,
+    mode: str = "iterative",
 ) -> DailyPlan:
-"""
-Fino prilagodi dnevni plan prema cilju iz kalkulatora.
+    """
+    Fino prilagodi dnevni plan prema cilju iz kalkulatora.
 
-Cilj:
-- kalorije unutar ±3% od targeta
-- makroi (P/C/F) unutar ±8% od targeta
-- bez velikih skokova (stabilan scale faktor)
-"""
+    Cilj:
+    - kalorije unutar ±3% od targeta
+    - makroi (P/C/F) unutar ±8% od targeta
+    - bez velikih skokova (stabilan scale faktor)
 
-# Tolerancije u postocima, NE fiksnih 10 kcal
-CAL_TOL = 0.03 # ±3% kalorija
-MACRO_TOL = 0.08 # ±8% makroa
-
-for iteration in range(max_iterations):
-# 1) Uvijek izračunaj trenutne totale iz obroka (da nema nakupljene greške)
-current_totals = {
-"calories": 0.0,
-"protein": 0.0,
-"carbs": 0.0,
-"fat": 0.0,
-}
-for meal in day_plan.meals.values():
-current_totals["calories"] += meal.totals["calories"]
-current_totals["protein"] += meal.totals["protein"]
-current_totals["carbs"] += meal.totals["carbs"]
-current_totals["fat"] += meal.totals["fat"]
-
-# 2) Izračunaj odstupanja
-if daily_targets.calories <= 0:
-break
-
-cal_diff_pct = abs(current_totals["calories"] - daily_targets.calories) / daily_targets.calories
-protein_dev = (
-abs(current_totals["protein"] - daily_targets.protein) / daily_targets.protein
-if daily_targets.protein > 0 else 0
-)
-carbs_dev = (
-abs(current_totals["carbs"] - daily_targets.carbs) / daily_targets.carbs
-if daily_targets.carbs > 0 else 0
-)
-fat_dev = (
-abs(current_totals["fat"] - daily_targets.fat) / daily_targets.fat
-if daily_targets.fat > 0 else 0
-)
-max_macro_dev = max(protein_dev, carbs_dev, fat_dev)
-
-# 3) Ako smo dovoljno blizu – gotovo
-if cal_diff_pct <= CAL_TOL and max_macro_dev <= MACRO_TOL:
-if iteration > 0:
-print(f" ✅ Plan adjusted after {iteration} iterations")
-break
-
-# 4) Izračunaj scale faktor:
-# kalorije su baza, protein blago utječe (da ne pobjegne previsoko ili prenisko)
-cal_factor = (
-daily_targets.calories / current_totals["calories"]
-if current_totals["calories"] > 0 else 1.0
-)
-protein_factor = (
-daily_targets.protein / current_totals["protein"]
-if current_totals["protein"] > 0 else 1.0
-)
+    mode="solver" koristi solve_portion_scales umjesto iterativne petlje
+    (vidi tweak_day_plan_with_report).
+    """
+    day_plan, _ = tweak_day_plan_with_report(day_plan, daily_targets, foods_db, max_iterations, mode)
+    return day_plan
+
+# ============================================
+# CACHE TJEDNIH PLANOVA
+# ============================================
+
+def plan_inputs_canonical(daily_targets: DailyTargets, user: UserPreferences) -> Dict[str, Any]:
+    """
+    Kanonski oblik ciljeva i preferencija (za plan_cache_key i spajanje
+    zahtjeva u plan_server). Liste preferencija se koriste kao skupovi pa
+    se sortiraju; brojevi se svode na float (2000 == 2000.0).
+    """
+    return {
+        "targets": {k: float(v) for k, v in asdict(daily_targets).items()},
+        "allergies": sorted(set(user.allergies or [])),
+        "dislikes": sorted(set(user.dislikes or [])),
+        "preferredIngredients": sorted(set(user.preferredIngredients or [])),
+        "desiredMealsPerDay": int(user.desiredMealsPerDay),
+        "goalType": user.goalType,
+    }
+
+
+def plan_cache_key(
+    daily_targets: DailyTargets,
+    user: UserPreferences,
+    week_start_date: str,
+    versions: str,
+    tweak_mode: str = "iterative"
+) -> str:
+    """
+    Kanonski SHA-256 ulaza tjednog plana (plan_inputs_canonical + datum,
+    tweakMode i verzije). versions = verzija kataloga + verzija baze namirnica.
+    """
+    canonical = {
+        **plan_inputs_canonical(daily_targets, user),
+        "weekStart": week_start_date,
+        "tweakMode": tweak_mode,
+        "versions": versions,
+    }
+    payload = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PlanCache:
+    """
+    Cache gotovih tjednih planova po plan_cache_key.
+
+    - memorija: LRU do max_entries (plan se čuva kao JSON, svaki get vraća
+      nove objekte pa pozivatelj smije mijenjati plan)
+    - disk (opcionalno): SQLite plans.sqlite u disk_dir, do max_disk_entries
+      (izbacuju se najdulje nekorišteni); dijele ga svi procesi. Koristi se
+      samo uz persist=True, tj. kad su verzije hash sadržaja - "id:..."
+      tokeni vrijede samo u jednom procesu
+    - zapisi stariji od ttl sekundi se ne vraćaju
+    - promjena verzije kataloga/baze namirnica prazni memoriju; na disku
+      zapisi drugih verzija ostaju (drugi procesi) i izlaze kroz ttl/LRU
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl: float = 24 * 3600,
+        disk_dir: str = None,
+        max_disk_entries: int = 10000,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.disk_dir = disk_dir
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._versions: Optional[str] = None
+        self._lock = threading.Lock()
+        self._db = self._open_disk(disk_dir) if disk_dir else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    @staticmethod
+    def _open_disk(disk_dir: str):
+        import sqlite3
+
+        os.makedirs(disk_dir, exist_ok=True)
+        db = sqlite3.connect(
+            os.path.join(disk_dir, "plans.sqlite"), timeout=10, check_same_thread=False, isolation_level=None
+        )
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS plans ("
+            "key TEXT PRIMARY KEY, versions TEXT NOT NULL, created REAL NOT NULL, "
+            "accessed REAL NOT NULL, payload TEXT NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS plans_accessed ON plans(accessed)")
+        return db
+
+    def _check_versions(self, versions: str, persist: bool) -> None:
+        if versions == self._versions:
+            return
+        self._memory.clear()
+        if self._db is not None and persist:
+            # Disk dijele procesi s drugim verzijama (reload, drugi katalog) - verzija
+            # je dio ključa pa se stari zapisi ne brišu, samo oni istekli (ttl)
+            self._db.execute("DELETE FROM plans WHERE created < ?", (time.time() - self.ttl,))
+        self._versions = versions
+
+    def _remember(self, key: str, created: float, payload: str) -> None:
+        self._memory[key] = (created, payload)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: str, versions: str, persist: bool = True) -> Optional[List[DailyPlan]]:
+        now = time.time()
+        payload = None
+        with self._lock:
+            self._check_versions(versions, persist)
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[0] > self.ttl:
+                    del self._memory[key]
+                    self.expired += 1
+                else:
+                    self._memory.move_to_end(key)
+                    payload = entry[1]
+            if payload is None and self._db is not None and persist:
+                row = self._db.execute("SELECT created, payload FROM plans WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    if now - row[0] > self.ttl:
+                        self._db.execute("DELETE FROM plans WHERE key = ?", (key,))
+                        self.expired += 1
+                    else:
+                        self._db.execute("UPDATE plans SET accessed = ? WHERE key = ?", (now, key))
+                        self._remember(key, row[0], row[1])
+                        self.disk_hits += 1
+                        payload = row[1]
+            if payload is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return [daily_plan_from_dict(d) for d in json.loads(payload)]
+
+    def put(self, key: str, versions: str, plan: List[DailyPlan], persist: bool = True) -> None:
+        payload = json.dumps([daily_plan_to_dict(d) for d in plan], ensure_ascii=False, separators=(",", ":"))
+        now = time.time()
+        with self._lock:
+            self._check_versions(versions, persist)
+            self._remember(key, now, payload)
+            if self._db is not None and persist:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO plans (key, versions, created, accessed, payload) VALUES (?, ?, ?, ?, ?)",
+                    (key, versions, now, now, payload),
+                )
+                overflow = self._db.execute("SELECT COUNT(*) FROM plans").fetchone()[0] - self.max_disk_entries
+                if overflow > 0:
+                    self._db.execute(
+                        "DELETE FROM plans WHERE key IN (SELECT key FROM plans ORDER BY accessed LIMIT ?)",
+                        (overflow,),
+                    )
+                    self.evictions += overflow
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            disk_entries = self._db.execute("SELECT COUNT(*) FROM plans").fetchone()[0] if self._db is not None else 0
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM plans")
 
-# kombinirani faktor – fokus na kcal, ali 30% “korigira” protein
-scale_factor = 0.7 * cal_factor + 0.3 * protein_factor
-
-# 5) Ograniči scale faktor da nema ludih skokova
-# (svaka iteracija max ±10%)
-scale_factor = max(0.9, min(1.1, scale_factor))
-
-# 6) Skaliraj sve obroke i ponovno izračunaj makroe
-for meal in day_plan.meals.values():
-for comp in meal.components:
-# skaliraj gramažu
-comp["grams"] = round(comp["grams"] * scale_factor / 5) * 5
-
-# ponovno izračunaj makroe za komponentu
-food_id = comp["food"]
-grams = comp["grams"]
-if food_id in foods_db:
-food = foods_db[food_id]
-ratio = grams / 100.0
-comp["protein"] = round(food.proteinPer100g * ratio, 1)
-comp["carbs"] = round(food.carbsPer100g * ratio, 1)
-comp["fat"] = round(food.fatsPer100g * ratio, 1)
-comp["calories"] = round(
-comp["protein"] * 4 + comp["carbs"] * 4 + comp["fat"] * 9
-)
 
-# ažuriraj totals za obrok
-meal.totals = {
-"calories": sum(c["calories"] for c in meal.components),
-"protein": sum(c["protein"] for c in meal.components),
-"carbs": sum(c["carbs"] for c in meal.components),
-"fat": sum(c["fat"] for c in meal.components),
-}
-
-# nakon skaliranja će se u idućoj iteraciji ponovno izračunati current_totals
-
-# 7) Na kraju upiši finalne dnevne totale u day_plan
-final_totals = {
-"calories": 0.0,
-"protein": 0.0,
-"carbs": 0.0,
-"fat": 0.0,
-}
-for meal in day_plan.meals.values():
-final_totals["calories"] += meal.totals["calories"]
-final_totals["protein"] += meal.totals["protein"]
-final_totals["carbs"] += meal.totals["carbs"]
-final_totals["fat"] += meal.totals["fat"]
-
-day_plan.dailyTotals = {
-"calories": round(final_totals["calories"]),
-"protein": round(final_totals["protein"], 1),
-"carbs": round(final_totals["carbs"], 1),
-"fat": round(final_totals["fat"], 1),
-}
-
-return day_plan
+def _plan_cache_from_env() -> Optional[PlanCache]:
+    disk_dir = os.environ.get("DISTRIBUTIONS_PLAN_CACHE_DIR")
+    if disk_dir or os.environ.get("DISTRIBUTIONS_PLAN_CACHE") == "1":
+        return PlanCache(disk_dir=disk_dir or None)
+    return None
+
+
+# Default cache za generate_weekly_plan (None = isključen). Uključuje se s
+# DISTRIBUTIONS_PLAN_CACHE=1 (memorija) ili DISTRIBUTIONS_PLAN_CACHE_DIR (+ disk).
+PLAN_CACHE: Optional[PlanCache] = _plan_cache_from_env()
+
+
+def configure_plan_cache(enabled: bool = True, **options) -> Optional[PlanCache]:
+    """Uključi (novi PlanCache s options) ili isključi default cache planova."""
+    global PLAN_CACHE
+    PLAN_CACHE = PlanCache(**options) if enabled else None
+    return PLAN_CACHE
+
 
 # ============================================
 # GENERIRANJE TJEDNOG PLANA
 # ============================================
 
+DAY_NAMES = ("Ponedjeljak", "Utorak", "Srijeda", "Četvrtak", "Petak", "Subota", "Nedjelja")
+
+
+def next_week_start() -> str:
+    """Datum idućeg ponedjeljka (YYYY-MM-DD); ako je danas ponedjeljak, onaj za tjedan dana."""
+    from datetime import datetime, timedelta
+    
+    today = datetime.now()
+    day_of_week = today.weekday()  # 0 = Monday
+    days_to_monday = (7 - day_of_week) % 7
+    if days_to_monday == 0:
+        days_to_monday = 7
+    return (today + timedelta(days=days_to_monday)).strftime("%Y-%m-%d")
+
+
 def generate_weekly_plan(
     daily_targets: DailyTargets,
-    available_meals: List[Meal],
+    available_meals: Union[List[Meal], MealCatalog],
     foods_db: Dict[str, Food],
     user: UserPreferences,
-    week_start_date: str = None
+    week_start_date: str = None,
+    tweak_mode: str = "iterative",
+    profile: bool = False,
+    cache: Optional[PlanCache] = None
 ) -> List[DailyPlan]:
     """
     Generira tjedni plan (7 dana) pozivajući generate_day_plan 7 puta.
+    tweak_mode se prosljeđuje tweak_day_plan ("iterative" ili "solver").
+    
+    profile=True (ili uzorak po PROFILING.sample_rate) zapisuje collapsed-stack
+    profil ovog poziva u PROFILING.output_dir.
+    
+    cache (default PLAN_CACHE) vraća spremljeni plan za iste ulaze; koristi
+    se samo s MealCatalog (verzija kataloga je dio ključa). Forsirani
+    profil uvijek računa ispočetka.
+    """
+    if cache is None:
+        cache = PLAN_CACHE
+    if cache is None or not isinstance(available_meals, MealCatalog):
+        with request_profile(force=profile):
+            return _generate_weekly_plan(
+                daily_targets, available_meals, foods_db, user, week_start_date, tweak_mode
+            )
+    
+    week_start_date = week_start_date or next_week_start()
+    key, versions, persist = _weekly_cache_key(daily_targets, available_meals, foods_db, user, week_start_date, tweak_mode)
+    if not profile:
+        cached = cache.get(key, versions, persist)
+        if cached is not None:
+            _count("plan_cache_hits")
+            return cached
+    _count("plan_cache_misses")
+    with request_profile(force=profile):
+        weekly_plan = _generate_weekly_plan(
+            daily_targets, available_meals, foods_db, user, week_start_date, tweak_mode
+        )
+    cache.put(key, versions, weekly_plan, persist)
+    return weekly_plan
+
+
+def _weekly_cache_key(
+    daily_targets: DailyTargets,
+    catalog: MealCatalog,
+    foods_db: Dict[str, Food],
+    user: UserPreferences,
+    week_start_date: str,
+    tweak_mode: str
+) -> Tuple[str, str, bool]:
+    """(ključ, verzije, persist) - na disk samo planovi s verzijama iz sadržaja."""
+    foods_version = foods_db_version(foods_db)
+    versions = f"{catalog.version}:{foods_version}"
+    persist = is_content_version(catalog.version) and is_content_version(foods_version)
+    return plan_cache_key(daily_targets, user, week_start_date, versions, tweak_mode), versions, persist
+
+
+def iter_weekly_plan(
+    daily_targets: DailyTargets,
+    available_meals: Union[List[Meal], MealCatalog],
+    foods_db: Dict[str, Food],
+    user: UserPreferences,
+    week_start_date: str = None,
+    tweak_mode: str = "iterative",
+    cache: Optional[PlanCache] = None
+) -> Iterator[DailyPlan]:
+    """
+    Kao generate_weekly_plan, ali vraća svaki dan (već prilagođen) čim je
+    gotov - worker/HTTP sloj može slati prvi dan dok se ostali računaju.
+    used_meal_ids se dijeli kroz tjedan isto kao u generate_weekly_plan.
+    
+    S cacheom (default PLAN_CACHE) pogodak vraća spremljene dane, a plan se
+    sprema tek kad su izašli svi dani.
     """
+    import copy
+    
+    if cache is None:
+        cache = PLAN_CACHE
+    if cache is None or not isinstance(available_meals, MealCatalog):
+        yield from _iter_weekly_days(daily_targets, available_meals, foods_db, user, week_start_date, tweak_mode)
+        return
+    
+    week_start_date = week_start_date or next_week_start()
+    key, versions, persist = _weekly_cache_key(daily_targets, available_meals, foods_db, user, week_start_date, tweak_mode)
+    cached = cache.get(key, versions, persist)
+    if cached is not None:
+        _count("plan_cache_hits")
+        yield from cached
+        return
+    _count("plan_cache_misses")
+    weekly_plan = []
+    for day_plan in _iter_weekly_days(daily_targets, available_meals, foods_db, user, week_start_date, tweak_mode):
+        # Kopija jer pozivatelj smije mijenjati dan prije nego je tjedan gotov
+        weekly_plan.append(copy.deepcopy(day_plan))
+        yield day_plan
+    cache.put(key, versions, weekly_plan, persist)
+
+
+def _generate_weekly_plan(
+    daily_targets: DailyTargets,
+    available_meals: Union[List[Meal], MealCatalog],
+    foods_db: Dict[str, Food],
+    user: UserPreferences,
+    week_start_date: str,
+    tweak_mode: str
+) -> List[DailyPlan]:
+    return list(_iter_weekly_days(daily_targets, available_meals, foods_db, user, week_start_date, tweak_mode))
+
+
+def _iter_weekly_days(
+    daily_targets: DailyTargets,
+    available_meals: Union[List[Meal], MealCatalog],
+    foods_db: Dict[str, Food],
+    user: UserPreferences,
+    week_start_date: str,
+    tweak_mode: str
+) -> Iterator[DailyPlan]:
     from datetime import datetime, timedelta
     
     # Odredi distribuciju obroka
     meal_distribution = get_meal_distribution(user.desiredMealsPerDay, user.goalType)
     
     # Odredi datum početka tjedna
-    if week_start_date:
-        start_date = datetime.strptime(week_start_date, "%Y-%m-%d")
-    else:
-        today = datetime.now()
-        day_of_week = today.weekday()  # 0 = Monday
-        days_to_monday = (7 - day_of_week) % 7
-        if days_to_monday == 0:
-            days_to_monday = 7
-        start_date = today + timedelta(days=days_to_monday)
-    
-    day_names = ["Ponedjeljak", "Utorak", "Srijeda", "Četvrtak", "Petak", "Subota", "Nedjelja"]
+    start_date = datetime.strptime(week_start_date or next_week_start(), "%Y-%m-%d")
     
     weekly_plan = []
     used_meal_ids = set()
     
-    print(f"\n🚀 Generating weekly meal plan...")
-    print(f"📋 User: {user.desiredMealsPerDay} meals/day, Goal: {user.goalType}")
-    print(f"🎯 Daily targets: {daily_targets.calories:.0f} kcal, P: {daily_targets.protein:.1f}g, C: {daily_targets.carbs:.1f}g, F: {daily_targets.fat:.1f}g")
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(
+            f"\n🚀 Generating weekly meal plan...\n"
+            f"📋 User: {user.desiredMealsPerDay} meals/day, Goal: {user.goalType}\n"
+            f"🎯 Daily targets: {daily_targets.calories:.0f} kcal, P: {daily_targets.protein:.1f}g, C: {daily_targets.carbs:.1f}g, F: {daily_targets.fat:.1f}g"
+        )
     
     for i in range(7):
         current_date = start_date + timedelta(days=i)
         date_str = current_date.strftime("%Y-%m-%d")
-        day_name = day_names[i]
+        day_name = DAY_NAMES[i]
         
         # Generiraj dnevni plan
         day_plan = generate_day_plan(
@@ -769,20 +3874,381 @@ def generate_weekly_plan(
         )
         
         # Prilagodi plan
-        day_plan = tweak_day_plan(day_plan, daily_targets, foods_db)
+        day_plan = tweak_day_plan(day_plan, daily_targets, foods_db, mode=tweak_mode)
         
         weekly_plan.append(day_plan)
+        yield day_plan
     
     # Izračunaj tjedne prosjeke
-    weekly_totals = {
-        "avgCalories": sum(d.dailyTotals["calories"] for d in weekly_plan) / 7,
-        "avgProtein": sum(d.dailyTotals["protein"] for d in weekly_plan) / 7,
-        "avgCarbs": sum(d.dailyTotals["carbs"] for d in weekly_plan) / 7,
-        "avgFat": sum(d.dailyTotals["fat"] for d in weekly_plan) / 7,
+    if logger.isEnabledFor(logging.INFO):
+        weekly_totals = {
+            "avgCalories": sum(d.dailyTotals["calories"] for d in weekly_plan) / 7,
+            "avgProtein": sum(d.dailyTotals["protein"] for d in weekly_plan) / 7,
+            "avgCarbs": sum(d.dailyTotals["carbs"] for d in weekly_plan) / 7,
+            "avgFat": sum(d.dailyTotals["fat"] for d in weekly_plan) / 7,
+        }
+        logger.info(
+            f"\n✅ Weekly plan generated!\n"
+            f"📊 Weekly averages: {weekly_totals['avgCalories']:.0f} kcal, P: {weekly_totals['avgProtein']:.1f}g, C: {weekly_totals['avgCarbs']:.1f}g, F: {weekly_totals['avgFat']:.1f}g"
+        )
+
+
+def generate_weekly_plan_with_metrics(
+    daily_targets: DailyTargets,
+    available_meals: Union[List[Meal], MealCatalog],
+    foods_db: Dict[str, Food],
+    user: UserPreferences,
+    week_start_date: str = None,
+    tweak_mode: str = "iterative"
+) -> Tuple[List[DailyPlan], PlanMetrics]:
+    """generate_weekly_plan uz PlanMetrics (trajanja i brojači po fazama) za taj poziv."""
+    with collect_metrics() as metrics:
+        with _stage("weekly_plan"):
+            plan = generate_weekly_plan(
+                daily_targets, available_meals, foods_db, user, week_start_date, tweak_mode
+            )
+    return plan, metrics
+
+
+# ============================================
+# INKREMENTALNO PREPLANIRANJE
+# ============================================
+
+def _used_meal_ids_except(weekly_plan: List[DailyPlan], day_index: int, meal_slot: str = None) -> set:
+    """Id-evi jela iz cijelog tjedna osim zadanog dana (ili samo zadanog slota tog dana)."""
+    used = set()
+    for i, day_plan in enumerate(weekly_plan):
+        for slot, meal in day_plan.meals.items():
+            if i != day_index or (meal_slot is not None and slot != meal_slot):
+                used.add(meal.id)
+    return used
+
+
+def replan_slot(
+    weekly_plan: List[DailyPlan],
+    day_index: int,
+    meal_slot: str,
+    daily_targets: DailyTargets,
+    available_meals: Union[List[Meal], MealCatalog],
+    foods_db: Dict[str, Food],
+    user: UserPreferences,
+    rejected_meal_ids: set = None,
+    tweak_mode: str = "iterative"
+) -> List[DailyPlan]:
+    """
+    Zamijeni jedan obrok (dan, slot) u postojećem tjednom planu.
+
+    Trenutno jelo u slotu (i rejected_meal_ids) se isključuje, jela ostalih
+    dana i slotova se penaliziraju kao u generate_weekly_plan, a
+    tweak_day_plan se ponavlja samo za taj dan. Vraća novu listu; ostali
+    dani su isti objekti, promijenjeni dan je kopija.
+    """
+    import copy
+    
+    day_plan = copy.deepcopy(weekly_plan[day_index])
+    if meal_slot not in day_plan.meals:
+        raise ValueError(f"No meal in slot {meal_slot} on day {day_index}")
+    
+    exclude = set(rejected_meal_ids or ())
+    exclude.add(day_plan.meals[meal_slot].id)
+    used_meal_ids = _used_meal_ids_except(weekly_plan, day_index, meal_slot)
+    meal_distribution = get_meal_distribution(user.desiredMealsPerDay, user.goalType)
+    meal_targets = get_meal_targets(daily_targets, meal_slot, meal_distribution)
+    
+    generated_meal = generate_meal(
+        meal_slot, available_meals, meal_targets, foods_db, user, used_meal_ids, exclude
+    )
+    if generated_meal is None:
+        raise ValueError(f"No replacement meal available for {meal_slot} on day {day_index}")
+    day_plan.meals[meal_slot] = generated_meal
+    
+    new_plan = list(weekly_plan)
+    new_plan[day_index] = tweak_day_plan(day_plan, daily_targets, foods_db, mode=tweak_mode)
+    return new_plan
+
+
+def replan_day(
+    weekly_plan: List[DailyPlan],
+    day_index: int,
+    daily_targets: DailyTargets,
+    available_meals: Union[List[Meal], MealCatalog],
+    foods_db: Dict[str, Food],
+    user: UserPreferences,
+    rejected_meal_ids: set = None,
+    tweak_mode: str = "iterative"
+) -> List[DailyPlan]:
+    """
+    Ponovno generiraj jedan dan tjednog plana (isti datum i ime dana).
+
+    Sva dosadašnja jela tog dana (i rejected_meal_ids) se isključuju, jela
+    ostalih dana se penaliziraju; ostali dani se ne diraju.
+    """
+    old_day = weekly_plan[day_index]
+    exclude = set(rejected_meal_ids or ())
+    exclude.update(meal.id for meal in old_day.meals.values())
+    meal_distribution = get_meal_distribution(user.desiredMealsPerDay, user.goalType)
+    
+    day_plan = generate_day_plan(
+        old_day.date,
+        old_day.dayName,
+        daily_targets,
+        meal_distribution,
+        available_meals,
+        foods_db,
+        user,
+        _used_meal_ids_except(weekly_plan, day_index),
+        exclude,
+    )
+    
+    new_plan = list(weekly_plan)
+    new_plan[day_index] = tweak_day_plan(day_plan, daily_targets, foods_db, mode=tweak_mode)
+    return new_plan
+
+
+# ============================================
+# BATCH GENERIRANJE (VIŠE KORISNIKA)
+# ============================================
+
+@dataclass
+class PlanRequest:
+    """Zahtjev za tjedni plan jednog korisnika"""
+    daily_targets: DailyTargets
+    user: UserPreferences
+    week_start_date: Optional[str] = None
+    request_id: Optional[str] = None
+    profile: bool = False
+
+
+@dataclass
+class PlanResult:
+    """Rezultat batch generiranja: plan ili greška (nikad oboje)"""
+    request_id: Optional[str]
+    plan: Optional[List[DailyPlan]] = None
+    error: Optional[str] = None
+    profile_path: Optional[str] = None
+
+
+def _string_list(values: Dict[str, Any], field: str, prefix: str = "preferences.") -> List[str]:
+    """Lista stringova iz preferencija; "egg" umjesto ["egg"] je greška, ne ['e', 'g', 'g']."""
+    value = values.get(field)
+    if value is None:
+        return []
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ValueError(f"{prefix}{field} must be a list of strings")
+    return list(value)
+
+
+def used_meal_ids_from_dict(data: Dict[str, Any]) -> List[str]:
+    """usedMealIds dnevnog zahtjeva; sve osim liste stringova je ValueError."""
+    return _string_list(data, "usedMealIds", prefix="")
+
+
+def plan_request_from_dict(data: Dict[str, Any]) -> PlanRequest:
+    """
+    PlanRequest iz JSON oblika koji šalje TypeScript backend:
+    {"id", "targets": {calories, protein, carbs, fat}, "preferences": {...},
+     "weekStart", "profile"}
+    Neispravan oblik (npr. allergies koji nije lista stringova) je ValueError.
+    """
+    targets = data["targets"]
+    preferences = data.get("preferences") or {}
+    if not isinstance(preferences, dict):
+        raise ValueError("preferences must be an object")
+    return PlanRequest(
+        daily_targets=DailyTargets(
+            calories=float(targets["calories"]),
+            protein=float(targets["protein"]),
+            carbs=float(targets["carbs"]),
+            fat=float(targets["fat"]),
+        ),
+        user=UserPreferences(
+            allergies=_string_list(preferences, "allergies"),
+            dislikes=_string_list(preferences, "dislikes"),
+            preferredIngredients=_string_list(preferences, "preferredIngredients"),
+            desiredMealsPerDay=int(preferences.get("desiredMealsPerDay", 5)),
+            goalType=preferences.get("goalType", "maintain"),
+        ),
+        week_start_date=data.get("weekStart"),
+        request_id=data.get("id"),
+        profile=bool(data.get("profile", False)),
+    )
+
+
+def _generated_meal_to_dict(meal: GeneratedMeal) -> Dict[str, Any]:
+    return {
+        "id": meal.id,
+        "name": meal.name,
+        "description": meal.description,
+        "image": meal.image,
+        "preparationTip": meal.preparationTip,
+        "components": [
+            {
+                "name": c.name,
+                "food": c.food,
+                "grams": c.grams,
+                "calories": c.calories,
+                "protein": c.protein,
+                "carbs": c.carbs,
+                "fat": c.fat,
+            }
+            for c in meal.components
+        ],
+        "totals": dict(meal.totals),
+    }
+
+
+def daily_plan_to_dict(day_plan: DailyPlan) -> Dict[str, Any]:
+    """
+    DailyPlan u JSON oblik (isti ključevi kao dataclass polja; komponente
+    kao dictovi name/food/grams/calories/protein/carbs/fat kao i prije).
+    """
+    return {
+        "date": day_plan.date,
+        "dayName": day_plan.dayName,
+        "meals": {slot: _generated_meal_to_dict(meal) for slot, meal in day_plan.meals.items()},
+        "dailyTotals": dict(day_plan.dailyTotals),
     }
+
+
+def daily_plan_from_dict(data: Dict[str, Any]) -> DailyPlan:
+    """Obrnuto od daily_plan_to_dict."""
+    meals = {}
+    for slot, meal in data["meals"].items():
+        meal = dict(meal)
+        meal["components"] = [ScaledComponent(**c) for c in meal["components"]]
+        meals[slot] = GeneratedMeal(**meal)
+    return DailyPlan(
+        date=data["date"],
+        dayName=data["dayName"],
+        meals=meals,
+        dailyTotals=data["dailyTotals"],
+    )
+
+
+# Katalog i baza namirnica u batch workeru (učitavaju se jednom po procesu)
+_WORKER_CATALOG: Optional[MealCatalog] = None
+_WORKER_FOODS: Optional[Dict[str, Food]] = None
+
+
+def _init_batch_worker(
+    catalog_path: Optional[str],
+    foods_path: Optional[str],
+    quiet: bool = True,
+    profiling: Tuple[float, str, float] = None,
+) -> None:
+    global _WORKER_CATALOG, _WORKER_FOODS
+    configure_logging(quiet=quiet)
+    if profiling is not None:
+        configure_profiling(*profiling)
+    _WORKER_CATALOG = load_meal_catalog(catalog_path)
+    _WORKER_FOODS = load_foods_database(foods_path or FOODS_DATABASE_FILE)
+
+
+def _run_plan_requests(requests: List[PlanRequest]) -> Tuple[List[PlanResult], Dict[str, int]]:
+    """
+    Obradi chunk zahtjeva u workeru; greška jednog korisnika ne ruši ostale.
+    Vraća i nedostajuće namirnice kataloga (missing_foods, za sažetak u roditelju).
+    """
+    results = []
+    for request in requests:
+        prof = request_profile(force=request.profile, label=f"weekly_plan-{request.request_id}")
+        try:
+            with prof:
+                plan = generate_weekly_plan(
+                    request.daily_targets,
+                    _WORKER_CATALOG,
+                    _WORKER_FOODS,
+                    request.user,
+                    request.week_start_date,
+                )
+            results.append(PlanResult(request_id=request.request_id, plan=plan, profile_path=prof.path))
+        except Exception as e:
+            results.append(PlanResult(
+                request_id=request.request_id, error=f"{type(e).__name__}: {e}", profile_path=prof.path
+            ))
+    return results, _WORKER_CATALOG.components.missing_foods(_WORKER_FOODS)
+
+
+def generate_weekly_plans_batch(
+    requests: List[PlanRequest],
+    workers: int = None,
+    chunksize: int = 8,
+    catalog_path: str = None,
+    foods_path: str = None,
+    quiet: bool = True,
+    shared_catalog: bool = False,
+) -> List[PlanResult]:
+    """
+    Generira tjedne planove za više korisnika u process poolu.
+
+    - katalog i baza namirnica učitavaju se jednom po workeru
+    - rezultati su u istom redoslijedu kao requests
+    - greška (ili pad workera) vraća PlanResult s error za te korisnike
+    - zahtjevi bez week_start_date dobiju isti datum (idući ponedjeljak)
+      izračunat jednom, pa rezultat ne ovisi o broju workera
+
+    workers=None koristi os.cpu_count(); workers=1 radi u trenutnom procesu.
+    quiet=True uključuje produkcijski logging u workerima; na kraju se
+    logira sažetak nedostajućih namirnica iz svih workera.
+    Workeri preuzimaju PROFILING postavke roditelja; PlanRequest.profile
+    forsira profil za tog korisnika (putanja u PlanResult.profile_path).
+    shared_catalog=True: katalog se objavi jednom kao dijeljeni .mealbin
+    (prepare_shared_catalog) i workeri ga samo mapiraju.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from dataclasses import replace
     
-    print(f"\n✅ Weekly plan generated!")
-    print(f"📊 Weekly averages: {weekly_totals['avgCalories']:.0f} kcal, P: {weekly_totals['avgProtein']:.1f}g, C: {weekly_totals['avgCarbs']:.1f}g, F: {weekly_totals['avgFat']:.1f}g")
+    default_start = next_week_start()
+    requests = [r if r.week_start_date else replace(r, week_start_date=default_start) for r in requests]
+    chunks = [requests[i:i + chunksize] for i in range(0, len(requests), chunksize)]
     
-    return weekly_plan
+    workers = workers or os.cpu_count() or 1
+    profiling = (PROFILING.sample_rate, PROFILING.output_dir, PROFILING.min_duration)
+    if shared_catalog and workers > 1 and len(chunks) > 1:
+        catalog_path = prepare_shared_catalog(catalog_path, foods_path)
+    results: List[PlanResult] = []
+    missing_counts: Dict[str, int] = {}
+    
+    def collect(chunk_results: List[PlanResult], chunk_missing: Dict[str, int]) -> None:
+        results.extend(chunk_results)
+        # Isti katalog i baza u svim workerima - brojevi se ne zbrajaju po chunkovima
+        missing_counts.update(chunk_missing)
+    
+    if workers <= 1 or len(chunks) <= 1:
+        previous_level = logger.level
+        previous_quiet = MISSING_FOODS.quiet
+        _init_batch_worker(catalog_path, foods_path, quiet, profiling)
+        try:
+            for chunk in chunks:
+                collect(*_run_plan_requests(chunk))
+        finally:
+            logger.setLevel(previous_level)
+            MISSING_FOODS.quiet = previous_quiet
+    else:
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(chunks)),
+            initializer=_init_batch_worker,
+            initargs=(catalog_path, foods_path, quiet, profiling),
+        ) as executor:
+            futures = [executor.submit(_run_plan_requests, chunk) for chunk in chunks]
+            for chunk, future in zip(chunks, futures):
+                try:
+                    collect(*future.result())
+                except Exception as e:
+                    # Worker je pao (npr. BrokenProcessPool) - označi cijeli chunk
+                    results.extend(
+                        PlanResult(request_id=r.request_id, error=f"{type(e).__name__}: {e}") for r in chunk
+                    )
+    
+    # Brojevi kataloga u globalni brojač (merge ne zbraja isti katalog dvaput)
+    MISSING_FOODS.merge(missing_counts)
+    if missing_counts:
+        logger.warning(
+            "⚠️ Missing foods in batch (%d): %s",
+            len(missing_counts),
+            ", ".join(f"{food_id}×{count}" for food_id, count in sorted(missing_counts.items(), key=lambda i: -i[1])),
+        )
+    return results
+
 
+configure_logging(quiet=os.environ.get("DISTRIBUTIONS_QUIET") == "1")
@@ -0,0 +1,345 @@
+"""
+LOKALNI HTTP SERVIS ZA GENERATOR PREHRANE (asyncio)
+
+Mali HTTP/1.1 server bez vanjskih ovisnosti oko generate_weekly_plan /
+generate_day_plan. CPU posao ide u pool topli procesa (katalog se učita
+jednom po procesu), a identični istovremeni zahtjevi (isti ciljevi,
+preferencije i početak tjedna) se spajaju u jedno računanje - bitno kod
+onboarding valova s default profilom.
+
+Pokretanje:
+    python lib/services/plan_server.py --port 8765 --workers 4
+
+Endpointi:
+    POST /plan/weekly   {"targets": {...}, "preferences": {...}, "weekStart": "2026-10-19", "tweakMode": "iterative"}
+    POST /plan/day      {"targets": {...}, "preferences": {...}, "date": "2026-10-19", "usedMealIds": [...]}
+    GET  /metrics       Prometheus text format (HTTP brojači + faze generatora)
+    GET  /healthz
+
+Tijelo zahtjeva je isto kao u plan_worker.py. Odgovor:
+    {"id": ..., "days": [...DailyPlan], "catalogVersion": "...", "coalesced": false}
+
+Backpressure: najviše --max-in-flight različitih računanja i --max-waiting
+zahtjeva u obradi; preko toga 503 s Retry-After.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Tuple
+
+import distributions as dist
+from plan_worker import compute_days
+
+
+# ============================================
+# WORKER PROCES
+# ============================================
+
+def _compute_plan(kind: str, data: Dict[str, Any]) -> Tuple[str, dist.PlanMetrics, str]:
+    """Plan kao gotov JSON (serijalizira se jednom za sve spojene zahtjeve) + metrike faza."""
+    with dist.collect_metrics() as metrics:
+        days = compute_days(kind, data)
+    days_json = json.dumps([dist.daily_plan_to_dict(d) for d in days], ensure_ascii=False, separators=(",", ":"))
+    return days_json, metrics, dist._WORKER_CATALOG.version
+
+
+def _warm_up_version() -> str:
+    return dist._WORKER_CATALOG.version
+
+
+def coalesce_key(kind: str, data: Dict[str, Any]) -> str:
+    """
+    Kanonski ključ zahtjeva: ciljevi i preferencije u istom obliku kao
+    plan_cache_key (liste kao sortirani skupovi), datum, tweakMode i
+    profile (profilirani zahtjev se ne spaja s neprofiliranim). "id" ne
+    ulazi u ključ. Nedostajući weekStart/date se razrješava ovdje pa se
+    i upisuje u data (isti datum za sve spojene). Neispravan zahtjev je
+    ValueError (400).
+    """
+    request = dist.plan_request_from_dict(data)
+    canonical = {
+        **dist.plan_inputs_canonical(request.daily_targets, request.user),
+        "kind": kind,
+        "tweakMode": data.get("tweakMode", "iterative"),
+        "profile": request.profile,
+    }
+    if kind == "weekly":
+        data["weekStart"] = canonical["weekStart"] = request.week_start_date or dist.next_week_start()
+    else:
+        data["date"] = canonical["date"] = data.get("date") or dist.next_week_start()
+        canonical["dayName"] = data.get("dayName")
+        canonical["usedMealIds"] = sorted(set(dist.used_meal_ids_from_dict(data)))
+    payload = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ============================================
+# SERVER
+# ============================================
+
+class Overloaded(Exception):
+    """Previše zahtjeva u obradi (503)."""
+
+
+HTTP_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+PLAN_ROUTES = {"/plan/weekly": "weekly", "/plan/day": "day"}
+KNOWN_PATHS = frozenset(PLAN_ROUTES) | {"/metrics", "/healthz"}
+
+
+class PlanServer:
+    """
+    asyncio server: parsira HTTP, spaja identične zahtjeve (_pending po
+    coalesce_key) i šalje računanje u ProcessPoolExecutor.
+    """
+
+    def __init__(
+        self,
+        workers: int = None,
+        max_in_flight: int = None,
+        max_waiting: int = 1024,
+        max_body: int = 64 * 1024,
+        catalog_path: str = None,
+        foods_path: str = None,
+        read_timeout: float = 30.0,
+        shared_catalog: bool = False,
+    ):
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.max_in_flight = max_in_flight or self.workers * 4
+        self.max_waiting = max_waiting
+        self.max_body = max_body
+        self.read_timeout = read_timeout
+        self.shared_catalog_path = None
+        if shared_catalog:
+            catalog_path = self.shared_catalog_path = dist.prepare_shared_catalog(catalog_path, foods_path)
+        self._worker_args = (catalog_path, foods_path, True)
+        self.executor = self._new_executor()
+        self.catalog_version = ""
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._waiting = 0
+        # Metrike servera
+        self.plan_metrics = dist.PlanMetrics()
+        self.requests: Dict[Tuple[str, int], int] = {}
+        self.coalesced = 0
+        self.rejected = 0
+        self.computations = 0
+        self.latency_sum = 0.0
+        self.latency_count = 0
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=dist._init_batch_worker,
+            initargs=self._worker_args,
+        )
+
+    # ---------- generiranje ----------
+
+    async def _compute(self, kind: str, data: Dict[str, Any]) -> Tuple[str, str]:
+        loop = asyncio.get_running_loop()
+        self.computations += 1
+        executor = self.executor
+        try:
+            days_json, metrics, version = await loop.run_in_executor(executor, _compute_plan, kind, data)
+        except BrokenProcessPool:
+            # Srušeni worker ruši cijeli pool - zamijeni ga (jednom) za iduće zahtjeve
+            if self.executor is executor:
+                dist.logger.warning("⚠️ Worker process crashed - restarting pool")
+                self.executor = self._new_executor()
+                executor.shutdown(wait=False)
+            raise
+        self.plan_metrics.merge(metrics)
+        self.catalog_version = version
+        return days_json, version
+
+    async def plan(self, kind: str, data: Dict[str, Any]) -> Tuple[str, str, bool]:
+        """(days_json, catalogVersion, coalesced) - identični zahtjevi u tijeku dijele računanje."""
+        key = coalesce_key(kind, data)
+        task = self._pending.get(key)
+        coalesced = task is not None
+        if coalesced:
+            self.coalesced += 1
+        else:
+            if len(self._pending) >= self.max_in_flight:
+                raise Overloaded(f"{len(self._pending)} computations in flight")
+            task = asyncio.ensure_future(self._compute(kind, data))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        # shield: prekid jednog klijenta ne otkazuje računanje ostalima
+        days_json, version = await asyncio.shield(task)
+        return days_json, version, coalesced
+
+    # ---------- metrike ----------
+
+    def metrics_text(self, prefix: str = "distributions") -> str:
+        lines = [
+            f"# HELP {prefix}_http_requests_total HTTP requests by path and status.",
+            f"# TYPE {prefix}_http_requests_total counter",
+        ]
+        for (path, status), count in sorted(self.requests.items()):
+            lines.append(f'{prefix}_http_requests_total{{path="{path}",status="{status}"}} {count}')
+        for name, value, help_text, kind in (
+            ("http_coalesced_total", self.coalesced, "Requests served by an identical in-flight computation.", "counter"),
+            ("http_rejected_total", self.rejected, "Requests rejected by backpressure limits.", "counter"),
+            ("http_computations_total", self.computations, "Plan computations sent to the executor.", "counter"),
+            ("http_in_flight", len(self._pending), "Distinct computations in flight.", "gauge"),
+            ("http_waiting", self._waiting, "Plan requests currently being served.", "gauge"),
+        ):
+            lines += [
+                f"# HELP {prefix}_{name} {help_text}",
+                f"# TYPE {prefix}_{name} {kind}",
+                f"{prefix}_{name} {value}",
+            ]
+        lines += [
+            f"# HELP {prefix}_http_request_seconds Plan request latency.",
+            f"# TYPE {prefix}_http_request_seconds summary",
+            f"{prefix}_http_request_seconds_sum {self.latency_sum:.9f}",
+            f"{prefix}_http_request_seconds_count {self.latency_count}",
+        ]
+        return "\n".join(lines) + "\n" + self.plan_metrics.to_prometheus(prefix)
+
+    # ---------- HTTP ----------
+
+    async def route(self, method: str, path: str, body: bytes) -> Tuple[int, bytes, str, Dict[str, str]]:
+        if path == "/metrics":
+            if method != "GET":
+                return 405, b"", "text/plain", {}
+            return 200, self.metrics_text().encode("utf-8"), "text/plain; version=0.0.4", {}
+        if path == "/healthz":
+            payload = {"status": "ok", "catalogVersion": self.catalog_version, "inFlight": len(self._pending)}
+            return 200, json.dumps(payload).encode("utf-8"), "application/json", {}
+        kind = PLAN_ROUTES.get(path)
+        if kind is None:
+            return 404, b'{"error":"not found"}', "application/json", {}
+        if method != "POST":
+            return 405, b'{"error":"use POST"}', "application/json", {}
+        if self._waiting >= self.max_waiting:
+            self.rejected += 1
+            return 503, b'{"error":"too many requests waiting"}', "application/json", {"Retry-After": "1"}
+
+        self._waiting += 1
+        start = time.perf_counter()
+        try:
+            try:
+                data = json.loads(body or b"{}")
+                days_json, version, coalesced = await self.plan(kind, data)
+            except Overloaded as e:
+                self.rejected += 1
+                return 503, json.dumps({"error": str(e)}).encode("utf-8"), "application/json", {"Retry-After": "1"}
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                return 400, json.dumps({"error": f"{type(e).__name__}: {e}"}).encode("utf-8"), "application/json", {}
+            except Exception as e:
+                dist.logger.warning("⚠️ Plan request failed: %s: %s", type(e).__name__, e)
+                return 500, json.dumps({"error": f"{type(e).__name__}: {e}"}).encode("utf-8"), "application/json", {}
+            head = json.dumps({"id": data.get("id"), "catalogVersion": version, "coalesced": coalesced})
+            payload = f'{head[:-1]},"days":{days_json}}}'
+            return 200, payload.encode("utf-8"), "application/json; charset=utf-8", {}
+        finally:
+            self._waiting -= 1
+            self.latency_sum += time.perf_counter() - start
+            self.latency_count += 1
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:  # keep-alive
+                request_line = await asyncio.wait_for(reader.readline(), self.read_timeout)
+                if not request_line:
+                    break
+                parts = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await asyncio.wait_for(reader.readline(), self.read_timeout)
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = headers.get("content-length") or "0"
+                if len(parts) != 3 or not length.isdigit():
+                    # Neispravan zahtjev: odgovori 400 umjesto tihog zatvaranja veze
+                    path = ""
+                    status, payload, content_type, extra = 400, b'{"error":"malformed request"}', "application/json", {}
+                    keep_alive = False
+                else:
+                    method, target, version = parts
+                    path = target.split("?", 1)[0]
+                    if int(length) > self.max_body:
+                        status, payload, content_type, extra = 413, b'{"error":"body too large"}', "application/json", {}
+                        keep_alive = False
+                    else:
+                        body = await asyncio.wait_for(reader.readexactly(int(length)), self.read_timeout) if int(length) else b""
+                        status, payload, content_type, extra = await self.route(method, path, body)
+                        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                # Nepoznate putanje idu pod "other" da broj serija ostane ograničen
+                label = path if path in KNOWN_PATHS else "other"
+                self.requests[(label, status)] = self.requests.get((label, status), 0) + 1
+
+                head = [
+                    f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}",
+                    f"Content-Type: {content_type}",
+                    f"Content-Length: {len(payload)}",
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}",
+                ] + [f"{name}: {value}" for name, value in extra.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765) -> None:
+        loop = asyncio.get_running_loop()
+        # Zagrij worker procese prije prvog zahtjeva
+        self.catalog_version = await loop.run_in_executor(self.executor, _warm_up_version)
+        if self.shared_catalog_path:
+            dist.remove_stale_shared_catalogs(self.shared_catalog_path)
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):  # Windows
+                pass
+        dist.logger.warning("🚀 Plan server listening on http://%s:%d (%d workers)", host, port, self.workers)
+        async with server:
+            await stop.wait()
+        self.executor.shutdown(wait=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Lokalni HTTP servis za generator prehrane")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None, help="broj worker procesa (default min(4, CPU))")
+    parser.add_argument("--max-in-flight", type=int, default=None, help="najviše različitih računanja (default 4 × workers)")
+    parser.add_argument("--max-waiting", type=int, default=1024, help="najviše zahtjeva u obradi prije 503")
+    parser.add_argument("--catalog", default=None, help="putanja do meal_components.json")
+    parser.add_argument("--foods", default=None, help="putanja do foods-database.ts")
+    parser.add_argument("--shared-catalog", action="store_true", help="workeri dijele katalog preko .mealbin u /dev/shm")
+    args = parser.parse_args()
+
+    dist.configure_logging(quiet=True)
+    server = PlanServer(
+        workers=args.workers,
+        max_in_flight=args.max_in_flight,
+        max_waiting=args.max_waiting,
+        catalog_path=args.catalog,
+        foods_path=args.foods,
+        shared_catalog=args.shared_catalog,
+    )
+    asyncio.run(server.serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
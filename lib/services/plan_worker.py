@@ -0,0 +1,341 @@
+"""
+TOPLI WORKER ZA GENERATOR PREHRANE (JSON-lines preko stdin/stdout)
+
+Dugoživući proces za TypeScript backend: katalog jela i baza namirnica se
+učitaju jednom po worker procesu, a zahtjevi i odgovori idu kao JSON linije.
+
+Pokretanje:
+    python lib/services/plan_worker.py --workers 4 --max-in-flight 32
+
+Zahtjevi (stdin, jedna JSON linija po zahtjevu):
+    {"id": "r1", "type": "weekly", "targets": {"calories": 2200, "protein": 150, "carbs": 240, "fat": 70},
+     "preferences": {"allergies": [], "dislikes": [], "desiredMealsPerDay": 5, "goalType": "lose"},
+     "weekStart": "2026-10-19", "tweakMode": "iterative"}
+    {"id": "r2", "type": "day", "targets": {...}, "preferences": {...},
+     "date": "2026-10-19", "usedMealIds": ["breakfast_1"]}
+    {"id": "r3", "type": "reload"}     - ponovno učitaj katalog; zahtjevi u tijeku završe na starom
+    {"id": "r4", "type": "ping"}
+    {"type": "shutdown"}               - (ili EOF) pričekaj zahtjeve u tijeku i izađi
+
+Odgovori (stdout):
+    {"type": "ready", "catalogVersion": "...", "workers": 4}
+    {"id": "r1", "type": "day", "index": 0, "plan": {...DailyPlan}}   - jedna linija po danu, čim je dan gotov
+    {"id": "r1", "type": "done", "days": 7, "ms": 41.3, "catalogVersion": "..."}
+    {"id": "r1", "type": "error", "error": "KeyError: 'targets'"}
+
+Odgovori različitih zahtjeva se mogu preplitati - spajaju se po "id".
+Logging generatora ide na stderr (stdout je rezerviran za protokol).
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import distributions as dist
+
+
+# ============================================
+# WORKER PROCES
+# ============================================
+
+# Red za odgovore prema roditelju (postavlja ga initializer)
+_RESULTS = None
+
+
+def _init_worker(results_queue, catalog_path: Optional[str], foods_path: Optional[str], quiet: bool) -> None:
+    global _RESULTS
+    _RESULTS = results_queue
+    # Prije učitavanja kataloga: uz spawn (Windows, macOS) je modul tek importiran
+    # s handlerom na stdout, a stdout je rezerviran za protokol
+    dist.configure_logging(quiet=quiet, stream=sys.stderr)
+    dist._init_batch_worker(catalog_path, foods_path, quiet)
+
+
+def _warm_up() -> str:
+    return dist._WORKER_CATALOG.version
+
+
+def _day_plan(request: dist.PlanRequest, data: Dict[str, Any], tweak_mode: str) -> dist.DailyPlan:
+    date_str = data.get("date") or dist.next_week_start()
+    day_name = data.get("dayName") or dist.DAY_NAMES[datetime.strptime(date_str, "%Y-%m-%d").weekday()]
+    meal_distribution = dist.get_meal_distribution(request.user.desiredMealsPerDay, request.user.goalType)
+    day_plan = dist.generate_day_plan(
+        date_str,
+        day_name,
+        request.daily_targets,
+        meal_distribution,
+        dist._WORKER_CATALOG,
+        dist._WORKER_FOODS,
+        request.user,
+        set(dist.used_meal_ids_from_dict(data)),
+    )
+    return dist.tweak_day_plan(day_plan, request.daily_targets, dist._WORKER_FOODS, mode=tweak_mode)
+
+
+def compute_days(kind: str, data: Dict[str, Any]) -> List[dist.DailyPlan]:
+    """Tjedni ("weekly") ili dnevni ("day") plan za JSON zahtjev, u worker procesu."""
+    request = dist.plan_request_from_dict(data)
+    tweak_mode = data.get("tweakMode", "iterative")
+    if kind == "weekly":
+        return dist.generate_weekly_plan(
+            request.daily_targets,
+            dist._WORKER_CATALOG,
+            dist._WORKER_FOODS,
+            request.user,
+            request.week_start_date,
+            tweak_mode,
+            profile=request.profile,
+        )
+    return [_day_plan(request, data, tweak_mode)]
+
+
+def _run_request(kind: str, data: Dict[str, Any]) -> None:
+    """Generiraj plan i pošalji dane u red čim su gotovi; greške idu kao odgovor."""
+    request_id = data.get("id")
+    start = time.perf_counter()
+    try:
+        if kind == "weekly":
+            request = dist.plan_request_from_dict(data)
+            days = dist.iter_weekly_plan(
+                request.daily_targets,
+                dist._WORKER_CATALOG,
+                dist._WORKER_FOODS,
+                request.user,
+                request.week_start_date,
+                data.get("tweakMode", "iterative"),
+            )
+            profile = dist.request_profile(force=request.profile)
+        else:
+            days = compute_days(kind, data)
+            profile = contextlib.nullcontext()
+        count = 0
+        with profile:
+            for index, day_plan in enumerate(days):
+                _RESULTS.put({"id": request_id, "type": "day", "index": index, "plan": dist.daily_plan_to_dict(day_plan)})
+                count += 1
+        _RESULTS.put({
+            "id": request_id,
+            "type": "done",
+            "days": count,
+            "ms": round((time.perf_counter() - start) * 1000, 1),
+            "catalogVersion": dist._WORKER_CATALOG.version,
+        })
+    except Exception as e:
+        _RESULTS.put({"id": request_id, "type": "error", "error": f"{type(e).__name__}: {e}"})
+
+
+# ============================================
+# RODITELJ (PROTOKOL)
+# ============================================
+
+class PlanWorker:
+    """
+    Čita zahtjeve sa stdin, šalje ih u pool topli procesa i ispisuje
+    odgovore. Najviše max_in_flight zahtjeva je istovremeno u tijeku;
+    nakon toga čitanje stdin čeka (backpressure prema pozivatelju).
+    """
+
+    def __init__(
+        self,
+        workers: int = None,
+        max_in_flight: int = 32,
+        catalog_path: str = None,
+        foods_path: str = None,
+        quiet: bool = True,
+        out=None,
+        shared_catalog: bool = False,
+    ):
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.catalog_path = catalog_path
+        self.foods_path = foods_path
+        self.quiet = quiet
+        self.shared_catalog = shared_catalog
+        self.out = out or sys.stdout
+        self._write_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._in_flight: Dict[str, float] = {}
+        self._results = multiprocessing.Queue()
+        self._pool_lock = threading.Lock()
+        self._retired: List[threading.Thread] = []
+        self._pool, self.catalog_version = self._start_pool()
+        self._reader = threading.Thread(target=self._forward_results, daemon=True)
+        self._reader.start()
+
+    def _start_pool(self):
+        catalog_path = self.catalog_path
+        if self.shared_catalog:
+            # Objavi (ponovno, ako se katalog promijenio) dijeljeni .mealbin prije forka
+            catalog_path = dist.prepare_shared_catalog(self.catalog_path, self.foods_path)
+        pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self._results, catalog_path, self.foods_path, self.quiet),
+        )
+        # Zagrij sve procese prije prvog zahtjeva (učitavanje kataloga)
+        versions = [pool.submit(_warm_up) for _ in range(self.workers)]
+        version = versions[0].result()
+        if self.shared_catalog:
+            # Novi pool je zagrijan - zamijenjeni .mealbin više ne treba
+            dist.remove_stale_shared_catalogs(catalog_path)
+        return pool, version
+
+    def emit(self, message: Dict[str, Any]) -> None:
+        line = json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+        with self._write_lock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def _finish(self, request_id: str) -> None:
+        with self._state_lock:
+            if self._in_flight.pop(request_id, None) is None:
+                return
+        self._slots.release()
+
+    def _forward_results(self) -> None:
+        for message in iter(self._results.get, None):
+            self.emit(message)
+            if message["type"] in ("done", "error"):
+                self._finish(message["id"])
+
+    def _on_future_done(self, request_id: str, pool: ProcessPoolExecutor, future: Future) -> None:
+        # Pad procesa (npr. BrokenProcessPool) - _run_request nije stigao odgovoriti
+        error = future.exception()
+        if error is not None:
+            self._results.put({"id": request_id, "type": "error", "error": f"{type(error).__name__}: {error}"})
+        if isinstance(error, BrokenProcessPool):
+            # Callback se zove iz upravljačke niti starog poola - novi pool se diže u zasebnoj niti
+            threading.Thread(target=self._restart_broken, args=(pool,), daemon=True).start()
+
+    def _restart_broken(self, pool: ProcessPoolExecutor) -> None:
+        """Zamijeni srušeni pool novim (jednom, bez obzira na broj pogođenih zahtjeva)."""
+        with self._pool_lock:
+            if self._pool is not pool:
+                return
+            dist.logger.warning("⚠️ Worker process crashed - restarting pool")
+            self._pool, self.catalog_version = self._start_pool()
+        pool.shutdown(wait=False)
+
+    def submit(self, kind: str, data: Dict[str, Any]) -> None:
+        request_id = data.get("id")
+        if request_id is None:
+            self.emit({"id": None, "type": "error", "error": "missing request id"})
+            return
+        self._slots.acquire()
+        with self._state_lock:
+            duplicate = request_id in self._in_flight
+            if not duplicate:
+                self._in_flight[request_id] = time.time()
+        if duplicate:
+            self._slots.release()
+            self.emit({"id": request_id, "type": "error", "error": "request id already in flight"})
+            return
+        try:
+            # Neispravan zahtjev se odbija odmah, bez slanja u worker
+            dist.plan_request_from_dict(data)
+            if kind == "day":
+                dist.used_meal_ids_from_dict(data)
+            pool = self._pool
+            try:
+                future = pool.submit(_run_request, kind, data)
+            except BrokenProcessPool:
+                self._restart_broken(pool)
+                pool = self._pool
+                future = pool.submit(_run_request, kind, data)
+        except Exception as e:
+            self._results.put({"id": request_id, "type": "error", "error": f"{type(e).__name__}: {e}"})
+            return
+        future.add_done_callback(lambda f: self._on_future_done(request_id, pool, f))
+
+    def reload(self) -> str:
+        """Novi pool s ponovno učitanim katalogom; stari završi zahtjeve u tijeku pa se gasi."""
+        with self._pool_lock:
+            old_pool = self._pool
+            self._pool, self.catalog_version = self._start_pool()
+        # shutdown(wait=False) ne bi ostavio ništa za čekanje u close() - gasi se u pozadinskoj niti
+        retire = threading.Thread(target=old_pool.shutdown, kwargs={"wait": True}, daemon=True)
+        retire.start()
+        self._retired.append(retire)
+        return self.catalog_version
+
+    def handle_line(self, line: str) -> bool:
+        """Obradi jednu liniju; vraća False za shutdown."""
+        line = line.strip()
+        if not line:
+            return True
+        try:
+            data = json.loads(line)
+            kind = data.get("type", "weekly")
+        except (ValueError, AttributeError) as e:
+            self.emit({"id": None, "type": "error", "error": f"invalid JSON: {e}"})
+            return True
+
+        if kind in ("weekly", "day"):
+            self.submit(kind, data)
+        elif kind == "reload":
+            try:
+                version = self.reload()
+                self.emit({"id": data.get("id"), "type": "reloaded", "catalogVersion": version})
+            except Exception as e:
+                self.emit({"id": data.get("id"), "type": "error", "error": f"{type(e).__name__}: {e}"})
+        elif kind == "ping":
+            with self._state_lock:
+                in_flight = len(self._in_flight)
+            self.emit({"id": data.get("id"), "type": "pong", "inFlight": in_flight, "catalogVersion": self.catalog_version})
+        elif kind == "shutdown":
+            return False
+        else:
+            self.emit({"id": data.get("id"), "type": "error", "error": f"unknown request type: {kind}"})
+        return True
+
+    def close(self) -> None:
+        """Pričekaj sve zahtjeve u tijeku (i na starim poolovima) i ugasi worker."""
+        self._pool.shutdown(wait=True)
+        for retire in self._retired:
+            retire.join()
+        self._results.put(None)
+        self._reader.join()
+
+    def serve(self, stream=None) -> None:
+        self.emit({"type": "ready", "catalogVersion": self.catalog_version, "workers": self.workers})
+        try:
+            for line in stream or sys.stdin:
+                if not self.handle_line(line):
+                    break
+        finally:
+            self.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Topli JSON-lines worker za generator prehrane")
+    parser.add_argument("--workers", type=int, default=None, help="broj worker procesa (default min(4, CPU))")
+    parser.add_argument("--max-in-flight", type=int, default=32, help="najviše zahtjeva istovremeno u tijeku")
+    parser.add_argument("--catalog", default=None, help="putanja do meal_components.json")
+    parser.add_argument("--foods", default=None, help="putanja do foods-database.ts")
+    parser.add_argument("--verbose", action="store_true", help="INFO logging generatora na stderr")
+    parser.add_argument("--shared-catalog", action="store_true", help="workeri dijele katalog preko .mealbin u /dev/shm")
+    args = parser.parse_args()
+
+    dist.configure_logging(quiet=not args.verbose, stream=sys.stderr)
+    worker = PlanWorker(
+        workers=args.workers,
+        max_in_flight=args.max_in_flight,
+        catalog_path=args.catalog,
+        foods_path=args.foods,
+        quiet=not args.verbose,
+        shared_catalog=args.shared_catalog,
+    )
+    worker.serve()
+
+
+if __name__ == "__main__":
+    main()
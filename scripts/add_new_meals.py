@@ -1,10 +1,24 @@
 #!/usr/bin/env python3
 """
-Skripta za dodavanje 50 novih jela u meal_components.json
+Skripta za dodavanje 50 novih jela u spremište kataloga (MealStore)
+
+Jela se dodaju jednom transakcijom po tipu obroka. Prazno spremište se
+prvo napuni iz meal_components.json, a na kraju se meal_components.json
+atomski izvozi iz spremišta jer ga čitaju generator i TS aplikacija
+(--no-export ostavlja promjene samo u spremištu).
+
+Korištenje:
+    python scripts/add_new_meals.py
+    python scripts/add_new_meals.py --store /srv/plans/meal_catalog.sqlite --no-export
 """
 
-import json
+import argparse
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lib', 'services'))
+
+import distributions as dist  # noqa: E402
 
 # Path to the meal_components.json file
 MEAL_FILE = os.path.join(os.path.dirname(__file__), '..', 'lib', 'data', 'meal_components.json')
@@ -757,47 +771,49 @@ NEW_SNACK = [
 
 
 def main():
-    print("📖 Učitavam postojeću bazu jela...")
-    
-    with open(MEAL_FILE, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    print(f"   Breakfast: {len(data['breakfast'])} jela")
-    print(f"   Lunch: {len(data['lunch'])} jela")
-    print(f"   Dinner: {len(data['dinner'])} jela")
-    print(f"   Snack: {len(data['snack'])} jela")
-    print(f"   UKUPNO: {len(data['breakfast']) + len(data['lunch']) + len(data['dinner']) + len(data['snack'])} jela")
-    
+    parser = argparse.ArgumentParser(description="Dodaj nova jela u spremište kataloga")
+    parser.add_argument('--store', default=dist.CATALOG_STORE_FILE, help="putanja do meal_catalog.sqlite")
+    parser.add_argument('--no-export', action='store_true', help="ne izvozi meal_components.json (samo spremište)")
+    args = parser.parse_args()
+
+    print("📖 Otvaram spremište kataloga...")
+    store = dist.MealStore(args.store)
+    if len(store) == 0:
+        print(f"   Prazno spremište - uvozim {os.path.relpath(MEAL_FILE)}")
+        store.import_json(MEAL_FILE)
+
+    data = store.to_dict()
+    for meal_type in dist.MEAL_TYPES:
+        print(f"   {meal_type.capitalize()}: {len(data[meal_type])} jela")
+    print(f"   UKUPNO: {len(store)} jela")
+
     print("\n➕ Dodajem nova jela...")
-    
-    # Dodaj nova jela
-    data['breakfast'].extend(NEW_BREAKFAST)
-    data['lunch'].extend(NEW_LUNCH)
-    data['dinner'].extend(NEW_DINNER)
-    data['snack'].extend(NEW_SNACK)
-    
-    print(f"   +{len(NEW_BREAKFAST)} doručaka")
-    print(f"   +{len(NEW_LUNCH)} ručkova")
-    print(f"   +{len(NEW_DINNER)} večera")
-    print(f"   +{len(NEW_SNACK)} užina")
-    
-    print("\n💾 Spremam ažuriranu bazu...")
-    
-    with open(MEAL_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    
-    total_new = len(NEW_BREAKFAST) + len(NEW_LUNCH) + len(NEW_DINNER) + len(NEW_SNACK)
-    total_final = len(data['breakfast']) + len(data['lunch']) + len(data['dinner']) + len(data['snack'])
-    
+
+    # Jedna transakcija po tipu; već dodana jela se preskaču pa je skripta idempotentna
+    added = {
+        'breakfast': store.add_meals('breakfast', NEW_BREAKFAST, skip_existing=True),
+        'lunch': store.add_meals('lunch', NEW_LUNCH, skip_existing=True),
+        'dinner': store.add_meals('dinner', NEW_DINNER, skip_existing=True),
+        'snack': store.add_meals('snack', NEW_SNACK, skip_existing=True),
+    }
+
+    print(f"   +{added['breakfast']} doručaka")
+    print(f"   +{added['lunch']} ručkova")
+    print(f"   +{added['dinner']} večera")
+    print(f"   +{added['snack']} užina")
+
+    # Generator (load_meal_catalog) i TS aplikacija čitaju meal_components.json
+    if not args.no_export:
+        print("\n💾 Izvozim meal_components.json...")
+        store.export_json(MEAL_FILE)
+
+    data = store.to_dict()
     print("\n✅ ZAVRŠENO!")
-    print(f"   Dodano: {total_new} novih jela")
-    print(f"   Breakfast: {len(data['breakfast'])} jela")
-    print(f"   Lunch: {len(data['lunch'])} jela")
-    print(f"   Dinner: {len(data['dinner'])} jela")
-    print(f"   Snack: {len(data['snack'])} jela")
-    print(f"   NOVA UKUPNA BAZA: {total_final} jela")
+    print(f"   Dodano: {sum(added.values())} novih jela (revizija {store.revision})")
+    for meal_type in dist.MEAL_TYPES:
+        print(f"   {meal_type.capitalize()}: {len(data[meal_type])} jela")
+    print(f"   NOVA UKUPNA BAZA: {len(store)} jela")
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""
+Benchmark za tjedni generator prehrane (lib/services/distributions.py).
+
+Sintetički katalog (100 - 1.000.000 jela) izveden iz meal_components.json
+i sintetička kohorta korisnika; mjeri planove/s, p50/p99 latenciju i
+peak RSS za generate_meal, generate_day_plan i generate_weekly_plan.
+
+Primjeri:
+    python scripts/bench_distributions.py throughput
+    python scripts/bench_distributions.py throughput --sizes 100 1000 10000 100000 --users 50
+    python scripts/bench_distributions.py throughput --json bench.json
+    python scripts/bench_distributions.py micro --label "prije promjene težina" --set-baseline
+    python scripts/bench_distributions.py micro
+    python scripts/bench_distributions.py compare
+"""
+
+import argparse
+import copy
+import datetime
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import timeit
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+try:
+    import resource
+except ImportError:  # Windows - nema getrusage, peak RSS se preskače
+    resource = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lib', 'services'))
+
+import distributions as dist  # noqa: E402
+
+GOALS = ("lose", "maintain", "gain")
+MEALS_PER_DAY = (3, 5, 6)
+COMMON_ALLERGENS = ("egg", "milk", "nuts", "peanut", "fish", "tuna", "salmon", "cheese", "yogurt", "whey")
+WEEK_START = "2026-01-05"
+
+# Lokalna povijest microbenchmarka (nije u gitu)
+HISTORY_FILE = os.path.join(os.path.dirname(__file__), '..', '.bench', 'distributions_micro.json')
+HISTORY_SCHEMA = 1
+
+
+# ========================================
+# SINTETIČKI KATALOG
+# ========================================
+
+def synthetic_catalog(size: int, seed: int = 42) -> dist.MealCatalog:
+    """
+    Katalog od `size` jela izveden iz meal_components.json.
+
+    Svako jelo je kopija stvarnog jela istog tipa s gramažama skaliranim
+    0.6x - 1.6x (zaokruženo na 5 g), ponekad s jednom komponentom manje ili
+    jednom dodanom iz namirnica tog tipa, i nasumičnim suitableFor.
+    """
+    rng = random.Random(seed)
+    templates = dist.load_meal_catalog()
+    type_templates = {t: templates.meals_for_type(t) for t in dist.MEAL_TYPES}
+    type_components = {
+        t: [c for meal in meals for c in meal.components] for t, meals in type_templates.items()
+    }
+    # Udio tipova kao u stvarnom katalogu
+    weights = [len(type_templates[t]) for t in dist.MEAL_TYPES]
+
+    meals = []
+    for i in range(size):
+        meal_type = rng.choices(dist.MEAL_TYPES, weights)[0]
+        template = rng.choice(type_templates[meal_type])
+        components = [
+            dist.MealComponent(
+                food=c.food,
+                grams=max(5, round(c.grams * rng.uniform(0.6, 1.6) / 5) * 5),
+                displayName=c.displayName,
+            )
+            for c in template.components
+        ]
+        roll = rng.random()
+        if roll < 0.2 and len(components) > 2:
+            components.pop(rng.randrange(len(components)))
+        elif roll < 0.4:
+            extra = rng.choice(type_components[meal_type])
+            components.append(dist.MealComponent(extra.food, extra.grams, extra.displayName))
+        meals.append(dist.Meal(
+            id=f"synthetic_{meal_type}_{i}",
+            name=f"{template.name} #{i}",
+            description=template.description,
+            image=template.image,
+            preparationTip=template.preparationTip,
+            components=components,
+            tags=list(template.tags),
+            suitableFor=rng.sample(GOALS, rng.randint(1, 3)),
+            mealType=meal_type,
+        ))
+    return dist.MealCatalog(meals, goal_notes=templates.goal_notes, version=f"synthetic-{size}-{seed}")
+
+
+# ========================================
+# SINTETIČKA KOHORTA
+# ========================================
+
+def synthetic_cohort(count: int, catalog: dist.MealCatalog, seed: int = 7) -> List[Tuple[dist.DailyTargets, dist.UserPreferences]]:
+    """
+    `count` korisnika s konzistentnim dnevnim targetima (kcal = P×4 + UH×4 + M×9),
+    0-8 alergija, 0-4 dislikes, 0-2 preferirane namirnice, 3/5/6 obroka i ciljem.
+    """
+    rng = random.Random(seed)
+    foods = sorted({c.food.lower() for meal in catalog.meals for c in meal.components})
+    cohort = []
+    for _ in range(count):
+        goal = rng.choice(GOALS)
+        protein = rng.uniform(90, 200)
+        carbs = rng.uniform(120, 380)
+        fat = rng.uniform(40, 110)
+        targets = dist.DailyTargets(protein * 4 + carbs * 4 + fat * 9, protein, carbs, fat)
+        allergy_count = rng.choice((0, 0, 0, 1, 2, 3, 5, 8))
+        user = dist.UserPreferences(
+            allergies=rng.sample(COMMON_ALLERGENS, min(allergy_count, len(COMMON_ALLERGENS))),
+            dislikes=rng.sample(foods, rng.randint(0, 4)),
+            preferredIngredients=rng.sample(foods, rng.randint(0, 2)),
+            desiredMealsPerDay=rng.choice(MEALS_PER_DAY),
+            goalType=goal,
+        )
+        cohort.append((targets, user))
+    return cohort
+
+
+# ========================================
+# MJERENJE
+# ========================================
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak RSS procesa u MB (ru_maxrss je KB na Linuxu, bajtovi na macOS-u); None bez modula resource."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = (len(ordered) - 1) * pct / 100
+    low = int(k)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+
+def measure(fn: Callable[[], Any], repeats: int) -> Dict[str, float]:
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    total = time.perf_counter() - start
+    return {
+        "calls": repeats,
+        "per_second": repeats / total if total > 0 else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def run_throughput(size: int, users: int, seed: int) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    catalog = synthetic_catalog(size, seed)
+    foods_db = dist.load_foods_database()
+    build_s = time.perf_counter() - t0
+    cohort = synthetic_cohort(users, catalog, seed)
+
+    def cycle(make_call):
+        users_iter = itertools.cycle(cohort)
+        return lambda: make_call(*next(users_iter))
+
+    def one_meal(targets, user):
+        distribution = dist.get_meal_distribution(user.desiredMealsPerDay, user.goalType)
+        meal_targets = dist.get_meal_targets(targets, "lunch", distribution)
+        dist.generate_meal("lunch", catalog, meal_targets, foods_db, user, set())
+
+    def one_day(targets, user):
+        distribution = dist.get_meal_distribution(user.desiredMealsPerDay, user.goalType)
+        day = dist.generate_day_plan(WEEK_START, "Ponedjeljak", targets, distribution, catalog, foods_db, user, set())
+        dist.tweak_day_plan(day, targets, foods_db)
+
+    def one_week(targets, user):
+        dist.generate_weekly_plan(targets, catalog, foods_db, user, WEEK_START)
+
+    # Zagrijavanje: matrica makroa, cache makroa i indeks se grade lijeno
+    one_meal(*cohort[0])
+
+    result = {
+        "catalog_size": size,
+        "users": users,
+        "catalog_build_s": round(build_s, 3),
+        "generate_meal": measure(cycle(one_meal), users * 5),
+        "generate_day_plan": measure(cycle(one_day), users),
+        "generate_weekly_plan": measure(cycle(one_week), users),
+    }
+    # Nakon mjerenja - peak uključuje sve generirane planove
+    peak_rss = peak_rss_mb()
+    result["peak_rss_mb"] = None if peak_rss is None else round(peak_rss, 1)
+    return result
+
+
+def print_throughput(result: Dict[str, Any]) -> None:
+    peak_rss = "n/a" if result['peak_rss_mb'] is None else f"{result['peak_rss_mb']:.1f} MB"
+    print(f"\n📦 Catalog: {result['catalog_size']} meals (built in {result['catalog_build_s']:.2f}s), "
+          f"users: {result['users']}, peak RSS: {peak_rss}")
+    for name in ("generate_meal", "generate_day_plan", "generate_weekly_plan"):
+        r = result[name]
+        print(f"   {name:<22} {r['per_second']:>10.1f}/s   p50 {r['p50_ms']:>9.2f} ms   p99 {r['p99_ms']:>9.2f} ms")
+
+
+# ========================================
+# MICROBENCHMARKI
+# ========================================
+
+# Fixture je funkcija bez argumenata ili (setup, fn): setup() priprema svjež
+# ulaz za svaki poziv (npr. kopiju dana koji fn mijenja) i ne ulazi u vrijeme
+Fixture = Union[Callable[[], Any], Tuple[Callable[[], Any], Callable[[Any], Any]]]
+
+
+def micro_fixtures() -> Dict[str, Fixture]:
+    """
+    Fiksni fixturei nad stvarnim katalogom: isti korisnik, targeti i dan
+    pri svakom pokretanju, da su rezultati usporedivi kroz povijest.
+    """
+    catalog = dist.load_meal_catalog()
+    foods_db = dist.load_foods_database()
+    meals = list(catalog.meals)
+    lunch = catalog.meals_for_type("lunch")
+    meal = lunch[0]
+    daily_targets = dist.DailyTargets(2300, 160, 250, 72)
+    user = dist.UserPreferences(
+        allergies=["egg", "nuts"],
+        dislikes=["tuna"],
+        preferredIngredients=["chicken"],
+        desiredMealsPerDay=5,
+        goalType="maintain",
+    )
+    distribution = dist.get_meal_distribution(user.desiredMealsPerDay, user.goalType)
+    meal_targets = dist.get_meal_targets(daily_targets, "lunch", distribution)
+    used_meal_ids = {m.id for m in lunch[:5]}
+    day_plan = dist.generate_day_plan(
+        WEEK_START, "Ponedjeljak", daily_targets, distribution, catalog, foods_db, user, set()
+    )
+
+    return {
+        "filter_meals": lambda: dist.filter_meals(meals, user),
+        "calculate_meal_macros": lambda: dist.calculate_meal_macros(meal, foods_db, 1.17),
+        "score_meal": lambda: dist.score_meal(meal, meal_targets, foods_db, user),
+        "choose_best_meal": lambda: dist.choose_best_meal(lunch, meal_targets, foods_db, user, used_meal_ids),
+        "get_meal_targets": lambda: dist.get_meal_targets(daily_targets, "lunch", distribution),
+        "tweak_day_plan": (
+            lambda: copy.deepcopy(day_plan),
+            lambda day: dist.tweak_day_plan(day, daily_targets, foods_db),
+        ),
+    }
+
+
+def run_micro(samples: int, min_sample_time: float = 0.05) -> Dict[str, Dict[str, Any]]:
+    """Za svaku funkciju `samples` uzoraka vremena po pozivu (sekunde)."""
+    results = {}
+    for name, fixture in micro_fixtures().items():
+        if isinstance(fixture, tuple):
+            setup, fn = fixture
+
+            def run(number: int, setup=setup, fn=fn) -> float:
+                inputs = [setup() for _ in range(number)]
+                start = time.perf_counter()
+                for value in inputs:
+                    fn(value)
+                return time.perf_counter() - start
+        else:
+            run = timeit.Timer(fixture).timeit
+        number = 1
+        while run(number) < min_sample_time and number < 10 ** 6:
+            number *= 2
+        per_call = [run(number) / number for _ in range(samples)]
+        results[name] = {
+            "number": number,
+            "samples": per_call,
+            "median_us": percentile(per_call, 50) * 1e6,
+        }
+    return results
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def load_history(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            history = json.load(f)
+    except FileNotFoundError:
+        return {"schema": HISTORY_SCHEMA, "baseline": None, "runs": []}
+    if history.get("schema") != HISTORY_SCHEMA:
+        raise SystemExit(f"❌ Unsupported history schema {history.get('schema')} in {path}")
+    return history
+
+
+def save_history(path: str, history: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(history, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def mann_whitney_greater(baseline: List[float], current: List[float]) -> float:
+    """
+    Jednostrani Mann-Whitney U test (normalna aproksimacija s korekcijom za
+    izjednačenja): p-vrijednost za hipotezu da je current sporiji od baseline.
+    """
+    n1, n2 = len(baseline), len(current)
+    combined = sorted([(v, 0) for v in baseline] + [(v, 1) for v in current])
+    ranks = [0.0] * len(combined)
+    tie_term = 0.0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        rank = (i + j) / 2 + 1
+        for k in range(i, j + 1):
+            ranks[k] = rank
+        ties = j - i + 1
+        tie_term += ties ** 3 - ties
+        i = j + 1
+    rank_sum_current = sum(r for r, (_, group) in zip(ranks, combined) if group == 1)
+    u = rank_sum_current - n2 * (n2 + 1) / 2
+    mean = n1 * n2 / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - mean - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def find_run(history: Dict[str, Any], run_id: str) -> Dict[str, Any]:
+    for run in history["runs"]:
+        if run["id"] == run_id:
+            return run
+    raise SystemExit(f"❌ Run not found in history: {run_id}")
+
+
+def compare_runs(baseline: Dict[str, Any], current: Dict[str, Any], alpha: float, threshold: float) -> List[Dict[str, Any]]:
+    """Usporedi dva runa; regresija = značajno sporije (p < alpha) i medijan > threshold."""
+    rows = []
+    for name, base in baseline["results"].items():
+        cur = current["results"].get(name)
+        if cur is None:
+            continue
+        ratio = cur["median_us"] / base["median_us"] if base["median_us"] > 0 else float("inf")
+        p_value = mann_whitney_greater(base["samples"], cur["samples"])
+        rows.append({
+            "name": name,
+            "baseline_us": base["median_us"],
+            "current_us": cur["median_us"],
+            "ratio": ratio,
+            "p_value": p_value,
+            "regression": p_value < alpha and ratio > 1 + threshold,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    throughput = sub.add_parser("throughput", help="end-to-end throughput po veličini kataloga")
+    throughput.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    throughput.add_argument("--users", type=int, default=20, help="broj sintetičkih korisnika")
+    throughput.add_argument("--seed", type=int, default=42)
+    throughput.add_argument("--json", help="zapiši rezultate u JSON fajl")
+
+    micro = sub.add_parser("micro", help="microbenchmarki po funkciji, spremljeni u povijest")
+    micro.add_argument("--samples", type=int, default=15)
+    micro.add_argument("--history", default=HISTORY_FILE)
+    micro.add_argument("--label", default="", help="opis runa (npr. naziv promjene)")
+    micro.add_argument("--set-baseline", action="store_true", help="označi ovaj run kao baseline")
+
+    compare = sub.add_parser("compare", help="usporedi run s baselineom i prijavi regresije")
+    compare.add_argument("--history", default=HISTORY_FILE)
+    compare.add_argument("--baseline", help="id baseline runa (default: označeni baseline ili prvi run)")
+    compare.add_argument("--run", help="id runa za usporedbu (default: zadnji run)")
+    compare.add_argument("--alpha", type=float, default=0.01, help="prag značajnosti")
+    compare.add_argument("--threshold", type=float, default=0.10, help="minimalno relativno usporenje medijana")
+
+    args = parser.parse_args()
+    dist.configure_logging(quiet=True)
+
+    if args.command == "throughput":
+        print("🚀 Benchmark: weekly generator throughput")
+        results = []
+        for size in args.sizes:
+            result = run_throughput(size, args.users, args.seed)
+            print_throughput(result)
+            results.append(result)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+            print(f"\n💾 Results written to {args.json}")
+
+    elif args.command == "micro":
+        print("🔬 Microbenchmarks")
+        history = load_history(args.history)
+        results = run_micro(args.samples)
+        run = {
+            "id": f"{len(history['runs']) + 1}-{git_revision()}",
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "git": git_revision(),
+            "label": args.label,
+            "python": platform.python_version(),
+            "machine": platform.node(),
+            "catalogVersion": dist.load_meal_catalog().version[:16],
+            "results": results,
+        }
+        history["runs"].append(run)
+        if args.set_baseline or history.get("baseline") is None:
+            history["baseline"] = run["id"]
+        save_history(args.history, history)
+        for name, r in results.items():
+            print(f"   {name:<22} {r['median_us']:>12.2f} µs   (x{r['number']}, {len(r['samples'])} samples)")
+        print(f"\n💾 Run {run['id']} saved to {args.history} (baseline: {history['baseline']})")
+
+    elif args.command == "compare":
+        history = load_history(args.history)
+        if len(history["runs"]) < 1:
+            raise SystemExit("❌ No runs in history - run 'micro' first")
+        baseline = find_run(history, args.baseline or history.get("baseline") or history["runs"][0]["id"])
+        current = find_run(history, args.run) if args.run else history["runs"][-1]
+        print(f"📊 Baseline {baseline['id']} ({baseline['timestamp']}) vs {current['id']} ({current['timestamp']})")
+        rows = compare_runs(baseline, current, args.alpha, args.threshold)
+        for row in rows:
+            flag = "❌ REGRESSION" if row["regression"] else "✅"
+            print(f"   {row['name']:<22} {row['baseline_us']:>10.2f} → {row['current_us']:>10.2f} µs "
+                  f"(x{row['ratio']:.2f}, p={row['p_value']:.4f}) {flag}")
+        if any(row["regression"] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
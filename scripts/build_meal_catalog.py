@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Izgradi kompilirani (memory-mapped) katalog jela iz meal_components.json
+i foods-database.ts za lib/services/distributions.py.
+
+Korištenje:
+    python scripts/build_meal_catalog.py
+    python scripts/build_meal_catalog.py --output /srv/plans/meal_components.mealbin
+
+Generator ga učitava s load_meal_catalog("...mealbin") (ili load_compiled_catalog).
+Ponovno pokreni nakon svake promjene kataloga ili baze namirnica.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lib', 'services'))
+
+import distributions as dist  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kompiliraj meal_components.json u .mealbin")
+    parser.add_argument('--catalog', default=dist.MEAL_COMPONENTS_FILE, help="putanja do meal_components.json")
+    parser.add_argument('--foods', default=dist.FOODS_DATABASE_FILE, help="putanja do foods-database.ts")
+    parser.add_argument('--output', default=dist.COMPILED_CATALOG_FILE, help="izlazni .mealbin fajl")
+    args = parser.parse_args()
+
+    print(f"📖 Kompiliram {os.path.relpath(args.catalog)}...")
+    start = time.perf_counter()
+    path = dist.compile_meal_catalog(args.catalog, args.foods, args.output)
+    compiled = dist.CompiledCatalog(path)
+    print(f"✅ {len(compiled)} jela -> {path} ({os.path.getsize(path) / 1024:.1f} KB, {time.perf_counter() - start:.2f} s)")
+    print(f"   catalogVersion: {compiled.version[:12]}…  foodsVersion: {compiled.foods_version[:12]}…")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,24 @@
 #!/usr/bin/env python3
 """
-Fix duplicate IDs in meal_components.json
+Fix duplicate IDs in the meal catalog store (MealStore)
+
+Jela iz NEW_ID_MAPPING dobiju nove id-eve kroz update_meal (jedna transakcija
+po jelu). Prazno spremište se puni iz meal_components.json tek nakon
+preimenovanja, jer spremište ne prima dva jela s istim id-em. Na kraju se
+meal_components.json izvozi iz spremišta (osim uz --no-export).
+
+Korištenje:
+    python scripts/fix_duplicate_ids.py [--store meal_catalog.sqlite] [--no-export]
 """
 
+import argparse
 import json
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lib', 'services'))
+
+import distributions as dist  # noqa: E402
 
 MEAL_FILE = os.path.join(os.path.dirname(__file__), '..', 'lib', 'data', 'meal_components.json')
 
@@ -32,48 +46,60 @@ NEW_ID_MAPPING = {
     "Skyr s borovnicama": "snack_new_2",
 }
 
+def _new_id_meal_type(new_id):
+    # Isto ime može postojati u više tipova obroka - novi id nosi tip (breakfast_new_1)
+    return new_id.split('_', 1)[0]
+
+
 def main():
-    print("📖 Učitavam meal_components.json...")
-    
-    with open(MEAL_FILE, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    # Collect all IDs
-    all_ids = set()
-    for category in ['breakfast', 'lunch', 'dinner', 'snack']:
-        for meal in data[category]:
-            all_ids.add(meal['id'])
-    
-    print(f"   Ukupno jela: {len(all_ids)}")
-    
-    # Fix duplicates
+    parser = argparse.ArgumentParser(description="Popravi duplicirane id-eve jela")
+    parser.add_argument('--store', default=dist.CATALOG_STORE_FILE, help="putanja do meal_catalog.sqlite")
+    parser.add_argument('--no-export', action='store_true', help="ne izvozi meal_components.json (samo spremište)")
+    args = parser.parse_args()
+
+    store = dist.MealStore(args.store)
     fixed_count = 0
-    for category in ['breakfast', 'lunch', 'dinner', 'snack']:
-        for meal in data[category]:
-            if meal['name'] in NEW_ID_MAPPING:
-                old_id = meal['id']
-                new_id = NEW_ID_MAPPING[meal['name']]
-                print(f"   🔄 {meal['name']}: {old_id} -> {new_id}")
-                meal['id'] = new_id
+
+    if len(store) == 0:
+        print("📖 Prazno spremište - učitavam meal_components.json...")
+        with open(MEAL_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for category in dist.MEAL_TYPES:
+            for meal in data[category]:
+                new_id = NEW_ID_MAPPING.get(meal['name'])
+                if new_id and meal['id'] != new_id and _new_id_meal_type(new_id) == category:
+                    print(f"   🔄 {meal['name']}: {meal['id']} -> {new_id}")
+                    meal['id'] = new_id
+                    fixed_count += 1
+        added = store.import_dict(data)
+        print(f"   Uvezeno jela: {added}")
+    else:
+        print(f"📖 Spremište kataloga: {len(store)} jela (revizija {store.revision})")
+        for name, new_id in NEW_ID_MAPPING.items():
+            for meal in store.find_by_name(name):
+                if meal['id'] == new_id or meal['mealType'] != _new_id_meal_type(new_id):
+                    continue
+                print(f"   🔄 {name}: {meal['id']} -> {new_id}")
+                store.update_meal(meal['id'], {'id': new_id})
                 fixed_count += 1
-    
-    print(f"\n💾 Spremam promjene... ({fixed_count} popravljeno)")
-    
-    with open(MEAL_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    
-    # Verify no duplicates
-    all_ids = []
-    for category in ['breakfast', 'lunch', 'dinner', 'snack']:
-        for meal in data[category]:
-            all_ids.append(meal['id'])
-    
-    duplicates = [x for x in all_ids if all_ids.count(x) > 1]
+
+    print(f"\n💾 Popravljeno: {fixed_count}")
+
+    # Generator (load_meal_catalog) i TS aplikacija čitaju meal_components.json
+    if not args.no_export:
+        print("💾 Izvozim meal_components.json...")
+        store.export_json(MEAL_FILE)
+
+    # Provjera jednim prolazom (validate_catalog) umjesto all_ids.count(x) po id-u
+    report = dist.validate_catalog(dist.load_catalog_store(args.store), dist.load_foods_database())
+    duplicates = [issue for issue in report.issues if issue.code in ('duplicate_id', 'duplicate_name')]
     if duplicates:
-        print(f"\n⚠️ Još ima duplikata: {set(duplicates)}")
+        print(f"\n⚠️ Još ima duplikata: {len(duplicates)}")
+        for issue in duplicates:
+            print(f"   {issue.meal_id}: {issue.message}")
     else:
-        print(f"\n✅ Nema duplikata! Ukupno {len(set(all_ids))} jedinstvenih jela.")
+        print(f"\n✅ Nema duplikata! Ukupno {len(store)} jedinstvenih jela.")
+
 
 if __name__ == "__main__":
     main()
-
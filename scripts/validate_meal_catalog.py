@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Validiraj katalog jela protiv baze namirnica (lib/services/distributions.py).
+
+Jedan linearni prolaz: duplicirani id-evi i imena, namirnice kojih nema u
+foods-database.ts (generator bi im dao 5/15/5 default), gramaže <= 0 i
+nekonzistentni suitableFor / kategorija. Rezultat se pamti po hashu
+kataloga i baze namirnica pa je ponovljeno pokretanje besplatno.
+
+Korištenje:
+    python scripts/validate_meal_catalog.py
+    python scripts/validate_meal_catalog.py --catalog lib/data/meal_catalog.sqlite --all
+
+Izlazni kod je 1 ako ima grešaka (upozorenja ne ruše provjeru).
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lib', 'services'))
+
+import distributions as dist  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validiraj katalog jela")
+    parser.add_argument('--catalog', default=dist.MEAL_COMPONENTS_FILE, help="meal_components.json, .mealbin ili .sqlite")
+    parser.add_argument('--foods', default=dist.FOODS_DATABASE_FILE, help="putanja do foods-database.ts")
+    parser.add_argument('--all', action='store_true', help="ispiši i upozorenja, ne samo greške")
+    args = parser.parse_args()
+
+    dist.configure_logging(quiet=True)
+    report = dist.validate_catalog(dist.load_meal_catalog(args.catalog), dist.load_foods_database(args.foods))
+
+    print(f"📖 {os.path.relpath(args.catalog)}: {report.meals} jela")
+    for issue in report.issues:
+        if args.all or issue.severity == 'error':
+            icon = '❌' if issue.severity == 'error' else '⚠️'
+            print(f"   {icon} [{issue.code}] {issue.meal_type}/{issue.meal_id}: {issue.message}")
+    if report.unresolved_foods:
+        print(f"\n🔍 Namirnice koje nisu u bazi: {', '.join(report.unresolved_foods)}")
+
+    counts = ", ".join(f"{code}: {n}" for code, n in sorted(report.counts().items())) or "nema nalaza"
+    if report.ok:
+        print(f"\n✅ Katalog je ispravan ({counts})")
+    else:
+        print(f"\n❌ {len(report.errors)} grešaka ({counts})")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()